@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-chunk prompt detection cost as command output grows
+"""
+
+import sys
+import time
+from pathlib import Path
+
+# Add src directory to path
+script_dir = Path(__file__).parent
+src_dir = script_dir.parent / "src"
+sys.path.insert(0, str(src_dir))
+
+from prompt_detector import PromptDetector, StreamingPromptDetector
+
+CHUNK = "interface GigabitEthernet0/0/1\n description uplink to core switch\n no ip address\n"
+CHUNKS_PER_SAMPLE = 20
+CHECKPOINTS = [10, 50, 100, 250, 500]  # KB of accumulated output
+
+
+def bench_full_rescan(detector: PromptDetector, target_kb: int) -> float:
+    """Average seconds per chunk when re-scanning the accumulated output"""
+    output = CHUNK * (target_kb * 1024 // len(CHUNK))
+    start = time.perf_counter()
+    for _ in range(CHUNKS_PER_SAMPLE):
+        output += CHUNK
+        detector.detect_prompt(output)
+    return (time.perf_counter() - start) / CHUNKS_PER_SAMPLE
+
+
+def bench_streaming(detector: PromptDetector, target_kb: int) -> float:
+    """Average seconds per chunk when feeding only the new chunk"""
+    streaming = StreamingPromptDetector(detector)
+    streaming.feed(CHUNK * (target_kb * 1024 // len(CHUNK)))
+    start = time.perf_counter()
+    for _ in range(CHUNKS_PER_SAMPLE):
+        streaming.feed(CHUNK)
+    return (time.perf_counter() - start) / CHUNKS_PER_SAMPLE
+
+
+def check_equivalence(detector: PromptDetector) -> bool:
+    """Streaming and full detection must agree on a prompt after long output"""
+    output = CHUNK * 2000 + "Router#"
+    streaming = StreamingPromptDetector(detector)
+    for i in range(0, len(output), 37):
+        streaming.feed(output[i:i + 37])
+    return streaming.current() == detector.detect_prompt(output)
+
+
+if __name__ == "__main__":
+    detector = PromptDetector()
+
+    print("=" * 80)
+    print("Prompt detection benchmark (microseconds per chunk)")
+    print("=" * 80)
+    print(f"{'Output size':>12} {'Full rescan':>14} {'Streaming':>12}")
+
+    for target_kb in CHECKPOINTS:
+        full = bench_full_rescan(detector, target_kb) * 1e6
+        streaming = bench_streaming(detector, target_kb) * 1e6
+        print(f"{target_kb:>9} KB {full:>14.1f} {streaming:>12.1f}")
+
+    if check_equivalence(detector):
+        print("\n✓ Streaming results match full detection")
+        sys.exit(0)
+    else:
+        print("\n✗ Streaming results differ from full detection")
+        sys.exit(1)
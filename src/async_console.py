@@ -0,0 +1,515 @@
+"""
+Asyncio console sessions so one event loop can drive many routers at once
+"""
+
+import asyncio
+import fcntl
+import os
+import time
+from typing import Optional, List, Tuple, Any, Union, Pattern, Sequence, Callable
+
+import serial
+
+from stream_buffer import StreamBuffer
+from serial_connection import make_output_matcher, TIOCSBRK, TIOCCBRK
+from prompt_detector import PromptDetector, StreamingPromptDetector, RouterState
+from recovery_state_machine import RecoveryStateMachine, RecoveryState
+from retry_strategies import RetryManager, RetryConfig
+from command_executor import at_more_prompt, strip_pagination, ends_command
+from rommon_handler import RommonHandler
+
+
+class AsyncSerialTransport:
+    """Serial port read by the event loop instead of a reader thread"""
+    
+    READ_SIZE = 4096
+    WAIT_OVERLAP = 1024
+    
+    def __init__(self, port: str, baudrate: int = 9600, logger: Optional[Any] = None,
+                 metrics: Optional[Any] = None,
+                 buffer_size: int = StreamBuffer.DEFAULT_CAPACITY):
+        self.port = port
+        self.baudrate = baudrate
+        self.logger = logger
+        self.metrics = metrics
+        
+        self.serial_port: Optional[serial.Serial] = None
+        self.stream = StreamBuffer(buffer_size)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._data_event: Optional[asyncio.Event] = None
+        
+        # Break methods to try first, e.g. from a BreakProfile ranking
+        self.break_order: Optional[List[str]] = None
+    
+    async def open(self) -> bool:
+        """Open the port and start reading it from the running loop"""
+        try:
+            # pyserial opens the device O_NONBLOCK; timeout=0 keeps reads non-blocking too
+            self.serial_port = serial.Serial(
+                port=self.port,
+                baudrate=self.baudrate,
+                bytesize=serial.EIGHTBITS,
+                parity=serial.PARITY_NONE,
+                stopbits=serial.STOPBITS_ONE,
+                timeout=0,
+                xonxoff=False,
+                rtscts=False,
+                dsrdtr=False
+            )
+            self.serial_port.reset_input_buffer()
+            self.serial_port.reset_output_buffer()
+        except (serial.SerialException, OSError) as e:
+            if self.logger:
+                self.logger.error(f"Failed to open {self.port}: {e}")
+            return False
+        
+        self._loop = asyncio.get_running_loop()
+        self._data_event = asyncio.Event()
+        self._loop.add_reader(self.serial_port.fileno(), self._on_readable)
+        
+        if self.metrics:
+            self.metrics.start_connection()
+        if self.logger:
+            self.logger.info(f"Opened serial port {self.port} @ {self.baudrate} baud (async)")
+        return True
+    
+    def close(self):
+        """Stop reading and close the port"""
+        if self.serial_port and self.serial_port.is_open:
+            if self._loop:
+                self._loop.remove_reader(self.serial_port.fileno())
+            try:
+                self.serial_port.close()
+            except (serial.SerialException, OSError) as e:
+                if self.logger:
+                    self.logger.warning(f"Error closing port: {e}")
+        self.serial_port = None
+    
+    def is_open(self) -> bool:
+        """Check whether the port is open"""
+        return self.serial_port is not None and self.serial_port.is_open
+    
+    def _on_readable(self):
+        """Loop callback: drain what the driver has buffered"""
+        fd = self.serial_port.fileno()
+        try:
+            data = os.read(fd, self.READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            data = b''
+            if self.logger:
+                self.logger.warning(f"Read from {self.port} failed: {e}")
+        
+        if not data:
+            # Hangup: stop polling a descriptor that will stay readable
+            self._loop.remove_reader(fd)
+            return
+        
+        self.stream.append(data)
+        if self.metrics:
+            self.metrics.record_bytes(received=len(data))
+        
+        # Wake every waiter, then start a fresh event for the next chunk
+        self._data_event.set()
+        self._data_event = asyncio.Event()
+    
+    async def write(self, data: str) -> int:
+        """Write a line to the port without blocking the loop"""
+        if not self.is_open():
+            if self.logger:
+                self.logger.error("Serial port not open")
+            return 0
+        
+        if not data.endswith('\r') and not data.endswith('\n'):
+            data += '\r'
+        return await self.write_raw(data.encode('utf-8'))
+    
+    async def write_raw(self, payload: bytes) -> int:
+        """Write bytes as-is, waiting for the port to drain when its buffer is full"""
+        fd = self.serial_port.fileno()
+        view = memoryview(payload)
+        written = 0
+        
+        try:
+            while written < len(payload):
+                try:
+                    written += os.write(fd, view[written:])
+                except BlockingIOError:
+                    writable = self._loop.create_future()
+                    self._loop.add_writer(fd, writable.set_result, None)
+                    try:
+                        await writable
+                    finally:
+                        self._loop.remove_writer(fd)
+        except OSError as e:
+            if self.logger:
+                self.logger.error(f"Error writing to port: {e}")
+        
+        if self.metrics:
+            self.metrics.record_bytes(sent=written)
+        return written
+    
+    async def send_break(self, method: Optional[str] = None, duration: float = 0.25) -> bool:
+        """
+        Send a break like SerialConnection.send_break, without blocking the loop
+        
+        Args:
+            method: 'standard' (pyserial break condition) or 'ioctl'; None tries
+                both in break_order
+            duration: Seconds to hold the line in break
+        
+        Returns:
+            True if a break went out
+        """
+        if not self.is_open():
+            return False
+        
+        methods = [("standard", self._break_standard), ("ioctl", self._break_ioctl)]
+        if self.break_order:
+            rank = {name: i for i, name in enumerate(self.break_order)}
+            methods.sort(key=lambda m: rank.get(m[0], len(rank)))
+        if method:
+            methods = [m for m in methods if m[0] == method]
+        
+        for name, func in methods:
+            start_time = time.time()
+            try:
+                await func(duration)
+            except (serial.SerialException, OSError) as e:
+                if self.logger:
+                    self.logger.warning(f"{name} break failed: {e}")
+                if self.metrics:
+                    self.metrics.record_break_attempt(name, 0, False, time.time())
+                continue
+            
+            if self.metrics:
+                self.metrics.record_break_attempt(name, time.time() - start_time, True, time.time())
+            self._break_sent(name)
+            return True
+        return False
+    
+    async def _break_standard(self, duration: float):
+        self.serial_port.break_condition = True
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            self.serial_port.break_condition = False
+    
+    async def _break_ioctl(self, duration: float):
+        fd = self.serial_port.fileno()
+        fcntl.ioctl(fd, TIOCSBRK)
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            fcntl.ioctl(fd, TIOCCBRK)
+    
+    def _break_sent(self, method: str):
+        """Bookkeeping after a break went out on the line (see SerialConnection._break_sent)"""
+        # Mark the break in the session capture so replays can follow it
+        if self.logger and self.logger.wants_hex_dump():
+            self.logger.log_hex_dump(method.encode('utf-8'), "Break")
+    
+    def get_stream_offset(self) -> int:
+        """Absolute offset of the next byte to be received"""
+        return self.stream.end_offset
+    
+    def read_since(self, offset: int) -> Tuple[str, int]:
+        """Get output received since an offset"""
+        return self.stream.text_since(offset)
+    
+    def clear_output_buffer(self):
+        """Clear output buffer"""
+        self.stream.clear()
+    
+    async def wait_for(self, condition: Union[str, Pattern, Sequence[Pattern], Callable[[str], Any]],
+                       timeout: float = 10.0, since: Optional[int] = None) -> Any:
+        """
+        Await output satisfying a condition (same contract as SerialConnection.wait_for)
+        
+        Returns:
+            The re.Match or the callable's truthy result, None on timeout
+        """
+        check = make_output_matcher(condition, self.WAIT_OVERLAP)
+        offset = 0 if since is None else since
+        deadline = time.time() + timeout
+        
+        while True:
+            text, offset = self.stream.text_since(offset)
+            if text:
+                result = check(text)
+                if result:
+                    return result
+            
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            
+            # No await between the read above and here, so nothing can be missed
+            try:
+                await asyncio.wait_for(self._data_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+
+class AsyncConsoleSession:
+    """Async command execution and ROM monitor automation for one router"""
+    
+    def __init__(self, transport: AsyncSerialTransport,
+                 prompt_detector: Optional[PromptDetector] = None,
+                 state_machine: Optional[RecoveryStateMachine] = None,
+                 retry_manager: Optional[RetryManager] = None,
+                 logger: Optional[Any] = None, metrics: Optional[Any] = None):
+        self.transport = transport
+        self.prompt_detector = prompt_detector or PromptDetector()
+        self.state_machine = state_machine or RecoveryStateMachine()
+        self.retry_manager = retry_manager or RetryManager(logger, metrics)
+        self.logger = logger
+        self.metrics = metrics
+    
+    async def execute(self, command: str, expected_prompt: Optional[RouterState] = None,
+                      timeout: float = 30.0, retry: bool = True,
+                      wait_for_echo: bool = True) -> Tuple[bool, str]:
+        """
+        Execute a command and wait for response
+        
+        Args:
+            command: Command to execute
+            expected_prompt: Expected prompt state after command
+            timeout: Timeout in seconds
+            retry: Whether to retry on transport errors
+            wait_for_echo: Whether to strip the command echo
+        
+        Returns:
+            Tuple of (success, output)
+        """
+        config = RetryConfig(max_retries=3 if retry else 1, base_delay=1.0)
+        
+        for attempt in range(1, config.max_retries + 1):
+            try:
+                return await self._execute_once(command, expected_prompt, timeout, wait_for_echo)
+            except (serial.SerialException, OSError) as e:
+                if attempt >= config.max_retries:
+                    if self.logger:
+                        self.logger.error(f"Command execution failed after retries: {e}")
+                    return False, str(e)
+                if self.metrics:
+                    self.metrics.record_retry(f"execute_{command.split()[0]}")
+                await asyncio.sleep(self.retry_manager.calculate_delay(attempt, config))
+        
+        return False, ""
+    
+    async def _execute_once(self, command: str, expected_prompt: Optional[RouterState],
+                            timeout: float, wait_for_echo: bool) -> Tuple[bool, str]:
+        """Execute command once (internal)"""
+        start_time = time.time()
+        
+        self.transport.clear_output_buffer()
+        since = self.transport.get_stream_offset()
+        
+        if await self.transport.write(command) == 0:
+            return False, "Failed to write command"
+        
+        output = ""
+        detector = StreamingPromptDetector(self.prompt_detector)
+        more = object()
+        
+        def _on_output(chunk: str) -> Any:
+            nonlocal output
+            output += chunk
+            
+            # Pagination is answered by the caller since writes are async
+            if at_more_prompt(output, chunk):
+                detector.feed(chunk)
+                return more
+            
+            state, _, _ = detector.feed(chunk)
+            return state if ends_command(state, expected_prompt) else None
+        
+        state = None
+        deadline = start_time + timeout
+        while time.time() < deadline:
+            result = await self.transport.wait_for(_on_output, deadline - time.time(), since=since)
+            since = self.transport.get_stream_offset()
+            if result is not more:
+                state = result
+                break
+            await self.transport.write_raw(b' ')
+        
+        output = strip_pagination(output)
+        if wait_for_echo:
+            echo_end = output.find(command.strip())
+            if echo_end >= 0:
+                output = output[echo_end + len(command.strip()):]
+        
+        duration = time.time() - start_time
+        if state is None:
+            if self.metrics:
+                self.metrics.record_timeout()
+                self.metrics.record_command_execution(duration)
+            if self.logger:
+                self.logger.warning(f"Command execution timeout: {command}")
+            return False, output
+        
+        if self.metrics:
+            self.metrics.record_command_execution(duration)
+        if expected_prompt is not None and state != expected_prompt:
+            return False, output
+        if self.metrics:
+            self.metrics.record_response_time(duration)
+        return True, output
+    
+    async def wait_for_boot(self, timeout: float = 60.0) -> bool:
+        """Wait for boot sequence to start"""
+        if self.logger:
+            self.logger.info(f"[{self.transport.port}] Waiting for boot sequence...")
+        
+        self.state_machine.transition(RecoveryState.WAITING_BOOT, "Waiting for boot")
+        
+        match = await self.transport.wait_for(self.prompt_detector.BOOT_PATTERNS, timeout)
+        if match and self.logger:
+            self.logger.info(f"[{self.transport.port}] Boot sequence detected")
+        return match is not None
+    
+    async def send_break_sequence(self, timeout: float = 60.0, max_attempts: int = 5,
+                                  attempt_interval: float = 2.0) -> bool:
+        """Send breaks until the ROM monitor prompt appears"""
+        if self.logger:
+            self.logger.info(f"[{self.transport.port}] Sending break sequence...")
+        
+        self.state_machine.transition(RecoveryState.SENDING_BREAK, "Sending break sequence")
+        
+        start_time = time.time()
+        for attempt in range(1, max_attempts + 1):
+            remaining = timeout - (time.time() - start_time)
+            if remaining <= 0:
+                break
+            
+            await self.transport.send_break()
+            
+            wait_time = min(1.0 + (attempt_interval if attempt < max_attempts else 0.0), remaining)
+            if await self.transport.wait_for(self.prompt_detector.ROM_MONITOR_PATTERNS, wait_time):
+                if self.metrics:
+                    self.metrics.record_rommon_entry(time.time())
+                if self.logger:
+                    self.logger.info(f"[{self.transport.port}] ROM monitor entered on attempt {attempt}")
+                self.state_machine.transition(RecoveryState.ROM_MONITOR, "Entered ROM monitor")
+                return True
+        
+        if self.logger:
+            self.logger.error(f"[{self.transport.port}] Failed to enter ROM monitor after break sequence")
+        return False
+    
+    async def set_config_register(self, value: str = "0x2142") -> bool:
+        """Set configuration register in ROM monitor"""
+        rommon_prompts = self.prompt_detector.ROM_MONITOR_PATTERNS
+        
+        # ROM monitor echoes the command, then returns to its prompt
+        since = self.transport.get_stream_offset()
+        await self.transport.write(f"confreg {value}")
+        confirmed = False
+        if await self.transport.wait_for(rommon_prompts, 10.0, since=since):
+            output, _ = self.transport.read_since(since)
+            confirmed = value.lower() in output.lower()
+        
+        if not confirmed:
+            # Read the register back; decline the change dialog if offered
+            since = self.transport.get_stream_offset()
+            await self.transport.write("confreg")
+            match = await self.transport.wait_for([RommonHandler.CONFREG_CHANGE_QUESTION] + rommon_prompts,
+                                                  10.0, since=since)
+            if match is not None:
+                output, _ = self.transport.read_since(since)
+                if match.re is RommonHandler.CONFREG_CHANGE_QUESTION:
+                    await self.transport.write("n")
+                confirmed = value.lower() in output.lower()
+        
+        if not confirmed:
+            if self.logger:
+                self.logger.error(f"[{self.transport.port}] Failed to set configuration register")
+            return False
+        
+        self.state_machine.transition(RecoveryState.CONFIG_REG_SET, f"Config register set to {value}")
+        return True
+    
+    async def reboot_router(self) -> bool:
+        """Reboot router from ROM monitor"""
+        self.state_machine.transition(RecoveryState.REBOOTING, "Rebooting router")
+        await self.transport.write("reset")
+        self.transport.clear_output_buffer()
+        return True
+    
+    async def wait_for_ios_boot(self, timeout: float = 120.0) -> bool:
+        """Wait for IOS to boot without startup config"""
+        boot_start_time = time.time()
+        detector = StreamingPromptDetector(self.prompt_detector)
+        tail = ""
+        
+        def _ios_prompt(new_output: str) -> Optional[Tuple[RouterState, Optional[str]]]:
+            nonlocal boot_start_time, tail
+            if self.prompt_detector.is_booting(new_output):
+                boot_start_time = time.time()
+            
+            # Setup dialog (see RommonHandler.wait_for_ios_boot)
+            window, tail = tail + new_output, (tail + new_output)[-64:]
+            if RommonHandler.INITIAL_DIALOG_QUESTION.search(window):
+                return RouterState.UNKNOWN, None
+            
+            state, hostname, _ = detector.feed(new_output)
+            if state in [RouterState.PRIVILEGED_MODE, RouterState.USER_MODE]:
+                return state, hostname
+            return None
+        
+        deadline = time.time() + timeout
+        result = await self.transport.wait_for(_ios_prompt, timeout, since=0)
+        if result and result[0] == RouterState.UNKNOWN:
+            if self.logger:
+                self.logger.info(f"[{self.transport.port}] Declining the initial configuration dialog")
+            since = self.transport.get_stream_offset()
+            tail = ""
+            await self.transport.write("no")
+            result = await self.transport.wait_for(_ios_prompt, max(0.0, deadline - time.time()),
+                                                   since=since)
+        
+        if not result or result[0] == RouterState.UNKNOWN:
+            if self.logger:
+                self.logger.error(f"[{self.transport.port}] Timeout waiting for IOS boot")
+            return False
+        
+        state, hostname = result
+        if self.metrics:
+            self.metrics.record_boot_duration(time.time() - boot_start_time)
+        if self.logger:
+            self.logger.info(f"[{self.transport.port}] IOS booted successfully "
+                             f"(state: {state.value}, hostname: {hostname})")
+        
+        # Without a configuration there is no enable secret to stop us
+        if state == RouterState.USER_MODE:
+            success, _ = await self.execute("enable", expected_prompt=RouterState.PRIVILEGED_MODE,
+                                            timeout=10.0, retry=False)
+            if not success:
+                if self.logger:
+                    self.logger.error(f"[{self.transport.port}] Could not enter privileged mode")
+                return False
+        
+        self.state_machine.transition(RecoveryState.IOS_NO_CONFIG, "IOS booted without startup config")
+        await self.setup_terminal()
+        return True
+    
+    async def setup_terminal(self) -> bool:
+        """Disable paging and line wrapping for the new exec session"""
+        success, output = await self.execute("terminal length 0", timeout=10.0, retry=False)
+        await self.execute("terminal width 0", timeout=10.0, retry=False)
+        return success and not self.prompt_detector.has_error(output)
+    
+    async def complete_recovery_setup(self, boot_timeout: float = 60.0,
+                                      break_timeout: float = 60.0) -> bool:
+        """Enter ROM monitor, set 0x2142, reboot and wait for IOS"""
+        if not await self.wait_for_boot(boot_timeout):
+            if self.logger:
+                self.logger.warning(f"[{self.transport.port}] Boot sequence not detected, attempting break anyway")
+        
+        return (await self.send_break_sequence(break_timeout)
+                and await self.set_config_register("0x2142")
+                and await self.reboot_router()
+                and await self.wait_for_ios_boot())
@@ -0,0 +1,175 @@
+"""
+Break injection driven by boot-banner events from the serial reader
+"""
+
+import re
+import threading
+import time
+from typing import Optional, Any, Callable, List, Sequence, Tuple
+from break_profile import BreakProfile, BreakMethod
+
+
+class BreakInjector:
+    """Sends console breaks from the moment the bootstrap banner arrives until ROM monitor answers"""
+
+    # Printed at the start of the short window in which a break enters ROM monitor
+    BANNER_PATTERN = re.compile(r'System Bootstrap|Initializing Hardware', re.IGNORECASE)
+
+    # Re-injection interval once the banner is seen, and before it (blind mode)
+    BURST_INTERVAL = 0.25
+    BLIND_INTERVAL = 2.0
+
+    # Received text kept so patterns split across chunks are still found
+    SCAN_OVERLAP = 64
+
+    def __init__(self, serial_conn, prompt_detector, methods: Optional[Sequence[BreakMethod]] = None,
+                 logger: Optional[Any] = None, metrics: Optional[Any] = None,
+                 on_platform: Optional[Callable[[str], None]] = None):
+        """
+        Args:
+            serial_conn: SerialConnection to watch and send breaks on
+            prompt_detector: PromptDetector providing the ROM monitor patterns
+            methods: (method, duration) pairs to cycle through, best first
+                (default: BreakProfile.CANDIDATES)
+            logger: Optional logger
+            metrics: Optional metrics collector
+            on_platform: Called from the reader thread with the platform name
+                once the bootstrap banner has printed it
+        """
+        self.serial_conn = serial_conn
+        self.rommon_patterns = prompt_detector.ROM_MONITOR_PATTERNS
+        self.methods: List[BreakMethod] = list(methods or BreakProfile.CANDIDATES)
+        self.logger = logger
+        self.metrics = metrics
+        self.on_platform = on_platform
+
+        # Also send breaks before any banner, at BLIND_INTERVAL
+        self.blind = False
+
+        self.banner_seen = threading.Event()
+        self.rommon_seen = threading.Event()
+        self.banner_time: Optional[float] = None
+        self.first_break_time: Optional[float] = None
+        self.rommon_time: Optional[float] = None
+        self.attempts = 0
+        # Attempt number at which the current method list took over
+        self._cycle_start = 0
+        self.platform: Optional[str] = None
+        self.last_method: Optional[BreakMethod] = None
+        # Every break sent, with the time it went out
+        self.sent: List[Tuple[BreakMethod, float]] = []
+
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        self._wake = threading.Event()
+        self._tail = ""
+
+    def start(self, since: int):
+        """
+        Start watching the stream and injecting breaks
+
+        Args:
+            since: Stream offset taken before the reload was triggered; output
+                from there on is checked for a banner that beat the listener
+        """
+        if self.running:
+            return
+        self.running = True
+
+        # The banner may already have arrived before the listener was attached
+        text, _ = self.serial_conn.read_since(since)
+        self._scan(text)
+        self._tail = ""
+
+        self.serial_conn.add_data_listener(self._on_data)
+        self.thread = threading.Thread(target=self._run, name="break-injector", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop injecting and detach from the connection"""
+        if not self.running:
+            return
+        self.running = False
+        self.serial_conn.remove_data_listener(self._on_data)
+        self._wake.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until the ROM monitor prompt appears
+
+        Returns:
+            True if ROM monitor was entered within the timeout
+        """
+        return self.rommon_seen.wait(timeout)
+
+    def set_methods(self, methods: Sequence[BreakMethod]):
+        """Replace the method list, starting again from its best method"""
+        self.methods = list(methods) or list(BreakProfile.CANDIDATES)
+        self._cycle_start = self.attempts
+
+    def enable_blind(self):
+        """Keep sending breaks even though no banner has been seen"""
+        self.blind = True
+        self._wake.set()
+
+    def _on_data(self, text: str):
+        """Reader-thread callback for every received chunk"""
+        self._scan(self._tail + text)
+        self._tail = (self._tail + text)[-self.SCAN_OVERLAP:]
+
+    def _scan(self, text: str):
+        """Flag banner and ROM monitor prompt occurrences and wake the injector"""
+        if not self.banner_seen.is_set() and self.BANNER_PATTERN.search(text):
+            self.banner_time = time.time()
+            self.banner_seen.set()
+            self._wake.set()
+
+        # The banner names the platform a few lines further on
+        if self.banner_seen.is_set() and self.platform is None:
+            platform = BreakProfile.detect_platform(text)
+            if platform:
+                self.platform = platform
+                if self.on_platform:
+                    self.on_platform(platform)
+
+        if not self.rommon_seen.is_set():
+            for pattern in self.rommon_patterns:
+                if pattern.search(text):
+                    self.rommon_time = time.time()
+                    self.rommon_seen.set()
+                    self._wake.set()
+                    break
+
+    def _run(self):
+        """Injector thread: sleeps until woken by the reader or the next break is due"""
+        while self.running and not self.rommon_seen.is_set():
+            # Cleared before acting so a wake during the break is not lost
+            self._wake.clear()
+
+            if self.banner_seen.is_set() or self.blind:
+                self._inject()
+                interval = self.BURST_INTERVAL if self.banner_seen.is_set() else self.BLIND_INTERVAL
+            else:
+                interval = None
+
+            self._wake.wait(interval)
+
+    def _inject(self):
+        """Send one break with the next method in turn"""
+        methods = self.methods
+        method = methods[(self.attempts - self._cycle_start) % len(methods)]
+        self.attempts += 1
+        self.last_method = method
+
+        now = time.time()
+        self.sent.append((method, now))
+        if self.first_break_time is None and self.banner_seen.is_set():
+            self.first_break_time = now
+            if self.metrics and self.banner_time is not None:
+                self.metrics.record_operation("break_after_banner", now - self.banner_time)
+
+        if self.logger:
+            self.logger.debug(f"Break injection {self.attempts} ({BreakProfile.method_name(method)})")
+        self.serial_conn.send_break(method[0], duration=method[1])
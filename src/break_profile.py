@@ -0,0 +1,146 @@
+"""
+Learned break-method ranking per port, USB-serial adapter and router platform
+"""
+
+import json
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+
+# A break method name and the duration passed to SerialConnection.send_break
+BreakMethod = Tuple[str, float]
+
+
+class BreakProfile:
+    """Ranks break methods by how often and how fast they entered ROM monitor"""
+
+    # Every candidate, in the order tried before anything has been learned
+    CANDIDATES: List[BreakMethod] = [
+        ("standard", 0.25),
+        ("ioctl", 0.25),
+        ("multiple", 0.1),
+        ("standard", 0.5),
+        ("signal_toggle", 0.0),
+    ]
+
+    # Platform names printed in ROM monitor and bootstrap banners
+    PLATFORM_PATTERN = re.compile(r'\b((?:ISR|ASR|C)\d{3,4}[A-Z0-9]*(?:/K9)?)\b', re.IGNORECASE)
+
+    def __init__(self, profile_file: Optional[str] = None, logger: Optional[Any] = None):
+        """
+        Args:
+            profile_file: JSON file the statistics persist in, kept apart from
+                settings.json (kept in memory only when None)
+            logger: Optional logger
+        """
+        self.profile_file = Path(profile_file) if profile_file else None
+        self.logger = logger
+        self._lock = threading.Lock()
+        self.profiles: Dict[str, Dict[str, Dict[str, float]]] = self._load()
+
+    def _load(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Load statistics from the profile file"""
+        if self.profile_file is None or not self.profile_file.exists():
+            return {}
+        try:
+            with open(self.profile_file, 'r') as f:
+                return dict(json.load(f) or {})
+        except Exception as e:
+            if self.logger:
+                self.logger.warning(f"Failed to load break profiles: {e}, starting empty")
+            return {}
+
+    def _save(self):
+        """Write statistics to the profile file (caller holds the lock)"""
+        if self.profile_file is None:
+            return
+        try:
+            self.profile_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.profile_file, 'w') as f:
+                json.dump(self.profiles, f, indent=2)
+        except Exception as e:
+            if self.logger:
+                self.logger.error(f"Failed to save break profiles: {e}")
+
+    @staticmethod
+    def make_key(port: Optional[str], adapter: Optional[str], platform: Optional[str]) -> str:
+        """Profile key for a port, adapter VID:PID and router platform"""
+        return "|".join([port or "unknown", adapter or "unknown", (platform or "unknown").upper()])
+
+    @staticmethod
+    def method_name(method: BreakMethod) -> str:
+        return f"{method[0]}@{method[1]:g}"
+
+    @classmethod
+    def detect_platform(cls, output: str) -> Optional[str]:
+        """Find the router platform in boot or ROM monitor output"""
+        match = cls.PLATFORM_PATTERN.search(output)
+        return match.group(1).upper() if match else None
+
+    def _stats_for(self, key: str) -> Dict[str, Dict[str, float]]:
+        """Statistics for a key, falling back to other platforms on the same port and adapter"""
+        if key in self.profiles:
+            return self.profiles[key]
+
+        # A new platform on a known adapter still benefits from what the adapter did
+        prefix = key.rsplit("|", 1)[0] + "|"
+        merged: Dict[str, Dict[str, float]] = {}
+        for other, stats in self.profiles.items():
+            if other.startswith(prefix):
+                for name, s in stats.items():
+                    m = merged.setdefault(name, {'attempts': 0, 'successes': 0, 'latency_total': 0.0})
+                    for counter in m:
+                        m[counter] += s.get(counter, 0)
+        return merged
+
+    def rank(self, key: str) -> List[BreakMethod]:
+        """
+        Order break methods best first
+
+        Methods are scored by smoothed ROM monitor entry rate, then by mean
+        latency. Untried methods keep their default order behind proven ones.
+        """
+        with self._lock:
+            stats = self._stats_for(key)
+
+        def _score(item: Tuple[int, BreakMethod]) -> Tuple[float, float, int]:
+            index, method = item
+            s = stats.get(self.method_name(method))
+            if not s or not s.get('attempts'):
+                return (-0.5, 0.0, index)
+            rate = (s['successes'] + 1) / (s['attempts'] + 2)
+            latency = s['latency_total'] / s['successes'] if s['successes'] else float('inf')
+            return (-rate, latency, index)
+
+        return [method for _, method in sorted(enumerate(self.CANDIDATES), key=_score)]
+
+    def record(self, key: str, attempted: Sequence[BreakMethod],
+               succeeded: Optional[BreakMethod] = None, latency: float = 0.0):
+        """
+        Record the outcome of one break injection run
+
+        Args:
+            key: Profile key from make_key()
+            attempted: Every method sent during the run
+            succeeded: Method that got the ROM monitor prompt, if any
+            latency: Seconds from that method's break to the prompt
+        """
+        with self._lock:
+            stats = self.profiles.setdefault(key, {})
+            for method in attempted:
+                s = stats.setdefault(self.method_name(method),
+                                     {'attempts': 0, 'successes': 0, 'latency_total': 0.0})
+                s['attempts'] += 1
+            if succeeded is not None:
+                s = stats.setdefault(self.method_name(succeeded),
+                                     {'attempts': 1, 'successes': 0, 'latency_total': 0.0})
+                s['successes'] += 1
+                s['latency_total'] += latency
+
+            self._save()
+
+        if self.logger and succeeded is not None:
+            self.logger.debug(f"Break profile {key}: {self.method_name(succeeded)} "
+                              f"entered ROM monitor in {latency:.2f}s")
@@ -3,11 +3,12 @@ Main tool script for Cisco 4321 ISR Password Reset
 """
 
 import argparse
+import getpass
 import sys
 import time
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
 
 # Import all modules
 from logging_monitor import LoggingMonitor
@@ -15,6 +16,8 @@ from serial_connection import SerialConnection
 from prompt_detector import PromptDetector
 from retry_strategies import RetryManager
 from command_executor import CommandExecutor
+from command_cache import CommandCache
+from break_profile import BreakProfile
 from recovery_state_machine import RecoveryStateMachine, RecoveryState
 from rommon_handler import RommonHandler
 from password_reset import PasswordReset
@@ -23,6 +26,9 @@ from interactive_config import InteractiveConfig
 from config_backup import ConfigBackup
 from tui_interface import TUIInterface
 from settings_manager import SettingsManager
+from fleet_recovery import FleetRecovery
+from port_discovery import format_discovery
+from metrics_exporter import MetricsExporter
 
 
 class CiscoReset:
@@ -67,9 +73,36 @@ class CiscoReset:
             logger=self.log_monitor.logger
         )
         
+        # Break methods ranked by past ROM monitor entries, persisted next to
+        # settings.json but never through it
+        self.break_profile = BreakProfile(str(self.settings_manager.config_dir / "break_profiles.json"),
+                                          logger=self.log_monitor.logger)
+        
         # Auto-reconnect flag
         self.auto_reconnect_enabled = self.settings_manager.get("auto_reconnect", True)
         
+        # Console speed for bulk transfers; --bulk-baud overrides the setting
+        # for this run only, so it is kept out of the settings that get saved
+        self.bulk_baudrate: Optional[int] = self.settings_manager.get("bulk_baudrate")
+        
+        # Optional OpenMetrics endpoint (see serve_metrics)
+        self.metrics_exporter: Optional[MetricsExporter] = None
+        
+    def serve_metrics(self, port: Optional[int] = None, unix_socket: Optional[str] = None) -> str:
+        """
+        Serve live metrics in OpenMetrics format on localhost or a Unix socket
+        
+        Args:
+            port: TCP port for http://127.0.0.1:PORT/metrics
+            unix_socket: Unix socket path to serve on instead
+        
+        Returns:
+            Address being served
+        """
+        self.metrics_exporter = MetricsExporter(port=port, unix_socket=unix_socket,
+                                                logger=self.log_monitor.logger)
+        return self.metrics_exporter.start()
+        
     def connect(self, port: Optional[str] = None, baudrate: int = 9600) -> bool:
         """Connect to router"""
         self.log_monitor.logger.info("Connecting to router...")
@@ -80,7 +113,8 @@ class CiscoReset:
             port=port,
             baudrate=baudrate,
             logger=self.log_monitor.logger,
-            metrics=self.log_monitor.metrics
+            metrics=self.log_monitor.metrics,
+            buffer_size=self.settings_manager.get("output_buffer_size", 1024 * 1024)
         )
         
         # Auto-detect port if not provided
@@ -100,8 +134,12 @@ class CiscoReset:
                 if len(detected_ports) == 1:
                     port = detected_ports[0]
                 else:
+                    # Offer ports with a live console first
+                    self.tui.show_status(f"Probing {len(detected_ports)} ports for a console...", "info")
+                    ranked = self.serial_conn.discover_consoles(detected_ports)
+                    
                     # Use TUI to select port
-                    port = self.tui.show_port_selection(detected_ports)
+                    port = self.tui.show_port_selection(list(ranked))
                     if not port:
                         return False
         
@@ -114,6 +152,8 @@ class CiscoReset:
         
         # Record connection start time
         self.log_monitor.metrics.start_connection()
+        if self.metrics_exporter:
+            self.metrics_exporter.register(self.log_monitor.metrics, port)
         
         # Initialize command executor
         self.command_executor = CommandExecutor(
@@ -121,7 +161,8 @@ class CiscoReset:
             self.prompt_detector,
             self.retry_manager,
             logger=self.log_monitor.logger,
-            metrics=self.log_monitor.metrics
+            metrics=self.log_monitor.metrics,
+            cache=CommandCache(ttl=self.settings_manager.get("command_cache_ttl", 300.0))
         )
         
         # Initialize ROM monitor handler
@@ -131,7 +172,9 @@ class CiscoReset:
             self.state_machine,
             self.retry_manager,
             logger=self.log_monitor.logger,
-            metrics=self.log_monitor.metrics
+            metrics=self.log_monitor.metrics,
+            break_profile=self.break_profile,
+            cache=self.command_executor.cache
         )
         
         # Initialize password reset
@@ -147,7 +190,8 @@ class CiscoReset:
         self.system_detector = SystemDetector(
             self.command_executor,
             logger=self.log_monitor.logger,
-            metrics=self.log_monitor.metrics
+            metrics=self.log_monitor.metrics,
+            bulk_baudrate=self.bulk_baudrate
         )
         
         return True
@@ -226,6 +270,51 @@ class CiscoReset:
             )
             return False
     
+    def run_fleet_recovery(self, devices: List[str], max_concurrency: int = 4,
+                           baudrate: int = 9600) -> bool:
+        """
+        Run the password reset workflow on several routers in parallel
+        
+        Args:
+            devices: Entries of the form PORT or PORT=NAME
+            max_concurrency: Maximum routers worked on at the same time
+            baudrate: Console baud rate
+        
+        Returns:
+            True if every router was recovered
+        """
+        device_map = {}
+        for entry in devices:
+            port, _, name = entry.partition("=")
+            device_map[port] = name or Path(port).name
+        
+        password = getpass.getpass("Enter new enable secret password for all routers: ")
+        if not password or password != getpass.getpass("Confirm password: "):
+            self.log_monitor.logger.error("Passwords empty or do not match")
+            return False
+        
+        fleet = FleetRecovery(
+            device_map,
+            password,
+            max_concurrency=max_concurrency,
+            baudrate=baudrate,
+            bulk_baudrate=self.bulk_baudrate,
+            logger=self.log_monitor.logger,
+            monitoring_dir=str(self.log_monitor.monitoring_dir),
+            break_profile=self.break_profile,
+            exporter=self.metrics_exporter
+        )
+        report = fleet.run()
+        report_file = fleet.export_report(report)
+        
+        summary = report['summary']
+        level = "success" if summary['failed'] == 0 else "warning"
+        self.tui.show_status(
+            f"Fleet recovery: {summary['succeeded']}/{summary['total']} succeeded "
+            f"in {summary['wall_time']:.0f}s (report: {report_file})", level
+        )
+        return summary['failed'] == 0
+    
     def run_system_detection_only(self) -> bool:
         """Run system detection only"""
         if not self.command_executor:
@@ -405,6 +494,8 @@ class CiscoReset:
                         # Apply settings that affect runtime
                         if "log_level" in updated:
                             self.log_monitor.logger.setLevel(getattr(logging, updated["log_level"].upper(), logging.INFO))
+                        if "bulk_baudrate" in updated:
+                            self.bulk_baudrate = updated["bulk_baudrate"]
             elif choice == "9":
                 # Show metrics
                 metrics = self.log_monitor.get_current_metrics()
@@ -475,11 +566,50 @@ def main():
     parser.add_argument("--detect-only", action="store_true", help="Run system detection only")
     parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
     parser.add_argument("--no-tui", action="store_true", help="Disable TUI, use CLI only")
+    parser.add_argument("--fleet", nargs="+", metavar="PORT[=NAME]",
+                        help="Recover several routers in parallel")
+    parser.add_argument("--max-parallel", type=int, default=4,
+                        help="Routers recovered at once with --fleet (default: 4)")
+    parser.add_argument("--discover", action="store_true",
+                        help="Probe all TTY ports for a live Cisco console and exit")
+    parser.add_argument("--bulk-baud", type=int, choices=[19200, 38400, 57600, 115200],
+                        help="Raise console speed while collecting system information")
+    parser.add_argument("--capture", metavar="FILE",
+                        help="Record raw console traffic to a binary capture file")
+    parser.add_argument("--capture-max-mb", type=float,
+                        help="Stop capturing once the capture file reaches this size")
+    parser.add_argument("--capture-every", type=int, default=1, metavar="N",
+                        help="Capture only one received/sent chunk in every N (default: 1)")
+    parser.add_argument("--monitor-interval", type=float, metavar="SECONDS",
+                        help="Append metric deltas to monitoring/metrics_*.ndjson at this interval")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="Serve OpenMetrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-socket", metavar="PATH",
+                        help="Serve OpenMetrics over HTTP on a Unix socket")
     
     args = parser.parse_args()
     
     # Create application
     app = CiscoReset()
+    if args.bulk_baud:
+        app.bulk_baudrate = args.bulk_baud
+    if args.capture:
+        max_bytes = int(args.capture_max_mb * 1024 * 1024) if args.capture_max_mb else None
+        app.log_monitor.enable_capture(args.capture, max_bytes=max_bytes,
+                                       sample_every=args.capture_every)
+    if args.monitor_interval:
+        app.log_monitor.start_monitoring(interval=args.monitor_interval)
+    if args.metrics_port or args.metrics_socket:
+        app.serve_metrics(port=args.metrics_port, unix_socket=args.metrics_socket)
+    
+    if args.discover:
+        results = SerialConnection(logger=app.log_monitor.logger).discover_consoles()
+        for line in format_discovery(results):
+            print(line)
+        sys.exit(0 if results else 1)
+    
+    if args.fleet:
+        sys.exit(0 if app.run_fleet_recovery(args.fleet, args.max_parallel, args.baud) else 1)
     
     if args.no_tui:
         # CLI mode
@@ -0,0 +1,71 @@
+"""
+Per-session cache of raw show-command output with TTL expiry
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+
+class CommandCache:
+    """Raw command output keyed by device and command, expiring after a TTL"""
+
+    # Prefixes of exec commands that change router state (abbreviations included)
+    MUTATING_PREFIXES = ("conf", "wr", "copy", "reload", "erase", "del",
+                         "clear", "clock", "boot")
+
+    # Show commands whose output changes by itself from one moment to the
+    # next (second word, abbreviations included); never cached
+    VOLATILE_SHOW_PREFIXES = ("clo", "user", "proc", "log")
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        Args:
+            ttl: Seconds an output stays valid (0 disables caching)
+        """
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(device: str, command: str) -> Tuple[str, str]:
+        return device, " ".join(command.split())
+
+    def get(self, device: str, command: str) -> Optional[str]:
+        """Return cached output, or None if missing, expired or not cacheable"""
+        if not self.is_cacheable(command):
+            self.misses += 1
+            return None
+
+        entry = self._entries.get(self._key(device, command))
+        if entry is not None and time.time() - entry[0] < self.ttl:
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        return None
+
+    def put(self, device: str, command: str, output: str):
+        """Store the output of a successful command"""
+        if self.ttl > 0 and self.is_cacheable(command):
+            self._entries[self._key(device, command)] = (time.time(), output)
+
+    def invalidate(self, device: Optional[str] = None):
+        """Drop cached output for one device, or for every device"""
+        if device is None:
+            self._entries.clear()
+        else:
+            self._entries = {k: v for k, v in self._entries.items() if k[0] != device}
+
+    @classmethod
+    def is_cacheable(cls, command: str) -> bool:
+        """Check whether a command's output stays valid for the TTL"""
+        words = command.lower().split()
+        return not (len(words) >= 2 and words[0].startswith("sh")
+                    and words[1].startswith(cls.VOLATILE_SHOW_PREFIXES))
+
+    @classmethod
+    def is_mutating(cls, command: str) -> bool:
+        """Check whether a command can change what show commands return"""
+        words = command.split()
+        return bool(words) and words[0].lower().startswith(cls.MUTATING_PREFIXES)
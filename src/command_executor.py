@@ -5,26 +5,74 @@ Robust command execution with retries and verification
 import time
 import re
 from typing import Optional, Tuple, List, Callable, Any
-from prompt_detector import PromptDetector, RouterState
+from prompt_detector import PromptDetector, StreamingPromptDetector, RouterState
 from retry_strategies import RetryManager, RetryConfig
+from command_cache import CommandCache
+
+
+# Pager prompt, only checked at the end of the received output so pages that
+# were already answered never match again
+MORE_PROMPT = re.compile(r'--More--\s*$', re.IGNORECASE)
+
+# Pager prompts plus the backspace/space sequence that erases them
+PAGINATION_NOISE = re.compile(r' ?--More-- ?|\x08+ *\x08*', re.IGNORECASE)
+
+
+def at_more_prompt(output: str, chunk: str) -> bool:
+    """Check whether the newest chunk left the router waiting at a pager prompt"""
+    return MORE_PROMPT.search(output, max(0, len(output) - len(chunk) - 16)) is not None
+
+
+def strip_pagination(output: str) -> str:
+    """Remove pager prompts and their erase sequences from command output"""
+    return PAGINATION_NOISE.sub('', output)
+
+
+def ends_command(state: Optional[RouterState], expected_prompt: Optional[RouterState]) -> bool:
+    """
+    Check whether a state seen in command output ends the command
+
+    Boot-message words ("Cisco IOS", "Loading") also appear in ordinary show
+    output, so BOOTING only counts when it is what the caller waits for.
+    """
+    if state is None:
+        return False
+    if state == RouterState.BOOTING and expected_prompt != RouterState.BOOTING:
+        return False
+    return expected_prompt is None or state == expected_prompt or state == RouterState.ERROR
 
 
 class CommandExecutor:
     """Robust command execution with retries and verification"""
     
+    # Replies to 'copy running-config': destination question, then result
+    SAVE_CONFIG_PATTERNS = [
+        re.compile(r'Destination filename', re.IGNORECASE),
+        re.compile(r'bytes copied|\[OK\]', re.IGNORECASE),
+        re.compile(r'%\s*(?:Error|Invalid)[^\r\n]*', re.IGNORECASE),
+    ]
+    
     def __init__(self, serial_conn, prompt_detector: PromptDetector,
                  retry_manager: RetryManager, logger: Optional[Any] = None,
-                 metrics: Optional[Any] = None):
+                 metrics: Optional[Any] = None, cache: Optional[CommandCache] = None):
         self.serial_conn = serial_conn
         self.prompt_detector = prompt_detector
         self.retry_manager = retry_manager
         self.logger = logger
         self.metrics = metrics
         
-        # Pagination handling
-        self.more_pattern = re.compile(r'--More--', re.IGNORECASE)
+        # Show-command outputs reused by execute_cached()
+        self.cache = cache if cache is not None else CommandCache()
+        
+        # Pagination handling: None until terminal setup has been tried
+        self.paging_disabled: Optional[bool] = None
         self.pagination_keys = [' ', '\r', 'q']
         
+        # Last exec prompt seen, used to split batched output
+        self.last_state: Optional[RouterState] = None
+        self.last_hostname: Optional[str] = None
+        self._in_terminal_setup = False
+        
     def execute(self, command: str, expected_prompt: Optional[RouterState] = None,
                timeout: float = 30.0, retry: bool = True,
                wait_for_echo: bool = True) -> Tuple[bool, str]:
@@ -41,8 +89,16 @@ class CommandExecutor:
         Returns:
             Tuple of (success, output)
         """
+        if self.cache.is_mutating(command):
+            self.cache.invalidate(self.device)
+        
+        attempts = 0
+        
         def _execute():
-            return self._execute_once(command, expected_prompt, timeout, wait_for_echo)
+            nonlocal attempts
+            attempts += 1
+            return self._execute_once(command, expected_prompt, timeout, wait_for_echo,
+                                      retried=attempts > 1)
         
         if retry:
             config = RetryConfig(max_retries=3, base_delay=1.0)
@@ -53,68 +109,131 @@ class CommandExecutor:
                     config=config,
                     permanent_errors=[ValueError]  # Don't retry syntax errors
                 )
-                return success, output
             except Exception as e:
                 if self.logger:
                     self.logger.error(f"Command execution failed after retries: {e}")
                 return False, str(e)
         else:
-            return _execute()
+            success, output = _execute()
+        
+        # First exec prompt of the session: turn paging off for what follows
+        if (self.paging_disabled is None and not self._in_terminal_setup
+                and self.last_state in (RouterState.PRIVILEGED_MODE, RouterState.USER_MODE)):
+            self.setup_terminal()
+        
+        return success, output
+    
+    def setup_terminal(self) -> bool:
+        """
+        Disable paging and line wrapping for the current exec session
+        
+        Returns:
+            True if 'terminal length 0' was accepted
+        """
+        self._in_terminal_setup = True
+        try:
+            success, output = self.execute("terminal length 0", timeout=10.0, retry=False)
+            self.paging_disabled = success and not self.prompt_detector.has_error(output)
+            # Not every image accepts width 0; paging is what matters
+            self.execute("terminal width 0", timeout=10.0, retry=False)
+        finally:
+            self._in_terminal_setup = False
+        
+        if self.logger:
+            if self.paging_disabled:
+                self.logger.debug("Terminal paging disabled for this session")
+            else:
+                self.logger.debug("Could not disable paging, answering --More-- prompts instead")
+        return bool(self.paging_disabled)
     
     def _execute_once(self, command: str, expected_prompt: Optional[RouterState],
-                     timeout: float, wait_for_echo: bool) -> Tuple[bool, str]:
+                     timeout: float, wait_for_echo: bool, retried: bool = False) -> Tuple[bool, str]:
         """Execute command once (internal)"""
         start_time = time.time()
         
         # Clear output buffer
         self.serial_conn.clear_output_buffer()
+        since = self.serial_conn.get_stream_offset()
         
         # Send command
         written = self.serial_conn.write(command)
         if written == 0:
             return False, "Failed to write command"
         
-        # Wait for command echo
-        if wait_for_echo:
-            echo_timeout = min(2.0, timeout / 3)
-            echo_output = self.serial_conn.read_output(echo_timeout)
-            if command.strip() not in echo_output:
-                if self.logger:
-                    self.logger.debug("Command echo not detected, continuing anyway")
+        # Phase times below are measured from when the write (and flush) returned
+        sent_time = time.time()
+        first_byte_time: Optional[float] = None
+        echo_time: Optional[float] = None
+        echo_text = command.strip()
+        pages = 0
         
         # Read output until prompt appears
         output = ""
-        end_time = time.time() + timeout
-        
-        while time.time() < end_time:
-            chunk = self.serial_conn.read_output(0.5)
-            if chunk:
-                output += chunk
-                
-                # Check for pagination
-                if self.more_pattern.search(output):
-                    # Send space to continue
-                    self.serial_conn.write(' ')
-                    time.sleep(0.1)
-                    continue
-                
-                # Check for prompt
-                state, hostname, match_info = self.prompt_detector.detect_prompt(output)
-                if state is not None:
-                    if expected_prompt is None or state == expected_prompt:
-                        duration = time.time() - start_time
-                        if self.metrics:
-                            self.metrics.record_command_execution(duration)
-                            self.metrics.record_response_time(duration)
-                        return True, output
-                    elif state == RouterState.ERROR:
-                        # Error detected
-                        duration = time.time() - start_time
-                        if self.metrics:
-                            self.metrics.record_command_execution(duration)
-                        return False, output
+        detector = StreamingPromptDetector(self.prompt_detector)
+        
+        def _on_output(chunk: str) -> Optional[RouterState]:
+            nonlocal output, first_byte_time, echo_time, pages
+            if first_byte_time is None:
+                first_byte_time = time.time()
+            output += chunk
+            if echo_time is None and echo_text in output[-(len(chunk) + len(echo_text)):]:
+                echo_time = time.time()
+            
+            # Fallback when paging is still on: answer the pager prompt
+            if at_more_prompt(output, chunk):
+                if self.paging_disabled:
+                    # Session was reset under us (e.g. reload), set it up again
+                    self.paging_disabled = None
+                self.serial_conn.write(' ')
+                pages += 1
+                detector.feed(chunk)
+                return None
             
-            time.sleep(0.1)
+            state, hostname, match_info = detector.feed(chunk)
+            return state if ends_command(state, expected_prompt) else None
+        
+        state = self.serial_conn.wait_for(_on_output, timeout, since=since)
+        end_time = time.time()
+        received = self.serial_conn.get_stream_offset() - since
+        if self.metrics:
+            phases = {'write': sent_time - start_time}
+            if echo_time is not None:
+                phases['echo'] = echo_time - sent_time
+            if first_byte_time is not None:
+                phases['first_byte'] = first_byte_time - sent_time
+            if state is not None:
+                phases['prompt'] = end_time - sent_time
+            self.metrics.record_command_breakdown(
+                command.split()[0].lower() if command.split() else "<enter>", phases,
+                response_bytes=received,
+                transfer_time=end_time - first_byte_time if first_byte_time is not None else 0.0,
+                pages=pages, retried=retried, timed_out=state is None)
+        output = strip_pagination(output)
+        if state in (RouterState.PRIVILEGED_MODE, RouterState.USER_MODE):
+            _, self.last_hostname, _ = detector.current()
+        self.last_state = state
+        
+        # Drop the command echo from the returned output
+        if wait_for_echo:
+            echo_end = output.find(command.strip())
+            if echo_end >= 0:
+                output = output[echo_end + len(command.strip()):]
+            elif self.logger:
+                self.logger.debug("Command echo not detected, continuing anyway")
+        
+        if state is not None:
+            duration = time.time() - start_time
+            if self.metrics:
+                self.metrics.record_command_execution(duration)
+            if state == RouterState.CONFIG_MODE:
+                # Anything run in config mode may change show output
+                self.cache.invalidate(self.device)
+            if expected_prompt is not None and state != expected_prompt:
+                # Error detected
+                return False, output
+            if self.metrics:
+                self.metrics.record_response_time(duration)
+            return True, output
         
         # Timeout
         duration = time.time() - start_time
@@ -126,7 +245,116 @@ class CommandExecutor:
             self.logger.warning(f"Command execution timeout: {command}")
         
         return False, output
+
+    @property
+    def device(self) -> str:
+        """Cache key for the router on the other end of the connection"""
+        return getattr(self.serial_conn, 'port', None) or "default"
     
+    def execute_cached(self, command: str, timeout: float = 30.0) -> Tuple[bool, str]:
+        """
+        Execute a read-only command, reusing output cached for this device
+        
+        Args:
+            command: Show command to execute
+            timeout: Timeout in seconds on a cache miss
+        
+        Returns:
+            Tuple of (success, output)
+        """
+        output = self.cache.get(self.device, command)
+        if output is not None:
+            return True, output
+        
+        success, output = self.execute(command, timeout=timeout)
+        if success:
+            self.cache.put(self.device, command, output)
+        return success, output
+
+    def execute_batch(self, commands: List[str], timeout: float = 60.0) -> List[Tuple[bool, str]]:
+        """
+        Pipeline several read-only commands and split the output per command
+
+        Paging is turned off for the session first if that has not happened
+        yet, then all commands are written at once and the combined output
+        is split at the exec prompt. Falls back to one execute() per command
+        if no exec prompt has been seen yet.
+
+        Args:
+            commands: Commands to run, in order (show commands only)
+            timeout: Timeout in seconds for the whole batch
+
+        Returns:
+            List of (success, output) in the same order as commands
+        """
+        if not commands:
+            return []
+
+        start_time = time.time()
+
+        if self.paging_disabled is None:
+            self.setup_terminal()
+        
+        # The prompt that ended the last command is the one to split on
+        hostname = self.last_hostname
+        if not hostname or self.last_state not in (RouterState.PRIVILEGED_MODE,
+                                                   RouterState.USER_MODE):
+            if self.logger:
+                self.logger.debug("Prompt not learned, running batch sequentially")
+            return [self.execute(command, timeout=timeout) for command in commands]
+
+        prompt_re = re.compile(r'(?m)^[ \t]*' + re.escape(hostname) + r'[>#][ \t]*')
+
+        since = self.serial_conn.get_stream_offset()
+        written = self.serial_conn.write("\r".join(commands) + "\r")
+        if written == 0:
+            return [(False, "Failed to write command")] * len(commands)
+
+        # Collect until one prompt per command has come back
+        output = ""
+        prompts: List[Any] = []
+
+        def _on_output(chunk: str) -> bool:
+            nonlocal output
+            # Rescan only the tail that could hold a prompt split across chunks
+            scan_from = max(prompts[-1].end() if prompts else 0,
+                            len(output) - len(hostname) - 2)
+            output += chunk
+
+            if at_more_prompt(output, chunk):
+                self.serial_conn.write(' ')
+
+            prompts.extend(prompt_re.finditer(output, scan_from))
+            return len(prompts) >= len(commands)
+
+        complete = self.serial_conn.wait_for(_on_output, timeout, since=since)
+
+        results = []
+        segment_start = 0
+        for i, command in enumerate(commands):
+            if i < len(prompts):
+                segment = output[segment_start:prompts[i].start()]
+                segment_start = prompts[i].end()
+            else:
+                segment = output[segment_start:] if i == len(prompts) else ""
+                segment_start = len(output)
+
+            echo_end = segment.find(command.strip())
+            if echo_end >= 0:
+                segment = segment[echo_end + len(command.strip()):]
+            results.append((i < len(prompts), strip_pagination(segment)))
+
+        duration = time.time() - start_time
+        if self.metrics:
+            self.metrics.record_operation("execute_batch", duration, bool(complete))
+            if not complete:
+                self.metrics.record_timeout()
+
+        if not complete and self.logger:
+            self.logger.warning(f"Command batch timeout after {len(prompts)}/{len(commands)} commands")
+
+        return results
+
     def execute_with_verification(self, command: str, verification_func: Callable[[str], bool],
                                  timeout: float = 30.0) -> Tuple[bool, str]:
         """
@@ -174,14 +402,36 @@ class CommandExecutor:
     def save_config(self, filename: str = "startup-config") -> bool:
         """Save configuration"""
         command = f"copy running-config {filename}"
-        success, output = self.execute(command, timeout=60.0)
-        
-        # Handle potential prompts
-        if "Destination filename" in output:
-            # Send Enter to accept default
-            self.serial_conn.write('\r')
-            time.sleep(1.0)
-            output += self.serial_conn.read_output(10.0)
+        self.cache.invalidate(self.device)
+        
+        since = self.serial_conn.get_stream_offset()
+        if self.serial_conn.write(command) == 0:
+            return False
+        
+        # The destination question is not a prompt the detector knows, so
+        # expect it explicitly instead of timing out on it
+        output = ""
+        result = self.serial_conn.read_until(self.SAVE_CONFIG_PATTERNS, 60.0, since=since)
+        if result is not None:
+            output = result.text
+            if result.index == 0:
+                # Send Enter to accept default
+                self.serial_conn.write('\r')
+                result = self.serial_conn.read_until(self.SAVE_CONFIG_PATTERNS[1:], 60.0,
+                                                     since=result.offset)
+                if result is not None:
+                    output += result.text
+        
+        # The exec prompt follows the result; read it here so the next command
+        # does not take it for its own reply
+        if result is not None:
+            prompt = self.serial_conn.read_until(
+                self.prompt_detector.PRIVILEGED_MODE_PATTERNS + self.prompt_detector.USER_MODE_PATTERNS,
+                10.0, since=result.offset)
+            if prompt is not None:
+                output += prompt.text
+            elif self.logger:
+                self.logger.debug("No exec prompt after saving configuration")
         
         # Verify save success
         if "bytes copied" in output.lower() or "[OK]" in output:
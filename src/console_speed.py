@@ -0,0 +1,148 @@
+"""
+Temporary console line-speed upgrade for bulk show-command transfers
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Optional, Any, Iterator
+
+from prompt_detector import RouterState
+
+
+class ConsoleSpeed:
+    """Raises the IOS console speed on both ends of the line and puts it back"""
+
+    # Speeds accepted by 'line con 0 / speed' on the 4321 console
+    SUPPORTED_RATES = (9600, 19200, 38400, 57600, 115200)
+
+    # Time for the router to finish sending at the old rate before it switches
+    SWITCH_SETTLE = 0.2
+
+    PROBE_TIMEOUT = 3.0
+
+    def __init__(self, command_executor, logger: Optional[Any] = None,
+                 metrics: Optional[Any] = None):
+        self.command_executor = command_executor
+        self.serial_conn = command_executor.serial_conn
+        self.prompt_detector = command_executor.prompt_detector
+        self.logger = logger
+        self.metrics = metrics
+        self.original_rate: Optional[int] = None
+
+    @contextmanager
+    def upgraded(self, rate: int) -> Iterator[bool]:
+        """
+        Run a block at a higher console speed, restoring the original afterwards
+
+        Yields:
+            True if the link is running at the new rate
+        """
+        upgraded = self.upgrade(rate)
+        try:
+            yield upgraded
+        finally:
+            if upgraded:
+                self.restore()
+
+    def upgrade(self, rate: int) -> bool:
+        """
+        Switch router and local port to a new console speed
+
+        Returns:
+            True if the router answered a probe at the new rate
+        """
+        if rate not in self.SUPPORTED_RATES:
+            if self.logger:
+                self.logger.warning(f"Unsupported console speed {rate}, staying at "
+                                    f"{self.serial_conn.baudrate}")
+            return False
+        if rate == self.serial_conn.baudrate:
+            return False
+
+        start_time = time.time()
+        self.original_rate = self.serial_conn.baudrate
+        ok = self._switch(rate)
+
+        if self.metrics:
+            self.metrics.record_operation("console_speed_upgrade", time.time() - start_time, ok)
+        if self.logger:
+            if ok:
+                self.logger.info(f"Console speed raised from {self.original_rate} to {rate} baud")
+            else:
+                self.logger.warning(f"Could not raise console speed to {rate}, "
+                                    f"continuing at {self.serial_conn.baudrate}")
+        return ok
+
+    def restore(self) -> bool:
+        """
+        Put router and local port back to the speed used before upgrade()
+
+        Returns:
+            True if the router answered a probe at the original rate
+        """
+        if self.original_rate is None or self.original_rate == self.serial_conn.baudrate:
+            return True
+
+        ok = self._switch(self.original_rate)
+        if self.logger:
+            if ok:
+                self.logger.info(f"Console speed restored to {self.original_rate} baud")
+            else:
+                self.logger.error(f"Failed to restore console speed to {self.original_rate} baud")
+        if ok:
+            self.original_rate = None
+        return ok
+
+    def _switch(self, rate: int) -> bool:
+        """Change the router's console speed, follow it locally and probe the link"""
+        old_rate = self.serial_conn.baudrate
+
+        if not self.command_executor.enter_config_mode():
+            return False
+        success, _ = self.command_executor.execute("line con 0",
+                                                   expected_prompt=RouterState.CONFIG_MODE,
+                                                   timeout=10.0)
+        if not success:
+            self.command_executor.exit_config_mode()
+            return False
+
+        self._send_speed(rate)
+
+        if self.serial_conn.set_baudrate(rate) and self._probe():
+            self.command_executor.exit_config_mode()
+            return True
+
+        # Either end did not switch: find the rate the router answers at and
+        # send the reverting 'speed' from there
+        for probe_rate in (old_rate, rate):
+            if not self.serial_conn.set_baudrate(probe_rate) or not self._probe():
+                continue
+            if probe_rate != old_rate:
+                self._send_speed(old_rate)
+                self.serial_conn.set_baudrate(old_rate)
+                if not self._probe():
+                    break
+            self.command_executor.exit_config_mode()
+            return False
+
+        # Leave the local port where the router was last configured to be
+        self.serial_conn.set_baudrate(old_rate)
+        if self.logger:
+            self.logger.error(f"Router answers at neither {old_rate} nor {rate} baud")
+        return False
+
+    def _send_speed(self, rate: int):
+        """Send 'speed' under line con 0 and let the router switch"""
+        # The router switches as soon as it accepts the line, so there is no
+        # prompt to wait for at the old rate; wait for the echo instead
+        since = self.serial_conn.get_stream_offset()
+        self.serial_conn.write(f"speed {rate}")
+        self.serial_conn.read_until(r'speed\s+\d+', 2.0, since=since)
+        time.sleep(self.SWITCH_SETTLE)
+
+    def _probe(self) -> bool:
+        """Check that the router answers an empty line with a config prompt"""
+        since = self.serial_conn.get_stream_offset()
+        self.serial_conn.write("\r")
+        return self.serial_conn.read_until(self.prompt_detector.CONFIG_MODE_PATTERNS,
+                                           self.PROBE_TIMEOUT, since=since) is not None
@@ -0,0 +1,259 @@
+"""
+Parallel password recovery across many routers with an aggregated report
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Union, Sequence, Callable
+
+from logging_monitor import MetricsCollector
+from serial_connection import SerialConnection
+from serial_reactor import SerialReactor
+from prompt_detector import PromptDetector
+from retry_strategies import RetryManager
+from command_executor import CommandExecutor
+from recovery_state_machine import RecoveryStateMachine, RecoveryState
+from rommon_handler import RommonHandler
+from password_reset import PasswordReset
+from system_detector import SystemDetector
+from break_profile import BreakProfile
+
+
+@dataclass
+class DeviceResult:
+    """Outcome of the recovery workflow on one router"""
+    name: str
+    port: str
+    success: bool = False
+    failed_step: Optional[str] = None
+    error: Optional[str] = None
+    final_state: Optional[str] = None
+    duration: float = 0.0
+    step_times: Dict[str, float] = field(default_factory=dict)
+    detection: Dict[str, Any] = field(default_factory=dict)
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+
+class FleetRecovery:
+    """Runs the 7-step password reset workflow on many routers in parallel"""
+
+    WORKFLOW_STEPS = [
+        "wait_for_boot",
+        "send_break",
+        "set_config_register",
+        "reboot",
+        "wait_for_ios_boot",
+        "system_detection",
+        "password_reset",
+    ]
+
+    def __init__(self, devices: Union[Sequence[str], Dict[str, str]], enable_password: str,
+                 max_concurrency: int = 4, baudrate: int = 9600,
+                 bulk_baudrate: Optional[int] = None,
+                 run_detection: bool = True, logger: Optional[Any] = None,
+                 monitoring_dir: str = "monitoring",
+                 break_profile: Optional[BreakProfile] = None,
+                 exporter: Optional[Any] = None,
+                 connection_factory: Callable[..., SerialConnection] = SerialConnection):
+        """
+        Args:
+            devices: Port paths, or a mapping of port path to device name
+            enable_password: New enable secret applied to every router
+            max_concurrency: Maximum routers worked on at the same time
+            baudrate: Console baud rate
+            bulk_baudrate: Console speed used while collecting inventory (step 6)
+            run_detection: Whether to collect system inventory (step 6)
+            logger: Optional logger
+            monitoring_dir: Directory for exported reports
+            break_profile: Learned break-method ranking shared by all devices
+            exporter: Optional MetricsExporter each device's metrics are registered with
+            connection_factory: Builds each device's connection from the
+                SerialConnection arguments (e.g. the simulator's SimulatedConnection)
+        """
+        if isinstance(devices, dict):
+            self.devices = dict(devices)
+        else:
+            self.devices = {port: Path(port).name for port in devices}
+
+        self.enable_password = enable_password
+        self.max_concurrency = max(1, max_concurrency)
+        self.baudrate = baudrate
+        self.bulk_baudrate = bulk_baudrate
+        self.run_detection = run_detection
+        self.logger = logger
+        self.monitoring_dir = Path(monitoring_dir)
+        self.break_profile = break_profile if break_profile is not None else BreakProfile()
+        self.exporter = exporter
+        self.connection_factory = connection_factory
+
+        self.prompt_detector = PromptDetector()
+        self.results: List[DeviceResult] = []
+        self._results_lock = threading.Lock()
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Recover every device and build the fleet report
+
+        Returns:
+            Report dictionary (see build_report)
+        """
+        if self.logger:
+            self.logger.info(f"Starting fleet recovery on {len(self.devices)} devices "
+                             f"(max {self.max_concurrency} in parallel)")
+
+        self.results = []
+        start_time = time.time()
+
+        # One reader thread for all ports instead of one per connection
+        reactor = SerialReactor(logger=self.logger)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                    thread_name_prefix="fleet") as pool:
+                futures = {
+                    pool.submit(self.recover_device, port, name, reactor): name
+                    for port, name in self.devices.items()
+                }
+                for future in as_completed(futures):
+                    result = future.result()
+                    with self._results_lock:
+                        self.results.append(result)
+                    if self.logger:
+                        status = "succeeded" if result.success else f"failed at {result.failed_step}"
+                        self.logger.info(f"[{result.name}] Recovery {status} in {result.duration:.1f}s")
+        finally:
+            reactor.stop()
+
+        return self.build_report(time.time() - start_time)
+
+    def recover_device(self, port: str, name: str,
+                       reactor: Optional[SerialReactor] = None) -> DeviceResult:
+        """Run the full workflow on one router (called from a worker thread)"""
+        result = DeviceResult(name=name, port=port)
+        metrics = MetricsCollector()
+        start_time = time.time()
+        if self.exporter:
+            self.exporter.register(metrics, port, device=name)
+
+        # SerialConnection and RecoveryStateMachine call LoggingMonitor helpers
+        # (log_command, log_state_transition) that a plain Logger does not have
+        serial_conn = self.connection_factory(port=port, baudrate=self.baudrate,
+                                              metrics=metrics, reactor=reactor)
+        state_machine = RecoveryStateMachine(metrics=metrics)
+
+        try:
+            if not serial_conn.open():
+                result.failed_step = "connect"
+                result.error = f"Failed to open {port}"
+                return result
+
+            state_machine.transition(RecoveryState.CONNECTED, "Connected to router")
+            retry_manager = RetryManager(logger=self.logger, metrics=metrics)
+            executor = CommandExecutor(serial_conn, self.prompt_detector, retry_manager,
+                                       logger=self.logger, metrics=metrics)
+            rommon = RommonHandler(serial_conn, self.prompt_detector, state_machine,
+                                   retry_manager, logger=self.logger, metrics=metrics,
+                                   break_profile=self.break_profile,
+                                   cache=executor.cache)
+            password_reset = PasswordReset(executor, state_machine, logger=self.logger,
+                                           metrics=metrics, interactive=False)
+
+            def _detect() -> bool:
+                state_machine.transition(RecoveryState.SYSTEM_DETECTION, "Running system detection")
+                detector = SystemDetector(executor, logger=self.logger, metrics=metrics,
+                                          bulk_baudrate=self.bulk_baudrate)
+                result.detection = detector.detect_all()
+                return True
+
+            steps = [
+                ("wait_for_boot", lambda: rommon.wait_for_boot() or True),
+                ("send_break", rommon.send_break_sequence),
+                ("set_config_register", lambda: rommon.set_config_register("0x2142")),
+                ("reboot", rommon.reboot_router),
+                ("wait_for_ios_boot", rommon.wait_for_ios_boot),
+                ("system_detection", _detect if self.run_detection else None),
+                ("password_reset", lambda: password_reset.complete_password_reset(self.enable_password)),
+            ]
+
+            for step, func in steps:
+                if func is None:
+                    continue
+                if self.logger:
+                    self.logger.info(f"[{name}] {step}")
+                step_start = time.time()
+                ok = func()
+                result.step_times[step] = time.time() - step_start
+                if not ok:
+                    result.failed_step = step
+                    return result
+
+            result.success = True
+            return result
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            if self.logger:
+                self.logger.error(f"[{name}] Recovery error: {result.error}")
+            state_machine.enter_error_state(e, "Fleet recovery")
+            return result
+        finally:
+            serial_conn.close()
+            result.duration = time.time() - start_time
+            result.final_state = state_machine.get_current_state().value
+            result.metrics = metrics.get_metrics()
+
+    def build_report(self, wall_time: float) -> Dict[str, Any]:
+        """Aggregate per-device results and timings into one report"""
+        results = sorted(self.results, key=lambda r: r.name)
+        succeeded = [r for r in results if r.success]
+        durations = [r.duration for r in results]
+
+        step_stats = {}
+        for step in self.WORKFLOW_STEPS:
+            times = [r.step_times[step] for r in results if step in r.step_times]
+            if times:
+                step_stats[step] = {
+                    'count': len(times),
+                    'average': sum(times) / len(times),
+                    'min': min(times),
+                    'max': max(times)
+                }
+
+        failures: Dict[str, int] = {}
+        for r in results:
+            if not r.success:
+                key = r.failed_step or "error"
+                failures[key] = failures.get(key, 0) + 1
+
+        return {
+            'timestamp': datetime.now().isoformat(),
+            'summary': {
+                'total': len(results),
+                'succeeded': len(succeeded),
+                'failed': len(results) - len(succeeded),
+                'max_concurrency': self.max_concurrency,
+                'wall_time': wall_time,
+                'device_time_total': sum(durations),
+                'device_time_average': sum(durations) / len(durations) if durations else 0,
+                'failures_by_step': failures
+            },
+            'steps': step_stats,
+            'devices': [asdict(r) for r in results]
+        }
+
+    def export_report(self, report: Dict[str, Any], filename: Optional[str] = None) -> str:
+        """Export a fleet report to JSON in the monitoring directory"""
+        if filename is None:
+            filename = f"fleet_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.json"
+
+        self.monitoring_dir.mkdir(parents=True, exist_ok=True)
+        report_file = self.monitoring_dir / filename
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+
+        if self.logger:
+            self.logger.info(f"Fleet report exported to {report_file}")
+        return str(report_file)
@@ -9,49 +9,145 @@ import os
 import sys
 import time
 import threading
+import queue
+import atexit
 from datetime import datetime
 from pathlib import Path
 from collections import defaultdict, deque
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 import traceback
 
+from metrics_histogram import LatencyHistogram
+from session_capture import CaptureWriter, DIRECTION_RECEIVED, DIRECTION_SENT, DIRECTION_BREAK, format_hex
+
+
+class MetricsShard:
+    """
+    One thread's share of a MetricsCollector's counters and histograms
+
+    Only the owning thread writes to a shard, so its lock is uncontended
+    except while get_metrics() is merging it.
+    """
+    
+    __slots__ = ('lock', 'counters', 'histograms', 'owner')
+    
+    def __init__(self, owner: Optional[threading.Thread] = None):
+        self.lock = threading.Lock()
+        self.counters: Dict[tuple, int] = defaultdict(int)
+        self.histograms: Dict[tuple, LatencyHistogram] = defaultdict(LatencyHistogram)
+        self.owner = owner
+    
+    def merge_into(self, counters: Dict[tuple, int], histograms: Dict[tuple, LatencyHistogram]):
+        """Add this shard's counters and histograms to another set"""
+        with self.lock:
+            for key, value in self.counters.items():
+                counters[key] += value
+            for key, histogram in self.histograms.items():
+                histograms[key].merge(histogram)
+
 
 class MetricsCollector:
-    """Collects and tracks operation metrics"""
+    """
+    Collects and tracks operation metrics
+
+    Durations are kept in fixed-memory histograms and outcomes in counters, so
+    memory stays flat over long fleet runs and get_metrics() costs the same
+    after ten commands as after a million. Counters and histograms live in
+    per-thread shards that are merged on read, so the serial reader thread
+    and the caller never contend for a shared lock.
+    """
+    
+    # Recent break attempts kept in full for display
+    RECENT_BREAK_ATTEMPTS = 100
     
     def __init__(self):
-        self.operation_times: Dict[str, List[float]] = defaultdict(list)
-        self.retry_counts: Dict[str, int] = defaultdict(int)
-        self.success_rates: Dict[str, List[bool]] = defaultdict(list)
-        self.response_times: List[float] = []
-        self.bytes_sent: int = 0
-        self.bytes_received: int = 0
+        self._local = threading.local()
+        self._shards: List[MetricsShard] = []
+        self._shards_lock = threading.Lock()
+        # Totals of threads that have exited, folded in by snapshot()
+        self._retired = MetricsShard()
         self.connection_start_time: Optional[float] = None
-        self.error_counts: Dict[str, int] = defaultdict(int)
-        self.timeout_occurrences: int = 0
         self.state_history: deque = deque(maxlen=1000)
-        self.break_attempts: List[Dict[str, Any]] = []
+        self.break_attempts: deque = deque(maxlen=self.RECENT_BREAK_ATTEMPTS)
         self.rommon_entry_time: Optional[float] = None
         self.boot_duration: Optional[float] = None
-        self.command_execution_times: List[float] = []
+        self.current_state: Optional[str] = None
+        self._state_entered: Optional[float] = None
+        
+    def _shard(self) -> MetricsShard:
+        """The calling thread's shard, created on first use"""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = MetricsShard(threading.current_thread())
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+        
+    def _count(self, key: tuple, amount: int = 1):
+        shard = self._shard()
+        with shard.lock:
+            shard.counters[key] += amount
+            
+    def _observe(self, key: tuple, value: float):
+        shard = self._shard()
+        with shard.lock:
+            shard.histograms[key].record(value)
+            
+    def snapshot(self) -> Tuple[Dict[tuple, int], Dict[tuple, LatencyHistogram]]:
+        """
+        Counters and histograms summed across every thread's shard
+
+        Keys are tuples of a kind and an optional name, e.g. ('bytes_sent',),
+        ('retry', operation), ('break_success', method), ('command',),
+        ('break', method), ('dwell', state) or ('command_phase', verb, phase).
+        """
+        counters: Dict[tuple, int] = defaultdict(int)
+        histograms: Dict[tuple, LatencyHistogram] = defaultdict(LatencyHistogram)
+        with self._shards_lock:
+            # A thread that has exited never writes again: fold its shard into
+            # the retired totals so per-connection threads do not pile up
+            live = []
+            for shard in self._shards:
+                if shard.owner is not None and not shard.owner.is_alive():
+                    with self._retired.lock:
+                        shard.merge_into(self._retired.counters, self._retired.histograms)
+                else:
+                    live.append(shard)
+            self._shards = live
+            shards = [self._retired] + live
+        for shard in shards:
+            shard.merge_into(counters, histograms)
+        return counters, histograms
         
     def record_operation(self, operation: str, duration: float, success: bool = True):
         """Record an operation with its duration and success status"""
-        self.operation_times[operation].append(duration)
-        self.success_rates[operation].append(success)
+        shard = self._shard()
+        with shard.lock:
+            shard.histograms[('operation', operation)].record(duration)
+            shard.counters[('success' if success else 'failure', operation)] += 1
         
     def record_retry(self, operation: str):
         """Record a retry attempt for an operation"""
-        self.retry_counts[operation] += 1
+        self._count(('retry', operation))
         
     def record_response_time(self, response_time: float):
         """Record response time"""
-        self.response_times.append(response_time)
+        self._observe(('response',), response_time)
         
     def record_bytes(self, sent: int = 0, received: int = 0):
-        """Record bytes sent/received"""
-        self.bytes_sent += sent
-        self.bytes_received += received
+        """
+        Record bytes sent/received
+
+        Called by the transport (SerialConnection, AsyncConsole) only, so each
+        byte on the wire is counted exactly once.
+        """
+        shard = self._shard()
+        with shard.lock:
+            if sent:
+                shard.counters[('bytes_sent',)] += sent
+            if received:
+                shard.counters[('bytes_received',)] += received
         
     def start_connection(self):
         """Mark connection start time"""
@@ -65,14 +161,18 @@ class MetricsCollector:
         
     def record_error(self, error_type: str):
         """Record an error occurrence"""
-        self.error_counts[error_type] += 1
+        self._count(('error', error_type))
         
     def record_timeout(self):
         """Record a timeout occurrence"""
-        self.timeout_occurrences += 1
+        self._count(('timeout',))
         
     def record_state_transition(self, from_state: str, to_state: str, timestamp: float):
-        """Record a state machine transition"""
+        """Record a state machine transition and how long from_state lasted"""
+        if self._state_entered is not None:
+            self._observe(('dwell', from_state), timestamp - self._state_entered)
+        self.current_state = to_state
+        self._state_entered = timestamp
         self.state_history.append({
             'from': from_state,
             'to': to_state,
@@ -82,6 +182,10 @@ class MetricsCollector:
         
     def record_break_attempt(self, method: str, duration: float, success: bool, timestamp: float):
         """Record a break sequence attempt"""
+        shard = self._shard()
+        with shard.lock:
+            shard.histograms[('break', method)].record(duration)
+            shard.counters[('break_success' if success else 'break_failure', method)] += 1
         self.break_attempts.append({
             'method': method,
             'duration': duration,
@@ -100,56 +204,120 @@ class MetricsCollector:
         
     def record_command_execution(self, duration: float):
         """Record command execution time"""
-        self.command_execution_times.append(duration)
+        self._observe(('command',), duration)
+        
+    def record_command_breakdown(self, verb: str, phases: Dict[str, float], response_bytes: int = 0,
+                                 transfer_time: float = 0.0, pages: int = 0,
+                                 retried: bool = False, timed_out: bool = False):
+        """
+        Record where the time went in one command, aggregated per command verb
+        
+        Args:
+            verb: First word of the command
+            phases: Seconds per phase: 'write' (write and flush), then 'echo',
+                'first_byte' and 'prompt' counted from when the write returned;
+                phases that never happened are left out
+            response_bytes: Bytes received for the command
+            transfer_time: Seconds from the first received byte to the prompt
+            pages: --More-- prompts answered
+            retried: Whether this was a retry of the command
+            timed_out: Whether the prompt never came
+        """
+        shard = self._shard()
+        with shard.lock:
+            for phase, seconds in phases.items():
+                shard.histograms[('command_phase', verb, phase)].record(seconds)
+            shard.counters[('command_bytes', verb)] += response_bytes
+            shard.counters[('command_pages', verb)] += pages
+            shard.counters[('command_retries', verb)] += int(retried)
+            shard.counters[('command_timeouts', verb)] += int(timed_out)
+            if transfer_time > 0:
+                shard.histograms[('command_transfer', verb)].record(transfer_time)
+        
+    def _command_breakdown(self, counters: Dict[tuple, int],
+                           histograms: Dict[tuple, LatencyHistogram]) -> Dict[str, Any]:
+        """Per-verb phase percentiles, throughput, pages and retries"""
+        breakdown: Dict[str, Any] = {}
+        for key, histogram in histograms.items():
+            if key[0] == 'command_phase':
+                verb, phase = key[1], key[2]
+                breakdown.setdefault(verb, {})[phase] = histogram.summary()
+        for verb, entry in breakdown.items():
+            transfer = histograms.get(('command_transfer', verb))
+            response_bytes = counters.get(('command_bytes', verb), 0)
+            entry['count'] = entry['write']['count'] if 'write' in entry else 0
+            entry['bytes'] = response_bytes
+            entry['bytes_per_second'] = (response_bytes / transfer.total
+                                         if transfer and transfer.total else 0)
+            entry['pages'] = counters.get(('command_pages', verb), 0)
+            entry['retries'] = counters.get(('command_retries', verb), 0)
+            entry['timeouts'] = counters.get(('command_timeouts', verb), 0)
+        return breakdown
+        
+    @staticmethod
+    def _outcomes(successes: int, failures: int) -> Dict[str, Any]:
+        total = successes + failures
+        return {
+            'total': total,
+            'successes': successes,
+            'failures': failures,
+            'rate': successes / total if total else 0
+        }
+        
+    @staticmethod
+    def _by_name(table: Dict[tuple, Any], kind: str) -> Dict[str, Any]:
+        """Entries of a merged table whose key is (kind, name), keyed by name"""
+        return {key[1]: value for key, value in table.items() if key[0] == kind}
         
     def get_metrics(self) -> Dict[str, Any]:
         """Get all collected metrics"""
+        counters, histograms = self.snapshot()
+        sent = counters.get(('bytes_sent',), 0)
+        received = counters.get(('bytes_received',), 0)
+        successes = self._by_name(counters, 'success')
+        failures = self._by_name(counters, 'failure')
+        break_successes = self._by_name(counters, 'break_success')
+        break_failures = self._by_name(counters, 'break_failure')
+        
         metrics = {
             'operation_times': {
-                op: {
-                    'count': len(times),
-                    'total': sum(times),
-                    'average': sum(times) / len(times) if times else 0,
-                    'min': min(times) if times else 0,
-                    'max': max(times) if times else 0
-                }
-                for op, times in self.operation_times.items()
+                op: histogram.summary()
+                for op, histogram in self._by_name(histograms, 'operation').items()
             },
-            'retry_counts': dict(self.retry_counts),
+            'retry_counts': self._by_name(counters, 'retry'),
             'success_rates': {
-                op: {
-                    'total': len(results),
-                    'successes': sum(results),
-                    'failures': len(results) - sum(results),
-                    'rate': sum(results) / len(results) if results else 0
-                }
-                for op, results in self.success_rates.items()
-            },
-            'response_times': {
-                'count': len(self.response_times),
-                'average': sum(self.response_times) / len(self.response_times) if self.response_times else 0,
-                'min': min(self.response_times) if self.response_times else 0,
-                'max': max(self.response_times) if self.response_times else 0
+                op: self._outcomes(successes.get(op, 0), failures.get(op, 0))
+                for op in set(successes) | set(failures)
             },
+            'response_times': histograms[('response',)].summary(),
             'bytes': {
-                'sent': self.bytes_sent,
-                'received': self.bytes_received,
-                'total': self.bytes_sent + self.bytes_received
+                'sent': sent,
+                'received': received,
+                'total': sent + received
             },
             'connection': {
                 'start_time': self.connection_start_time,
                 'uptime': self.get_connection_uptime()
             },
-            'errors': dict(self.error_counts),
-            'timeouts': self.timeout_occurrences,
+            'errors': self._by_name(counters, 'error'),
+            'timeouts': counters.get(('timeout',), 0),
             'state_transitions': list(self.state_history),
-            'break_attempts': self.break_attempts,
+            'current_state': self.current_state,
+            'state_dwell': {
+                state: histogram.summary()
+                for state, histogram in self._by_name(histograms, 'dwell').items()
+            },
+            'break_attempts': list(self.break_attempts),
+            'break_methods': {
+                method: dict(self._outcomes(break_successes.get(method, 0),
+                                            break_failures.get(method, 0)),
+                             duration=histogram.summary())
+                for method, histogram in self._by_name(histograms, 'break').items()
+            },
             'rommon_entry_time': self.rommon_entry_time,
             'boot_duration': self.boot_duration,
-            'command_execution': {
-                'count': len(self.command_execution_times),
-                'average': sum(self.command_execution_times) / len(self.command_execution_times) if self.command_execution_times else 0
-            }
+            'command_execution': histograms[('command',)].summary(),
+            'commands': self._command_breakdown(counters, histograms)
         }
         return metrics
 
@@ -189,6 +357,318 @@ class StructuredFormatter(logging.Formatter):
         return json.dumps(log_entry)
 
 
+class LazyHexDump:
+    """Log message that renders its hex dump only if a handler formats it"""
+    
+    def __init__(self, data: bytes, label: str):
+        self.data = bytes(data)
+        self.label = label
+    
+    def __str__(self) -> str:
+        lines = format_hex(self.data)
+        return f"{self.label} ({len(self.data)} bytes):\n" + "\n".join(lines)
+
+
+class DeferredFlushFileHandler(logging.handlers.RotatingFileHandler):
+    """Rotating file handler that leaves flushing to the background writer"""
+    
+    def flush(self):
+        # Called by emit() after every record; the writer flushes per batch instead
+        pass
+    
+    def flush_now(self):
+        """Flush buffered records to disk"""
+        super().flush()
+
+
+class QueueingHandler(logging.Handler):
+    """Handler that only enqueues records for an AsyncLogWriter"""
+    
+    def __init__(self, writer: 'AsyncLogWriter', handlers: List[logging.Handler]):
+        super().__init__()
+        self.writer = writer
+        self.handlers = handlers
+    
+    def emit(self, record: logging.LogRecord):
+        # Freeze the message now so later changes to the arguments are not logged;
+        # argument-free messages such as LazyHexDump are formatted by the writer
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        self.writer.enqueue(self.handlers, record)
+    
+    def close(self):
+        for handler in self.handlers:
+            handler.close()
+        super().close()
+
+
+class AsyncLogWriter:
+    """Background thread that runs the real log handlers in batches"""
+    
+    # Longest a record above DEBUG waits for room in a full queue
+    PUT_TIMEOUT = 0.1
+    
+    def __init__(self, max_queue: int = 10000, batch_size: int = 256,
+                 flush_interval: float = 0.5):
+        """
+        Args:
+            max_queue: Records held before new ones are dropped
+            batch_size: Records handled per batch
+            flush_interval: Longest time written records stay unflushed
+        """
+        self.queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._handlers: List[logging.Handler] = []
+        self._stop = object()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+    
+    def add_handler(self, handler: Any):
+        """Register a handler (or anything with flush()) so it is flushed with each batch"""
+        self._handlers.append(handler)
+    
+    def enqueue(self, handlers: List[logging.Handler], record: logging.LogRecord):
+        """
+        Queue a record
+        
+        DEBUG records (per-chunk console traffic from the reader thread) are
+        dropped at once when the queue is full; anything more important waits
+        up to PUT_TIMEOUT for room before it is dropped too, so the caller
+        never blocks on a slow writer. Once the writer has stopped, records
+        are written on the calling thread.
+        """
+        if not self.running or not self.thread.is_alive():
+            self._handle(handlers, record)
+            return
+        try:
+            self.queue.put_nowait((handlers, record))
+        except queue.Full:
+            if record.levelno > logging.DEBUG:
+                try:
+                    self.queue.put((handlers, record), timeout=self.PUT_TIMEOUT)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+    
+    def stop(self, timeout: float = 5.0):
+        """Write everything still queued, then stop the thread"""
+        if not self.running:
+            return
+        self.running = False
+        try:
+            self.queue.put(self._stop, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout=timeout)
+    
+    def _run(self):
+        last_flush = time.time()
+        stopping = False
+        
+        while not stopping:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            
+            for entry in batch:
+                if entry is self._stop:
+                    stopping = True
+                    continue
+                self._handle(*entry)
+            
+            if stopping or time.time() - last_flush >= self.flush_interval:
+                self._flush()
+                last_flush = time.time()
+                
+                if self.dropped != self._reported_dropped:
+                    sys.stderr.write(f"log writer: {self.dropped - self._reported_dropped} "
+                                     f"records dropped (queue full)\n")
+                    self._reported_dropped = self.dropped
+    
+    @staticmethod
+    def _handle(handlers: List[logging.Handler], record: logging.LogRecord):
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                try:
+                    handler.handle(record)
+                except Exception:
+                    handler.handleError(record)
+    
+    def _flush(self):
+        for handler in self._handlers:
+            try:
+                if isinstance(handler, DeferredFlushFileHandler):
+                    handler.flush_now()
+                else:
+                    handler.flush()
+            except Exception:
+                pass
+
+
+class MetricsSnapshotWriter:
+    """
+    Background thread appending metric deltas to a rolling NDJSON file
+
+    Every interval the collector is snapshotted and one compact JSON line is
+    written with only what changed since the previous line: counter
+    increments, per-histogram count/sum/percentiles of the new samples, and
+    state transitions. Intervals with no activity write nothing; 'dt' is
+    always the time covered since the previous line. Each file starts with a
+    'base' line of cumulative counters so it can be read on its own.
+    """
+    
+    def __init__(self, metrics: MetricsCollector, path: Path, interval: float = 5.0,
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 5):
+        """
+        Args:
+            metrics: Collector to snapshot
+            path: NDJSON file to append to
+            interval: Seconds between snapshots
+            max_bytes: Size at which the file is rolled over to PATH.1
+            backup_count: Rolled-over files kept
+        """
+        self.metrics = metrics
+        self.path = Path(path)
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.lines_written = 0
+        
+        self._file = None
+        self._counters: Dict[tuple, int] = {}
+        self._histograms: Dict[tuple, LatencyHistogram] = {}
+        self._transitions_seen = 0.0
+        self._last_written = time.time()
+        self._stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-snapshot", daemon=True)
+    
+    def start(self):
+        self._open()
+        self.thread.start()
+    
+    def stop(self, timeout: float = 5.0):
+        """Write a final snapshot and close the file"""
+        if self._stop_event.is_set():
+            return
+        self._stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        if self._file:
+            self._file.close()
+            self._file = None
+    
+    @staticmethod
+    def _key(key: tuple) -> str:
+        return "/".join(str(part) for part in key)
+    
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        counters, _ = self.metrics.snapshot()
+        self._write({
+            't': round(time.time(), 3),
+            'base': {self._key(key): value for key, value in counters.items() if value},
+            'state': self.metrics.current_state,
+        })
+    
+    def _roll(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{i}")
+            if older.exists():
+                older.replace(self.path.with_name(f"{self.path.name}.{i + 1}"))
+        if self.backup_count > 0:
+            self.path.replace(self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._open()
+    
+    def _write(self, entry: Dict[str, Any]):
+        self._file.write(json.dumps(entry, separators=(',', ':'), default=str) + "\n")
+        self._file.flush()
+        self.lines_written += 1
+    
+    def snapshot(self) -> Optional[Dict[str, Any]]:
+        """
+        Build the delta line for everything recorded since the previous one
+        
+        Returns:
+            Entry to write, or None if nothing changed
+        """
+        now = time.time()
+        counters, histograms = self.metrics.snapshot()
+        
+        counter_deltas = {}
+        for key, value in counters.items():
+            delta = value - self._counters.get(key, 0)
+            if delta:
+                counter_deltas[self._key(key)] = delta
+        
+        histogram_deltas = {}
+        for key, histogram in histograms.items():
+            previous = self._histograms.get(key)
+            fresh = histogram.since(previous) if previous else histogram
+            if fresh.count:
+                summary = fresh.summary()
+                histogram_deltas[self._key(key)] = {
+                    'n': summary['count'],
+                    'sum': round(summary['total'], 6),
+                    'p50': round(summary['p50'], 6),
+                    'p90': round(summary['p90'], 6),
+                    'p99': round(summary['p99'], 6),
+                    'max': round(summary['max'], 6),
+                }
+        
+        new_transitions = [entry for entry in list(self.metrics.state_history)
+                           if entry['timestamp'] > self._transitions_seen]
+        transitions = [[round(entry['timestamp'], 3), entry['from'], entry['to']]
+                       for entry in new_transitions]
+        
+        self._counters = counters
+        self._histograms = histograms
+        if new_transitions:
+            self._transitions_seen = new_transitions[-1]['timestamp']
+        
+        if not (counter_deltas or histogram_deltas or transitions):
+            return None
+        
+        entry: Dict[str, Any] = {'t': round(now, 3), 'dt': round(now - self._last_written, 3)}
+        if counter_deltas:
+            entry['c'] = counter_deltas
+        if histogram_deltas:
+            entry['h'] = histogram_deltas
+        if transitions:
+            entry['s'] = transitions
+        self._last_written = now
+        return entry
+    
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._snapshot_once()
+        self._snapshot_once()
+    
+    def _snapshot_once(self):
+        try:
+            entry = self.snapshot()
+            if entry is None:
+                return
+            if self._file.tell() >= self.max_bytes:
+                self._roll()
+            self._write(entry)
+        except Exception as e:
+            sys.stderr.write(f"metrics snapshot: {e}\n")
+
+
 class LoggingMonitor:
     """Extensive logging and monitoring system"""
     
@@ -206,20 +686,46 @@ class LoggingMonitor:
         # Metrics collector
         self.metrics = MetricsCollector()
         
+        # Handlers run on a background writer so callers such as the serial
+        # reader thread only enqueue records
+        self.log_writer = AsyncLogWriter()
+        atexit.register(self.close)
+        
         # Setup loggers
         self.logger = self._setup_logger()
         self.command_logger = self._setup_command_logger()
         self.state_logger = self._setup_state_logger()
         
+        # Raw console capture, enabled with enable_capture()
+        self.capture: Optional[CaptureWriter] = None
+        
         # Real-time monitoring
         self.monitoring_active = False
         self.monitoring_thread: Optional[threading.Thread] = None
+        self.snapshot_writer: Optional[MetricsSnapshotWriter] = None
         
+    def _queue_handlers(self, handlers: List[logging.Handler]) -> QueueingHandler:
+        """Front a logger's handlers with the background writer"""
+        for handler in handlers:
+            self.log_writer.add_handler(handler)
+        return QueueingHandler(self.log_writer, handlers)
+    
+    def close(self):
+        """Write out queued log records and close the log files"""
+        self.stop_monitoring()
+        self.log_writer.stop()
+        if self.capture:
+            self.capture.close()
+        for logger in (self.logger, self.command_logger, self.state_logger):
+            for handler in logger.handlers:
+                handler.close()
+    
     def _setup_logger(self) -> logging.Logger:
         """Setup main logger with multiple handlers"""
         logger = logging.getLogger('cisco_reset')
         logger.setLevel(self.log_level)
         logger.handlers.clear()
+        handlers: List[logging.Handler] = []
         
         # Console handler with colors
         if self.enable_console:
@@ -230,11 +736,11 @@ class LoggingMonitor:
                 datefmt='%Y-%m-%d %H:%M:%S'
             )
             console_handler.setFormatter(console_formatter)
-            logger.addHandler(console_handler)
+            handlers.append(console_handler)
         
         # Rotating file handler
         log_file = self.log_dir / f"cisco_reset_{datetime.now().strftime('%Y-%m-%d')}.log"
-        file_handler = logging.handlers.RotatingFileHandler(
+        file_handler = DeferredFlushFileHandler(
             log_file,
             maxBytes=10 * 1024 * 1024,  # 10MB
             backupCount=30,
@@ -246,11 +752,11 @@ class LoggingMonitor:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
         
         # Structured JSON handler
         json_log_file = self.log_dir / f"cisco_reset_{datetime.now().strftime('%Y-%m-%d')}.json"
-        json_handler = logging.handlers.RotatingFileHandler(
+        json_handler = DeferredFlushFileHandler(
             json_log_file,
             maxBytes=10 * 1024 * 1024,
             backupCount=30,
@@ -258,8 +764,9 @@ class LoggingMonitor:
         )
         json_handler.setLevel(logging.DEBUG)
         json_handler.setFormatter(StructuredFormatter())
-        logger.addHandler(json_handler)
+        handlers.append(json_handler)
         
+        logger.addHandler(self._queue_handlers(handlers))
         return logger
     
     def _setup_command_logger(self) -> logging.Logger:
@@ -270,7 +777,7 @@ class LoggingMonitor:
         logger.propagate = False
         
         command_log_file = self.log_dir / f"commands_{datetime.now().strftime('%Y-%m-%d')}.log"
-        handler = logging.handlers.RotatingFileHandler(
+        handler = DeferredFlushFileHandler(
             command_log_file,
             maxBytes=10 * 1024 * 1024,
             backupCount=30,
@@ -281,7 +788,7 @@ class LoggingMonitor:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(self._queue_handlers([handler]))
         
         return logger
     
@@ -293,7 +800,7 @@ class LoggingMonitor:
         logger.propagate = False
         
         state_log_file = self.log_dir / f"state_{datetime.now().strftime('%Y-%m-%d')}.log"
-        handler = logging.handlers.RotatingFileHandler(
+        handler = DeferredFlushFileHandler(
             state_log_file,
             maxBytes=10 * 1024 * 1024,
             backupCount=30,
@@ -304,7 +811,7 @@ class LoggingMonitor:
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.addHandler(self._queue_handlers([handler]))
         
         return logger
     
@@ -312,10 +819,6 @@ class LoggingMonitor:
         """Log a command sent or response received"""
         extra = {'direction': direction}
         self.command_logger.debug(command, extra=extra)
-        if direction == "SENT":
-            self.metrics.record_bytes(sent=len(command.encode('utf-8')))
-        else:
-            self.metrics.record_bytes(received=len(command.encode('utf-8')))
     
     def log_state_transition(self, from_state: str, to_state: str, reason: str = ""):
         """Log a state machine transition"""
@@ -327,6 +830,8 @@ class LoggingMonitor:
         }
         self.state_logger.info(f"State transition: {from_state} -> {to_state}", extra=extra)
         self.metrics.record_state_transition(from_state, to_state, timestamp)
+        if self.capture:
+            self.capture.set_state(to_state)
     
     def log_operation(self, operation: str, message: str, level: str = "INFO", 
                      duration: Optional[float] = None, success: Optional[bool] = None,
@@ -347,12 +852,44 @@ class LoggingMonitor:
             
         self.logger.log(log_level, message, extra=extra)
     
+    def enable_capture(self, path: str, max_bytes: Optional[int] = None,
+                       sample_every: int = 1) -> CaptureWriter:
+        """
+        Record raw console bytes to a binary capture file
+        
+        While capture is on, hex dumps go to the file instead of the log,
+        tagged with the current recovery state, and are only rendered when
+        viewed (python session_capture.py FILE [--state rom_monitor]).
+        
+        Args:
+            path: Capture file
+            max_bytes: Stop capturing once the file reaches this size
+            sample_every: Keep one chunk in every N
+        
+        Returns:
+            The capture writer
+        """
+        if self.capture:
+            self.capture.close()
+        self.capture = CaptureWriter(path, max_bytes=max_bytes, sample_every=sample_every)
+        # Flushed alongside the log files by the background writer
+        self.log_writer.add_handler(self.capture)
+        self.logger.info(f"Capturing console traffic to {path}")
+        return self.capture
+    
+    def wants_hex_dump(self) -> bool:
+        """True if log_hex_dump() would record anything"""
+        return self.capture is not None or self.logger.isEnabledFor(logging.DEBUG)
+    
     def log_hex_dump(self, data: bytes, label: str = "Data"):
-        """Log binary data as hex dump (DEBUG only)"""
-        if self.log_level <= logging.DEBUG:
-            hex_str = ' '.join(f'{b:02x}' for b in data)
-            self.logger.debug(f"{label} (hex): {hex_str}")
-            self.logger.debug(f"{label} (len): {len(data)} bytes")
+        """Record binary data to the capture file, or log it as a hex dump (DEBUG only)"""
+        if self.capture:
+            direction = {"sent": DIRECTION_SENT, "break": DIRECTION_BREAK}.get(label.lower(),
+                                                                            DIRECTION_RECEIVED)
+            self.capture.write(direction, data)
+        elif self.logger.isEnabledFor(logging.DEBUG):
+            # Rendered by the log writer thread, and only if a handler takes DEBUG
+            self.logger.debug(LazyHexDump(data, label))
     
     def log_exception(self, exception: Exception, context: str = ""):
         """Log an exception with full traceback"""
@@ -380,11 +917,33 @@ class LoggingMonitor:
         """Get current metrics snapshot"""
         return self.metrics.get_metrics()
     
-    def start_monitoring(self):
-        """Start real-time monitoring (if needed)"""
+    def start_monitoring(self, interval: float = 5.0, max_bytes: int = 5 * 1024 * 1024,
+                         backup_count: int = 5) -> str:
+        """
+        Start appending metric deltas to monitoring/metrics_<time>.ndjson
+        
+        Args:
+            interval: Seconds between snapshots
+            max_bytes: Size at which the file is rolled over
+            backup_count: Rolled-over files kept
+        
+        Returns:
+            Path of the NDJSON file
+        """
+        if self.monitoring_active:
+            return str(self.snapshot_writer.path)
+        
+        path = self.monitoring_dir / f"metrics_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.ndjson"
+        self.snapshot_writer = MetricsSnapshotWriter(self.metrics, path, interval=interval,
+                                                     max_bytes=max_bytes, backup_count=backup_count)
+        self.snapshot_writer.start()
+        self.monitoring_thread = self.snapshot_writer.thread
         self.monitoring_active = True
-        # Monitoring can be implemented as needed
+        self.logger.info(f"Recording metrics every {interval}s to {path}")
+        return str(path)
     
     def stop_monitoring(self):
-        """Stop real-time monitoring"""
+        """Stop real-time monitoring, writing a last snapshot first"""
+        if self.snapshot_writer:
+            self.snapshot_writer.stop()
         self.monitoring_active = False
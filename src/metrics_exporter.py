@@ -0,0 +1,252 @@
+"""
+OpenMetrics exporter serving live MetricsCollector state over HTTP or a Unix socket
+"""
+
+import os
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Any, Tuple
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+PREFIX = "cisco_reset"
+
+# Latency buckets (seconds) for console commands and break sequences
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Dwell buckets (seconds) for recovery states, which last up to several minutes
+DWELL_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _MetricFamily:
+    """Samples of one metric name, rendered under a single TYPE/HELP header"""
+
+    def __init__(self, name: str, kind: str, help_text: str, unit: str = ""):
+        self.name = f"{PREFIX}_{name}"
+        self.kind = kind
+        self.help_text = help_text
+        self.unit = unit
+        self.lines: List[str] = []
+
+    def sample(self, labels: Dict[str, str], value: float, suffix: str = ""):
+        self.lines.append(f"{self.name}{suffix}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, labels: Dict[str, str], histogram: Any, bounds: Tuple[float, ...]):
+        for bound, count in zip(bounds, histogram.cumulative_counts(bounds)):
+            self.sample(dict(labels, le=_number(bound)), count, "_bucket")
+        self.sample(dict(labels, le="+Inf"), histogram.count, "_bucket")
+        self.sample(labels, histogram.count, "_count")
+        self.sample(labels, histogram.total, "_sum")
+
+    def render(self) -> List[str]:
+        if not self.lines:
+            return []
+        header = [f"# TYPE {self.name} {self.kind}", f"# HELP {self.name} {self.help_text}"]
+        if self.unit:
+            header.append(f"# UNIT {self.name} {self.unit}")
+        return header + self.lines
+
+
+class MetricsExporter:
+    """
+    Serves registered MetricsCollectors in OpenMetrics text format
+
+    Each collector is registered under the console port it measures, which
+    becomes the 'port' label on every sample. Counters are cumulative, so
+    per-port byte rates come from rate() on the scraping side. Nothing is
+    written to disk; the text is rendered from the live collectors on every
+    scrape.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None,
+                 unix_socket: Optional[str] = None, logger: Optional[Any] = None):
+        """
+        Args:
+            host: Address to bind the HTTP endpoint to (local only by default)
+            port: TCP port for the HTTP endpoint
+            unix_socket: Path of a Unix socket to serve HTTP on instead of TCP
+            logger: Optional logger
+        """
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.logger = logger
+
+        self._collectors: Dict[str, Tuple[Any, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+        self._server: Optional[socketserver.BaseServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, collector: Any, port: str, **labels: str):
+        """
+        Export a collector under a console port
+
+        Args:
+            collector: MetricsCollector to read on every scrape
+            port: Console port path, used as the 'port' label
+            **labels: Extra labels for this collector's samples (e.g. device)
+        """
+        with self._lock:
+            self._collectors[port] = (collector, dict(port=port, **labels))
+
+    def unregister(self, port: str):
+        """Stop exporting the collector registered under a port"""
+        with self._lock:
+            self._collectors.pop(port, None)
+
+    def render(self) -> str:
+        """Render every registered collector as one OpenMetrics exposition"""
+        families = {
+            'bytes_sent': _MetricFamily("sent_bytes", "counter", "Bytes written to the console", "bytes"),
+            'bytes_received': _MetricFamily("received_bytes", "counter", "Bytes read from the console", "bytes"),
+            'uptime': _MetricFamily("connection_uptime_seconds", "gauge", "Seconds since the console was opened", "seconds"),
+            'command': _MetricFamily("command_duration_seconds", "histogram", "Console command latency", "seconds"),
+            'phase': _MetricFamily("command_phase_seconds", "histogram", "Command write, echo, first byte and prompt times per verb", "seconds"),
+            'response_bytes': _MetricFamily("command_response_bytes", "counter", "Bytes received in command responses per verb", "bytes"),
+            'transfer': _MetricFamily("command_transfer_seconds", "counter", "Time from first response byte to prompt per verb", "seconds"),
+            'pages': _MetricFamily("command_pages", "counter", "--More-- prompts answered per verb"),
+            'command_retries': _MetricFamily("command_retries", "counter", "Command retries per verb"),
+            'command_timeouts': _MetricFamily("command_timeouts", "counter", "Commands that never returned a prompt per verb"),
+            'break': _MetricFamily("break_duration_seconds", "histogram", "Break sequence duration per method", "seconds"),
+            'breaks': _MetricFamily("break_attempts", "counter", "Break attempts per method and result"),
+            'timeouts': _MetricFamily("timeouts", "counter", "Command and operation timeouts"),
+            'errors': _MetricFamily("errors", "counter", "Errors per exception type"),
+            'retries': _MetricFamily("retries", "counter", "Retries per operation"),
+            'dwell': _MetricFamily("state_dwell_seconds", "histogram", "Time spent in each recovery state", "seconds"),
+            'state': _MetricFamily("recovery_state", "info", "Current recovery state"),
+        }
+
+        with self._lock:
+            collectors = list(self._collectors.values())
+
+        for collector, labels in collectors:
+            counters, histograms = collector.snapshot()
+
+            families['bytes_sent'].sample(labels, counters.get(('bytes_sent',), 0), "_total")
+            families['bytes_received'].sample(labels, counters.get(('bytes_received',), 0), "_total")
+            uptime = collector.get_connection_uptime()
+            if uptime is not None:
+                families['uptime'].sample(labels, uptime)
+            families['timeouts'].sample(labels, counters.get(('timeout',), 0), "_total")
+
+            if ('command',) in histograms:
+                families['command'].histogram(labels, histograms[('command',)], LATENCY_BUCKETS)
+
+            for key, histogram in sorted(histograms.items()):
+                if key[0] == 'break':
+                    families['break'].histogram(dict(labels, method=key[1]), histogram, LATENCY_BUCKETS)
+                elif key[0] == 'dwell':
+                    families['dwell'].histogram(dict(labels, state=key[1]), histogram, DWELL_BUCKETS)
+                elif key[0] == 'command_phase':
+                    families['phase'].histogram(dict(labels, verb=key[1], phase=key[2]),
+                                                histogram, LATENCY_BUCKETS)
+                elif key[0] == 'command_transfer':
+                    families['transfer'].sample(dict(labels, verb=key[1]), histogram.total, "_total")
+
+            for key, value in sorted(counters.items()):
+                if key[0] in ('break_success', 'break_failure'):
+                    result = "success" if key[0] == 'break_success' else "failure"
+                    families['breaks'].sample(dict(labels, method=key[1], result=result), value, "_total")
+                elif key[0] == 'error':
+                    families['errors'].sample(dict(labels, type=key[1]), value, "_total")
+                elif key[0] == 'retry':
+                    families['retries'].sample(dict(labels, operation=key[1]), value, "_total")
+                elif key[0] == 'command_bytes':
+                    families['response_bytes'].sample(dict(labels, verb=key[1]), value, "_total")
+                elif key[0] == 'command_pages':
+                    families['pages'].sample(dict(labels, verb=key[1]), value, "_total")
+                elif key[0] == 'command_retries':
+                    families['command_retries'].sample(dict(labels, verb=key[1]), value, "_total")
+                elif key[0] == 'command_timeouts':
+                    families['command_timeouts'].sample(dict(labels, verb=key[1]), value, "_total")
+
+            if collector.current_state:
+                families['state'].sample(dict(labels, state=collector.current_state), 1, "_info")
+
+        lines = []
+        for family in families.values():
+            lines.extend(family.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def start(self) -> str:
+        """
+        Start serving in a background thread
+
+        Returns:
+            Address being served (URL or socket path)
+        """
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def address_string(self):
+                # Unix socket peers have no host/port
+                return self.client_address[0] if self.client_address else "unix"
+
+            def log_message(self, format, *args):
+                if exporter.logger:
+                    exporter.logger.debug(f"Metrics scrape from {self.address_string()}: {format % args}")
+
+        if self.unix_socket:
+            if os.path.exists(self.unix_socket):
+                os.unlink(self.unix_socket)
+            self._server = _UnixHTTPServer(self.unix_socket, Handler)
+            address = self.unix_socket
+        else:
+            self._server = ThreadingHTTPServer((self.host, self.port or 0), Handler)
+            self.port = self._server.server_address[1]
+            address = f"http://{self.host}:{self.port}/metrics"
+
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="metrics-exporter", daemon=True)
+        self._thread.start()
+        if self.logger:
+            self.logger.info(f"Serving OpenMetrics on {address}")
+        return address
+
+    def stop(self):
+        """Stop serving and remove the Unix socket"""
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server = None
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+        if self.unix_socket and os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP over a Unix stream socket (curl --unix-socket PATH http://localhost/metrics)"""
+
+    daemon_threads = True
@@ -0,0 +1,175 @@
+"""
+Fixed-memory streaming latency histogram with percentile queries
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of durations in seconds
+
+    Values are counted in buckets whose width is 1/SUB_BUCKETS of their power
+    of two (about 1.6% relative error) from one microsecond up, so memory is
+    bounded by the range of values seen rather than by how many were
+    recorded. Count, total, min and max are kept exactly.
+    """
+
+    # Resolution of the smallest bucket
+    UNIT = 1e-6
+    # Linear sub-buckets per power of two (power of two)
+    SUB_BUCKETS = 64
+    SUB_BUCKET_BITS = 6
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value: float, count: int = 1):
+        """Add a duration (negative values are counted as zero)"""
+        value = max(0.0, value)
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's samples to this one"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def since(self, previous: "LatencyHistogram") -> "LatencyHistogram":
+        """
+        Samples recorded after an earlier copy of this histogram was taken
+
+        Min and max of the difference are only known to the bucket they fall
+        in, so they are estimated from the outermost non-empty buckets.
+        """
+        delta = LatencyHistogram()
+        for index, count in self.counts.items():
+            count -= previous.counts.get(index, 0)
+            if count > 0:
+                delta.counts[index] = count
+        delta.count = self.count - previous.count
+        delta.total = self.total - previous.total
+        if delta.counts:
+            delta.min = max(self._bounds(min(delta.counts))[0], self.min)
+            delta.max = min(self._bounds(max(delta.counts))[1], self.max)
+        return delta
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """
+        Value below which a fraction q (0-1) of the samples fall
+
+        Accurate to the bucket width; clamped to the exact min and max.
+        """
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                low, high = self._bounds(index)
+                return min(max((low + high) / 2, self.min), self.max)
+        return self.max
+
+    def percentiles(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> Dict[float, float]:
+        """Several percentiles in one pass over the buckets"""
+        wanted = sorted(quantiles)
+        result = {q: 0.0 for q in wanted}
+        if not self.count:
+            return result
+
+        ranks = [(max(1, math.ceil(q * self.count)), q) for q in wanted]
+        seen = 0
+        position = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            while position < len(ranks) and seen >= ranks[position][0]:
+                low, high = self._bounds(index)
+                result[ranks[position][1]] = min(max((low + high) / 2, self.min), self.max)
+                position += 1
+            if position == len(ranks):
+                break
+        return result
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """(bucket upper bound in seconds, samples at or below it) for every non-empty bucket"""
+        result = []
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            result.append((self._bounds(index)[1], seen))
+        return result
+
+    def cumulative_counts(self, bounds: Sequence[float]) -> List[int]:
+        """
+        Samples at or below each of a sorted list of bounds
+
+        A bucket counts towards a bound when its midpoint is at or below it,
+        for exporting into fixed bucket layouts such as Prometheus 'le'.
+        """
+        result = []
+        seen = 0
+        indexes = sorted(self.counts)
+        position = 0
+        for bound in bounds:
+            while position < len(indexes):
+                low, high = self._bounds(indexes[position])
+                if (low + high) / 2 > bound:
+                    break
+                seen += self.counts[indexes[position]]
+                position += 1
+            result.append(seen)
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        """Count, total, average, min, max and p50/p90/p99"""
+        p = self.percentiles()
+        return {
+            'count': self.count,
+            'total': self.total,
+            'average': self.mean,
+            'min': self.min or 0,
+            'max': self.max or 0,
+            'p50': p[0.5],
+            'p90': p[0.9],
+            'p99': p[0.99],
+        }
+
+    @classmethod
+    def _index(cls, value: float) -> int:
+        units = int(value / cls.UNIT)
+        if units < cls.SUB_BUCKETS:
+            return units
+        # Shift so the value lands in [SUB_BUCKETS, 2 * SUB_BUCKETS)
+        shift = units.bit_length() - cls.SUB_BUCKET_BITS - 1
+        return (shift + 1) * cls.SUB_BUCKETS + (units >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _bounds(cls, index: int) -> Tuple[float, float]:
+        """Lower and upper bound in seconds of a bucket"""
+        if index < cls.SUB_BUCKETS:
+            return index * cls.UNIT, (index + 1) * cls.UNIT
+        shift = index // cls.SUB_BUCKETS - 1
+        low = (index % cls.SUB_BUCKETS + cls.SUB_BUCKETS) << shift
+        return low * cls.UNIT, (low + (1 << shift)) * cls.UNIT
@@ -0,0 +1,163 @@
+"""
+Parallel discovery of which serial ports have a live Cisco console attached
+"""
+
+import select
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Sequence
+
+import serial
+
+from prompt_detector import PromptDetector, RouterState
+
+
+@dataclass
+class PortProbe:
+    """What answered on one port"""
+    port: str
+    state: RouterState = RouterState.UNKNOWN
+    hostname: Optional[str] = None
+    baudrate: Optional[int] = None
+    response: str = ""
+    score: int = 0
+    error: Optional[str] = None
+
+
+class PortDiscovery:
+    """Probes many ports at once and ranks them by how clearly a Cisco console answers"""
+
+    # Console speeds tried on each port, most common first
+    DEFAULT_BAUDRATES = (9600, 115200, 38400, 19200, 57600)
+
+    # Higher is a more certain live console
+    STATE_SCORES = {
+        RouterState.PRIVILEGED_MODE: 100,
+        RouterState.CONFIG_MODE: 100,
+        RouterState.USER_MODE: 90,
+        RouterState.ROM_MONITOR: 90,
+        RouterState.PASSWORD_PROMPT: 80,
+        RouterState.BOOTING: 60,
+        RouterState.ERROR: 50,
+    }
+
+    # Score for readable text that is not a known prompt, and for noise
+    TEXT_SCORE = 20
+    GARBAGE_SCORE = 5
+
+    def __init__(self, prompt_detector: Optional[PromptDetector] = None,
+                 baudrates: Sequence[int] = DEFAULT_BAUDRATES, logger: Optional[Any] = None):
+        self.prompt_detector = prompt_detector or PromptDetector()
+        self.baudrates = list(baudrates)
+        self.logger = logger
+
+    def discover(self, ports: Sequence[str], timeout: float = 2.0) -> Dict[str, PortProbe]:
+        """
+        Probe every port in parallel
+
+        Only a carriage return is sent, never a break, so a booting router
+        is not knocked into ROM monitor.
+
+        Args:
+            ports: Port paths to probe
+            timeout: Total seconds allowed for each port (split across baud rates)
+
+        Returns:
+            Port -> PortProbe, best candidate first
+        """
+        if not ports:
+            return {}
+
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="probe") as pool:
+            probes = list(pool.map(lambda p: self.probe_port(p, timeout), ports))
+
+        probes.sort(key=lambda p: (-p.score, p.port))
+        if self.logger:
+            live = sum(1 for p in probes if p.score >= self.STATE_SCORES[RouterState.BOOTING])
+            self.logger.info(f"Probed {len(probes)} ports in {time.time() - start_time:.1f}s, "
+                             f"{live} with a Cisco console")
+        return {p.port: p for p in probes}
+
+    def probe_port(self, port: str, timeout: float = 2.0) -> PortProbe:
+        """Try each baud rate on one port until a prompt answers"""
+        result = PortProbe(port=port)
+        per_rate = timeout / max(1, len(self.baudrates))
+
+        try:
+            conn = serial.Serial(port=port, baudrate=self.baudrates[0], timeout=0,
+                                 write_timeout=0.5, exclusive=True)
+        except (serial.SerialException, OSError, ValueError) as e:
+            result.error = str(e)
+            return result
+
+        try:
+            for baudrate in self.baudrates:
+                conn.baudrate = baudrate
+                conn.reset_input_buffer()
+                conn.write(b"\r")
+
+                text = self._read_reply(conn, per_rate)
+                probe = self._classify(port, baudrate, text)
+                if probe.score > result.score:
+                    result = probe
+                if result.score >= self.STATE_SCORES[RouterState.BOOTING]:
+                    break
+        except (serial.SerialException, OSError) as e:
+            result.error = str(e)
+        finally:
+            conn.close()
+
+        return result
+
+    def _read_reply(self, conn: serial.Serial, timeout: float) -> str:
+        """Read until a prompt shows up or the time is up"""
+        deadline = time.time() + timeout
+        data = b""
+
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select([conn.fileno()], [], [], remaining)
+            if not readable:
+                break
+            data += conn.read(conn.in_waiting or 1)
+
+            state, _, _ = self.prompt_detector.detect_prompt(data.decode('utf-8', errors='replace'))
+            if state in (RouterState.PRIVILEGED_MODE, RouterState.CONFIG_MODE, RouterState.USER_MODE,
+                         RouterState.ROM_MONITOR, RouterState.PASSWORD_PROMPT):
+                break
+
+        return data.decode('utf-8', errors='replace')
+
+    def _classify(self, port: str, baudrate: int, text: str) -> PortProbe:
+        """Score a reply: known prompt, readable text, or line noise at the wrong speed"""
+        probe = PortProbe(port=port, baudrate=baudrate, response=text[-200:])
+        if not text:
+            return probe
+
+        state, hostname, _ = self.prompt_detector.detect_prompt(text)
+        if state is not None and state in self.STATE_SCORES:
+            probe.state = state
+            probe.hostname = hostname
+            probe.score = self.STATE_SCORES[state]
+        else:
+            printable = sum(1 for c in text if c.isprintable() or c in "\r\n\t")
+            probe.score = self.TEXT_SCORE if printable / len(text) > 0.9 else self.GARBAGE_SCORE
+        return probe
+
+
+def format_discovery(results: Dict[str, PortProbe]) -> List[str]:
+    """One line per port for CLI output"""
+    lines = []
+    for probe in results.values():
+        if probe.error:
+            lines.append(f"{probe.port:<20} error: {probe.error}")
+        elif probe.baudrate is None:
+            lines.append(f"{probe.port:<20} no response")
+        else:
+            host = probe.hostname or "-"
+            lines.append(f"{probe.port:<20} {probe.state.value:<16} {host:<20} {probe.baudrate} baud")
+    return lines
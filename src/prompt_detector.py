@@ -4,7 +4,7 @@ Advanced prompt detection using regex patterns for Cisco IOS/IOS XE
 
 import re
 import time
-from typing import Optional, Tuple, Dict
+from typing import Optional, Tuple, Dict, Match
 from enum import Enum
 
 
@@ -23,25 +23,28 @@ class RouterState(Enum):
 class PromptDetector:
     """Advanced prompt detection with regex patterns"""
     
+    # Hostname capture shared by every prompt that names the device
+    HOSTNAME_PREFIX = r'(?<![A-Za-z0-9_-])([A-Za-z0-9_-]+)\s*'
+    
     # Prompt patterns
     ROM_MONITOR_PATTERNS = [
-        re.compile(r'rommon\s*\d+>\s*', re.IGNORECASE),
+        re.compile(r'rommon\s*\d+\s*>\s*', re.IGNORECASE),
         re.compile(r'rommon>\s*', re.IGNORECASE),
         re.compile(r'\(rommon\)>\s*', re.IGNORECASE),
     ]
     
     USER_MODE_PATTERNS = [
-        re.compile(r'([A-Za-z0-9_-]+)\s*>\s*$', re.MULTILINE),
+        re.compile(HOSTNAME_PREFIX + r'>\s*$', re.MULTILINE),
     ]
     
     PRIVILEGED_MODE_PATTERNS = [
-        re.compile(r'([A-Za-z0-9_-]+)\s*#\s*$', re.MULTILINE),
+        re.compile(HOSTNAME_PREFIX + r'#\s*$', re.MULTILINE),
     ]
     
     CONFIG_MODE_PATTERNS = [
-        re.compile(r'([A-Za-z0-9_-]+)\s*\(config[^)]*\)#\s*$', re.MULTILINE),
-        re.compile(r'([A-Za-z0-9_-]+)\s*\(config\)#\s*$', re.MULTILINE),
-        re.compile(r'([A-Za-z0-9_-]+)\s*\(config-[^)]+\)#\s*$', re.MULTILINE),
+        re.compile(HOSTNAME_PREFIX + r'\(config[^)]*\)#\s*$', re.MULTILINE),
+        re.compile(HOSTNAME_PREFIX + r'\(config\)#\s*$', re.MULTILINE),
+        re.compile(HOSTNAME_PREFIX + r'\(config-[^)]+\)#\s*$', re.MULTILINE),
     ]
     
     PASSWORD_PROMPT_PATTERNS = [
@@ -68,6 +71,20 @@ class PromptDetector:
         re.compile(r'% Unknown command', re.IGNORECASE),
     ]
     
+    # Categories in priority order: the first category with any match wins
+    PROMPT_CATEGORIES = [
+        (RouterState.ROM_MONITOR, ROM_MONITOR_PATTERNS),
+        (RouterState.PASSWORD_PROMPT, PASSWORD_PROMPT_PATTERNS),
+        (RouterState.CONFIG_MODE, CONFIG_MODE_PATTERNS),
+        (RouterState.PRIVILEGED_MODE, PRIVILEGED_MODE_PATTERNS),
+        (RouterState.USER_MODE, USER_MODE_PATTERNS),
+        (RouterState.BOOTING, BOOT_PATTERNS),
+        (RouterState.ERROR, ERROR_PATTERNS),
+    ]
+    
+    # States whose patterns start with HOSTNAME_PREFIX
+    HOSTNAME_STATES = (RouterState.CONFIG_MODE, RouterState.PRIVILEGED_MODE, RouterState.USER_MODE)
+    
     def __init__(self, timeout: float = 30.0):
         self.timeout = timeout
         self.last_detected_state = RouterState.UNKNOWN
@@ -80,60 +97,89 @@ class PromptDetector:
         Returns:
             Tuple of (state, hostname, match_info)
         """
-        # Check for ROM monitor
-        for pattern in self.ROM_MONITOR_PATTERNS:
-            match = pattern.search(output)
-            if match:
-                self.last_detected_state = RouterState.ROM_MONITOR
-                return RouterState.ROM_MONITOR, None, {'match': match.group()}
-        
-        # Check for password prompt
-        for pattern in self.PASSWORD_PROMPT_PATTERNS:
-            match = pattern.search(output)
-            if match:
-                self.last_detected_state = RouterState.PASSWORD_PROMPT
-                return RouterState.PASSWORD_PROMPT, None, {'match': match.group()}
-        
-        # Check for config mode
-        for pattern in self.CONFIG_MODE_PATTERNS:
-            match = pattern.search(output)
-            if match:
-                hostname = match.group(1)
-                self.last_hostname = hostname
-                self.last_detected_state = RouterState.CONFIG_MODE
-                return RouterState.CONFIG_MODE, hostname, {'match': match.group(), 'hostname': hostname}
-        
-        # Check for privileged mode
-        for pattern in self.PRIVILEGED_MODE_PATTERNS:
-            match = pattern.search(output)
-            if match:
-                hostname = match.group(1)
-                self.last_hostname = hostname
-                self.last_detected_state = RouterState.PRIVILEGED_MODE
-                return RouterState.PRIVILEGED_MODE, hostname, {'match': match.group(), 'hostname': hostname}
-        
-        # Check for user mode
-        for pattern in self.USER_MODE_PATTERNS:
-            match = pattern.search(output)
-            if match:
-                hostname = match.group(1)
-                self.last_hostname = hostname
-                self.last_detected_state = RouterState.USER_MODE
-                return RouterState.USER_MODE, hostname, {'match': match.group(), 'hostname': hostname}
-        
-        # Check for boot sequence
-        for pattern in self.BOOT_PATTERNS:
-            if pattern.search(output):
-                self.last_detected_state = RouterState.BOOTING
-                return RouterState.BOOTING, None, {}
+        best = self.find_best_hit(output)
+        if best is None:
+            return None, None, None
         
-        # Check for errors
-        for pattern in self.ERROR_PATTERNS:
-            match = pattern.search(output)
-            if match:
-                return RouterState.ERROR, None, {'error': match.group()}
+        (category_index, _), hit = best
+        return self.make_result(self.PROMPT_CATEGORIES[category_index][0], *hit)
+    
+    def find_best_hit(self, text: str, before: Optional[Tuple[int, int]] = None
+                      ) -> Optional[Tuple[Tuple[int, int], Tuple[str, Optional[str]]]]:
+        """
+        Return the highest-priority hit in text
         
-        return None, None, None
+        Priority follows PROMPT_CATEGORIES and the pattern order within each
+        category; for the winning pattern the earliest match is kept. The
+        hostname prompt categories are classified together in one pass of
+        HOSTNAME_AUTOMATON (compiled after the class body).
+        
+        Args:
+            text: Output to scan
+            before: Only report hits that outrank this (category, pattern) key
+        
+        Returns:
+            Tuple of ((category index, pattern index), (matched text, hostname)) or None
+        """
+        for category_index, (state, patterns) in enumerate(self.PROMPT_CATEGORIES):
+            if before is not None and category_index > before[0]:
+                break
+            
+            if state in self.HOSTNAME_STATES:
+                if category_index == self.HOSTNAME_AUTOMATON_TOP[0]:
+                    found = self._find_hostname_prompt(text, before)
+                    if found is not None:
+                        return found
+                continue
+            
+            for pattern_index, pattern in enumerate(patterns):
+                if before is not None and (category_index, pattern_index) >= before:
+                    break
+                match = pattern.search(text)
+                if match:
+                    return (category_index, pattern_index), self.match_hit(state, match)
+        
+        return None
+    
+    def _find_hostname_prompt(self, text: str, before: Optional[Tuple[int, int]] = None
+                              ) -> Optional[Tuple[Tuple[int, int], Tuple[str, Optional[str]]]]:
+        """Classify config, privileged and user prompts in a single scan"""
+        best_key = None
+        best_match = None
+        for match in self.HOSTNAME_AUTOMATON.finditer(text):
+            key = self.HOSTNAME_AUTOMATON_KEYS[match.lastgroup]
+            if best_key is None or key < best_key:
+                best_key = key
+                best_match = match
+                if key == self.HOSTNAME_AUTOMATON_TOP:
+                    break
+        
+        if best_match is None or (before is not None and best_key >= before):
+            return None
+        
+        state = self.PROMPT_CATEGORIES[best_key[0]][0]
+        return best_key, self.match_hit(state, best_match)
+    
+    def match_hit(self, state: RouterState, match: Match) -> Tuple[str, Optional[str]]:
+        """Reduce a pattern match to the (matched text, hostname) pair kept for results"""
+        hostname = match.group(1) if state in self.HOSTNAME_STATES else None
+        return match.group(), hostname
+    
+    def make_result(self, state: RouterState, matched: str,
+                    hostname: Optional[str] = None) -> Tuple[Optional[RouterState], Optional[str], Optional[Dict]]:
+        """Build the (state, hostname, match_info) result and record it as the last detection"""
+        if state == RouterState.ERROR:
+            return RouterState.ERROR, None, {'error': matched}
+        
+        self.last_detected_state = state
+        if state == RouterState.BOOTING:
+            return RouterState.BOOTING, None, {}
+        
+        if state in self.HOSTNAME_STATES:
+            self.last_hostname = hostname
+            return state, hostname, {'match': matched, 'hostname': hostname}
+        
+        return state, None, {'match': matched}
     
     def wait_for_prompt(self, output_buffer: str, target_state: Optional[RouterState] = None,
                        timeout: Optional[float] = None) -> Tuple[Optional[RouterState], Optional[str], Optional[Dict]]:
@@ -188,3 +234,109 @@ class PromptDetector:
     def get_hostname(self) -> Optional[str]:
         """Get last detected hostname"""
         return self.last_hostname
+
+
+def _compile_hostname_automaton():
+    """
+    Compile the hostname prompt categories into one alternation
+    
+    The patterns share HOSTNAME_PREFIX, so it is matched once and the
+    category-specific suffixes become named groups ordered by priority. At
+    any position the highest-priority suffix wins, and the caller keeps the
+    best key across all matches.
+    
+    Returns:
+        Tuple of (compiled pattern, {group name: (category index, pattern index)})
+    """
+    prefix = PromptDetector.HOSTNAME_PREFIX
+    alternatives = []
+    keys = {}
+    for category_index, (state, patterns) in enumerate(PromptDetector.PROMPT_CATEGORIES):
+        if state not in PromptDetector.HOSTNAME_STATES:
+            continue
+        for pattern_index, pattern in enumerate(patterns):
+            name = f"c{category_index}p{pattern_index}"
+            alternatives.append(f"(?P<{name}>{pattern.pattern[len(prefix):]})")
+            keys[name] = (category_index, pattern_index)
+    return re.compile(prefix + '(?:' + '|'.join(alternatives) + ')', re.MULTILINE), keys
+
+
+PromptDetector.HOSTNAME_AUTOMATON, PromptDetector.HOSTNAME_AUTOMATON_KEYS = _compile_hostname_automaton()
+PromptDetector.HOSTNAME_AUTOMATON_TOP = min(PromptDetector.HOSTNAME_AUTOMATON_KEYS.values())
+
+class StreamingPromptDetector:
+    """
+    Incremental prompt detection over a stream of output chunks
+    
+    Completed lines are scanned once and the best hit is latched, since a
+    match in settled text stays a match however much output follows it. Only
+    the trailing partial line (bounded by ``window``) is re-examined on each
+    feed, so the cost per chunk depends on the chunk size rather than on the
+    amount of output seen so far. Results are the same (state, hostname,
+    match_info) tuples that ``PromptDetector.detect_prompt`` returns for the
+    accumulated output.
+    """
+    
+    def __init__(self, detector: Optional[PromptDetector] = None,
+                 window: int = 4096, overlap: int = 256):
+        """
+        Args:
+            detector: Detector providing patterns and result bookkeeping
+            window: Maximum length of the trailing partial line kept for re-examination
+            overlap: Settled text kept as context for matches spanning two feeds
+        """
+        self.detector = detector or PromptDetector()
+        self.window = window
+        self.overlap = overlap
+        self.reset()
+    
+    def reset(self):
+        """Forget all output seen so far"""
+        self._best: Optional[Tuple[Tuple[int, int], Tuple[str, Optional[str]]]] = None
+        self._context = ""
+        self._pending = ""
+        self.chars_fed = 0
+    
+    def feed(self, chunk: str) -> Tuple[Optional[RouterState], Optional[str], Optional[Dict]]:
+        """
+        Feed newly received output and return the state for everything fed so far
+        
+        Returns:
+            Tuple of (state, hostname, match_info)
+        """
+        if chunk:
+            self.chars_fed += len(chunk)
+            text = self._pending + chunk
+            cut = text.rfind('\n') + 1
+            if len(text) - cut > self.window:
+                cut = len(text) - self.window
+            if cut:
+                settled = self._context + text[:cut]
+                # A cut inside a line must not look like end of output to '$'
+                self._scan_settled(settled if text[cut - 1] == '\n' else settled + '\x00')
+                self._context = settled[-self.overlap:]
+            self._pending = text[cut:]
+        
+        return self.current()
+    
+    def current(self) -> Tuple[Optional[RouterState], Optional[str], Optional[Dict]]:
+        """Return the state for everything fed so far without feeding more output"""
+        best = self._best
+        if self._pending:
+            before = best[0] if best is not None else None
+            found = self.detector.find_best_hit(self._context + self._pending, before)
+            if found is not None:
+                best = found
+        
+        if best is None:
+            return None, None, None
+        
+        (category_index, _), hit = best
+        return self.detector.make_result(self.detector.PROMPT_CATEGORIES[category_index][0], *hit)
+    
+    def _scan_settled(self, text: str):
+        """Latch the highest-priority hit in completed output"""
+        before = self._best[0] if self._best is not None else None
+        found = self.detector.find_best_hit(text, before)
+        if found is not None:
+            self._best = found
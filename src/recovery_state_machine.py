@@ -57,11 +57,19 @@ class RecoveryStateMachine:
         RecoveryState.COMPLETE: [],  # Terminal state
     }
     
-    def __init__(self, logger: Optional[Any] = None):
+    def __init__(self, logger: Optional[Any] = None, metrics: Optional[Any] = None):
+        """
+        Args:
+            logger: Optional logger (a LoggingMonitor also records transitions
+                into its own metrics)
+            metrics: Optional metrics collector to record transitions into
+                when the logger does not
+        """
         self.current_state = RecoveryState.INITIAL
         self.state_history: List[Dict] = []
         self.checkpoints: List[StateCheckpoint] = []
         self.logger = logger
+        self.metrics = metrics
         self.original_config_register: Optional[str] = None
         self.config_backup: Optional[str] = None
         
@@ -101,6 +109,8 @@ class RecoveryStateMachine:
         
         if self.logger:
             self.logger.log_state_transition(old_state.value, new_state.value, reason)
+        if self.metrics:
+            self.metrics.record_state_transition(old_state.value, new_state.value, timestamp)
         
         return True
     
@@ -6,24 +6,113 @@ import time
 import re
 from typing import Optional, Tuple, Any
 from serial_connection import SerialConnection
-from prompt_detector import PromptDetector, RouterState
+from prompt_detector import PromptDetector, StreamingPromptDetector, RouterState
 from recovery_state_machine import RecoveryStateMachine, RecoveryState
 from retry_strategies import RetryManager, RetryConfig
+from break_injector import BreakInjector
+from break_profile import BreakProfile
+from command_cache import CommandCache
 
 
 class RommonHandler:
     """Handles ROM monitor entry and configuration"""
     
+    # Question printed by a bare 'confreg' before it shows the change dialog
+    CONFREG_CHANGE_QUESTION = re.compile(r'change the configuration\?\s*y/n', re.IGNORECASE)
+    
+    # Echo of the reset command, after which the old ROM monitor output is stale
+    RESET_ECHO = re.compile(r'reset\s*[\r\n]', re.IGNORECASE)
+    
+    # Setup dialog offered by IOS when it boots without a configuration
+    INITIAL_DIALOG_QUESTION = re.compile(r'initial configuration dialog\?\s*\[yes/no\]',
+                                         re.IGNORECASE)
+    
     def __init__(self, serial_conn: SerialConnection, prompt_detector: PromptDetector,
                  state_machine: RecoveryStateMachine, retry_manager: RetryManager,
-                 logger: Optional[Any] = None, metrics: Optional[Any] = None):
+                 logger: Optional[Any] = None, metrics: Optional[Any] = None,
+                 break_profile: Optional[BreakProfile] = None,
+                 cache: Optional[CommandCache] = None):
         self.serial_conn = serial_conn
         self.prompt_detector = prompt_detector
         self.state_machine = state_machine
         self.retry_manager = retry_manager
         self.logger = logger
         self.metrics = metrics
+        self.break_injector: Optional[BreakInjector] = None
+        
+        # Show-command cache of the session's executor, dropped on reboot
+        self.cache = cache
+        
+        # Learned break-method ranking; platform is filled in from the
+        # bootstrap banner and kept for the next boot on this port
+        self.break_profile = break_profile
+        self.platform: Optional[str] = None
+        # Adapter VID:PID, looked up when arming so the reader never enumerates devices
+        self.adapter_id: Optional[str] = None
+        
+    def arm_break_injection(self, since: Optional[int] = None) -> BreakInjector:
+        """
+        Start injecting breaks as soon as the reader sees the bootstrap banner
         
+        Args:
+            since: Stream offset taken before the reload was triggered
+                (default: the current offset, i.e. only output from now on)
+        
+        Returns:
+            The running injector (reused if already armed)
+        """
+        if self.break_injector is None or not self.break_injector.running:
+            if since is None:
+                since = self.serial_conn.get_stream_offset()
+            self.adapter_id = self.serial_conn.get_adapter_id()
+            methods = None
+            if self.break_profile is not None:
+                methods = self.break_profile.rank(self._break_profile_key())
+                self.serial_conn.break_order = list(dict.fromkeys(m[0] for m in methods))
+            self.break_injector = BreakInjector(self.serial_conn, self.prompt_detector,
+                                                methods=methods, logger=self.logger,
+                                                metrics=self.metrics,
+                                                on_platform=self._on_platform)
+            self.break_injector.start(since)
+        return self.break_injector
+    
+    def disarm_break_injection(self):
+        """Stop injecting breaks"""
+        if self.break_injector is not None:
+            self.break_injector.stop()
+    
+    def _break_profile_key(self) -> str:
+        """Break profile key for this port, its adapter and the router platform"""
+        return BreakProfile.make_key(self.serial_conn.port, self.adapter_id, self.platform)
+    
+    def _on_platform(self, platform: str):
+        """Re-rank break methods for the platform the banner announced"""
+        if platform == self.platform:
+            return
+        self.platform = platform
+        if self.logger:
+            self.logger.debug(f"Bootstrap banner reports platform {platform}")
+        if self.break_profile is not None and self.break_injector is not None:
+            methods = self.break_profile.rank(self._break_profile_key())
+            self.serial_conn.break_order = list(dict.fromkeys(m[0] for m in methods))
+            self.break_injector.set_methods(methods)
+    
+    def _record_break_outcome(self, injector: BreakInjector, success: bool):
+        """Feed the methods sent and the one that got ROM monitor into the break profile"""
+        if self.break_profile is None or not injector.sent:
+            return
+        
+        succeeded, latency = None, 0.0
+        if success and injector.rommon_time is not None:
+            # Credit the last break that went out before the prompt appeared
+            before = [(m, t) for m, t in injector.sent if t <= injector.rommon_time]
+            if before:
+                succeeded, sent_at = before[-1]
+                latency = injector.rommon_time - sent_at
+        
+        self.break_profile.record(self._break_profile_key(), [m for m, _ in injector.sent],
+                                  succeeded, latency)
+    
     def wait_for_boot(self, timeout: float = 60.0) -> bool:
         """Wait for boot sequence to start"""
         if self.logger:
@@ -31,19 +120,13 @@ class RommonHandler:
         
         self.state_machine.transition(RecoveryState.WAITING_BOOT, "Waiting for boot")
         
-        start_time = time.time()
-        boot_detected = False
+        # Breaks go out from the reader's banner event, not after this returns
+        self.arm_break_injection()
         
-        while time.time() - start_time < timeout:
-            output = self.serial_conn.get_output_buffer()
-            
-            if self.prompt_detector.is_booting(output):
-                boot_detected = True
-                if self.logger:
-                    self.logger.info("Boot sequence detected")
-                break
-            
-            time.sleep(0.5)
+        boot_detected = self.serial_conn.wait_for(self.prompt_detector.BOOT_PATTERNS,
+                                                  timeout) is not None
+        if boot_detected and self.logger:
+            self.logger.info("Boot sequence detected")
         
         return boot_detected
     
@@ -54,40 +137,24 @@ class RommonHandler:
         
         self.state_machine.transition(RecoveryState.SENDING_BREAK, "Sending break sequence")
         
-        start_time = time.time()
-        break_success = False
-        
-        # Try multiple break attempts
-        max_attempts = 5
-        attempt_interval = 2.0
+        # Bursts of breaks start on the banner event; without one, fall back to
+        # breaks every few seconds in case the banner was missed
+        injector = self.arm_break_injection()
+        injector.enable_blind()
+        try:
+            break_success = injector.wait(timeout)
+        finally:
+            self.disarm_break_injection()
+        self._record_break_outcome(injector, break_success)
         
-        for attempt in range(1, max_attempts + 1):
-            if time.time() - start_time > timeout:
-                break
-            
-            if self.logger:
-                self.logger.info(f"Break attempt {attempt}/{max_attempts}")
-            
-            # Send break
-            success = self.serial_conn.send_break()
-            
-            if success:
-                # Wait a bit and check for ROM monitor
-                time.sleep(1.0)
-                output = self.serial_conn.get_output_buffer()
-                state, _, _ = self.prompt_detector.detect_prompt(output)
-                
-                if state == RouterState.ROM_MONITOR:
-                    break_success = True
-                    if self.metrics:
-                        self.metrics.record_rommon_entry(time.time())
-                    if self.logger:
-                        self.logger.info(f"ROM monitor entered on attempt {attempt}")
-                    break
-            
-            # Wait before next attempt
-            if attempt < max_attempts:
-                time.sleep(attempt_interval)
+        if break_success:
+            # The router is in ROM monitor now; what IOS reported no longer holds
+            self._invalidate_cache()
+            if self.metrics:
+                self.metrics.record_rommon_entry(time.time())
+            if self.logger and injector.last_method:
+                self.logger.info(f"ROM monitor entered after {injector.attempts} break(s) "
+                                 f"(last method: {BreakProfile.method_name(injector.last_method)})")
         
         if not break_success:
             if self.logger:
@@ -102,23 +169,29 @@ class RommonHandler:
         if self.logger:
             self.logger.info(f"Setting configuration register to {value}")
         
+        rommon_prompts = self.prompt_detector.ROM_MONITOR_PATTERNS
+        
         def _set_confreg():
-            # Send confreg command
+            # Send confreg command; ROM monitor echoes it, then returns to its prompt
+            since = self.serial_conn.get_stream_offset()
             self.serial_conn.write(f"confreg {value}")
-            time.sleep(1.0)
-            
-            # Read response
-            output = self.serial_conn.read_output(5.0)
+            result = self.serial_conn.read_until(rommon_prompts, 5.0, since=since)
             
             # Verify
+            output = result.text if result else ""
             if value.lower() in output.lower() or "0x2142" in output:
                 return True
-            else:
-                # Try reading confreg to verify
-                self.serial_conn.write("confreg")
-                time.sleep(1.0)
-                verify_output = self.serial_conn.read_output(5.0)
-                return value.lower() in verify_output.lower()
+            
+            # Try reading confreg to verify; decline the change dialog if offered
+            since = self.serial_conn.get_stream_offset()
+            self.serial_conn.write("confreg")
+            result = self.serial_conn.read_until([self.CONFREG_CHANGE_QUESTION] + rommon_prompts,
+                                                 5.0, since=since)
+            if result is None:
+                return False
+            if result.index == 0:
+                self.serial_conn.write("n")
+            return value.lower() in result.text.lower()
         
         config = RetryConfig(max_retries=3, base_delay=2.0)
         try:
@@ -139,16 +212,22 @@ class RommonHandler:
                 self.logger.log_exception(e, "setting config register")
             return False
     
+    def _invalidate_cache(self):
+        if self.cache is not None:
+            self.cache.invalidate(getattr(self.serial_conn, 'port', None) or "default")
+    
     def reboot_router(self) -> bool:
         """Reboot router from ROM monitor"""
         if self.logger:
             self.logger.info("Rebooting router...")
         
         self.state_machine.transition(RecoveryState.REBOOTING, "Rebooting router")
+        self._invalidate_cache()
         
-        # Send reset command
+        # Send reset command and wait only until ROM monitor has taken it
+        since = self.serial_conn.get_stream_offset()
         self.serial_conn.write("reset")
-        time.sleep(2.0)
+        self.serial_conn.read_until(self.RESET_ECHO, 2.0, since=since)
         
         # Clear output buffer
         self.serial_conn.clear_output_buffer()
@@ -163,38 +242,77 @@ class RommonHandler:
         if self.logger:
             self.logger.info("Waiting for IOS to boot...")
         
-        start_time = time.time()
-        boot_start_time = start_time
+        boot_start_time = time.time()
+        detector = StreamingPromptDetector(self.prompt_detector)
+        tail = ""
         
-        while time.time() - start_time < timeout:
-            output = self.serial_conn.get_output_buffer()
-            
+        def _ios_prompt(new_output: str) -> Optional[Tuple[RouterState, Optional[str]]]:
+            nonlocal boot_start_time, tail
             # Check for boot sequence
-            if self.prompt_detector.is_booting(output):
+            if self.prompt_detector.is_booting(new_output):
                 boot_start_time = time.time()
-                continue
             
-            # Check for IOS prompt (privileged or user mode)
-            state, hostname, _ = self.prompt_detector.detect_prompt(output)
+            # Reported as UNKNOWN so the dialog can be answered outside the reader;
+            # the question may arrive split over several chunks
+            window, tail = tail + new_output, (tail + new_output)[-64:]
+            if self.INITIAL_DIALOG_QUESTION.search(window):
+                return RouterState.UNKNOWN, None
             
+            # Check for IOS prompt (privileged or user mode)
+            state, hostname, _ = detector.feed(new_output)
             if state in [RouterState.PRIVILEGED_MODE, RouterState.USER_MODE]:
-                boot_duration = time.time() - boot_start_time
-                if self.metrics:
-                    self.metrics.record_boot_duration(boot_duration)
-                
-                if self.logger:
-                    self.logger.info(f"IOS booted successfully (state: {state.value}, hostname: {hostname})")
-                
-                self.state_machine.transition(RecoveryState.IOS_NO_CONFIG, 
-                                             f"IOS booted without startup config")
-                return True
+                return state, hostname
+            return None
+        
+        # Start from whatever is still buffered
+        deadline = time.time() + timeout
+        result = self.serial_conn.wait_for(_ios_prompt, timeout, since=0)
+        if result and result[0] == RouterState.UNKNOWN:
+            # Decline the setup dialog; IOS then starts the exec at its user prompt
+            if self.logger:
+                self.logger.info("Declining the initial configuration dialog")
+            since = self.serial_conn.get_stream_offset()
+            tail = ""
+            self.serial_conn.write("no")
+            result = self.serial_conn.wait_for(_ios_prompt, max(0.0, deadline - time.time()),
+                                               since=since)
+        
+        if result and result[0] != RouterState.UNKNOWN:
+            state, hostname = result
+            boot_duration = time.time() - boot_start_time
+            if self.metrics:
+                self.metrics.record_boot_duration(boot_duration)
+            
+            if self.logger:
+                self.logger.info(f"IOS booted successfully (state: {state.value}, hostname: {hostname})")
+            
+            # Without a configuration there is no enable secret to stop us
+            if state == RouterState.USER_MODE and not self.enter_privileged_mode():
+                return False
             
-            time.sleep(0.5)
+            self.state_machine.transition(RecoveryState.IOS_NO_CONFIG, 
+                                         f"IOS booted without startup config")
+            return True
         
         if self.logger:
             self.logger.error("Timeout waiting for IOS boot")
         return False
     
+    def enter_privileged_mode(self, timeout: float = 10.0) -> bool:
+        """Send 'enable' at the user prompt of an unconfigured router"""
+        since = self.serial_conn.get_stream_offset()
+        self.serial_conn.write("enable")
+        result = self.serial_conn.read_until(self.prompt_detector.PRIVILEGED_MODE_PATTERNS
+                                             + self.prompt_detector.PASSWORD_PROMPT_PATTERNS,
+                                             timeout, since=since)
+        if result is not None and result.index < len(self.prompt_detector.PRIVILEGED_MODE_PATTERNS):
+            return True
+        
+        if self.logger:
+            self.logger.error("Could not enter privileged mode"
+                              + (" (enable secret still set)" if result is not None else ""))
+        return False
+    
     def enter_rommon(self, boot_timeout: float = 60.0, break_timeout: float = 60.0) -> bool:
         """
         Complete ROM monitor entry process
@@ -0,0 +1,982 @@
+"""
+PTY-backed Cisco 4321 console simulator for end-to-end and load testing
+"""
+
+import argparse
+import base64
+import copy
+import hashlib
+import heapq
+import os
+import queue
+import random
+import re
+import select
+import sys
+import termios
+import threading
+import time
+import tty
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+from async_console import AsyncSerialTransport
+from serial_connection import SerialConnection
+
+
+# A received NUL is what a UART reads for a break condition
+BREAK_BYTE = b"\x00"
+
+PAGER_PROMPT = " --More-- "
+PAGER_ERASE = "\b" * 9 + " " * 9 + "\b" * 9
+
+INVALID_INPUT = "% Invalid input detected at '^' marker.\r\n"
+INCOMPLETE = "% Incomplete command.\r\n"
+
+# Config register bit that makes IOS ignore the startup configuration
+IGNORE_CONFIG_BIT = 0x0040
+
+
+@dataclass
+class SimulatedConfig:
+    """The parts of a router configuration the simulator models"""
+    hostname: str = "Router"
+    enable_secret: Optional[str] = None
+    # Line name ("con 0", "vty 0 4") -> sub-commands
+    lines: Dict[str, List[str]] = field(default_factory=lambda: {
+        "con 0": ["transport input none", "stopbits 1"],
+        "aux 0": ["stopbits 1"],
+        "vty 0 4": ["login"],
+    })
+    # Other global commands, in entry order
+    extra: List[str] = field(default_factory=list)
+
+    def render(self) -> List[str]:
+        """Configuration text as 'show running-config' prints it"""
+        lines = ["version 16.9", "service timestamps debug datetime msec",
+                 "service timestamps log datetime msec", "platform qfp utilization monitor load 80",
+                 "no platform punt-keepalive disable-kernel-core", "!", f"hostname {self.hostname}",
+                 "!", "boot-start-marker", "boot-end-marker", "!"]
+        if self.enable_secret is not None:
+            digest = base64.b64encode(hashlib.sha256(self.enable_secret.encode()).digest()).decode()
+            lines += [f"enable secret 9 $9${digest[:14]}${digest[14:43]}", "!"]
+        lines += ["no aaa new-model", "!"]
+        lines += self.extra + (["!"] if self.extra else [])
+        for name in ("GigabitEthernet0/0/0", "GigabitEthernet0/0/1"):
+            lines += [f"interface {name}", " no ip address", " shutdown", " negotiation auto", "!"]
+        lines += ["ip forward-protocol nd", "no ip http server", "no ip http secure-server",
+                  "!", "control-plane", "!"]
+        for name, sub_commands in self.lines.items():
+            lines.append(f"line {name}")
+            lines += [f" {c}" for c in sub_commands]
+        lines += ["!", "end"]
+        return lines
+
+
+class RouterSimulator:
+    """
+    Simulated 4321 console on a pseudo-terminal
+
+    Runs the bootstrap banner, a timed break window into ROM monitor,
+    'confreg' and 'reset', then IOS with user, privileged and config prompts,
+    '--More--' paging and canned show output. Output is throttled to the
+    console baud rate with optional response jitter. Open ``port`` with
+    SimulatedConnection (or SimulatedAsyncTransport): a pseudo-terminal has
+    no line to hold in break, so a break arrives as a NUL byte. While the
+    client's line speed differs from the console speed, its input is lost
+    and it reads garbage, as on a real mismatched line.
+    """
+
+    PLATFORM = "ISR4321/K9"
+    IMAGE = "isr4300-universalk9.16.09.04.SPA.bin"
+
+    def __init__(self, hostname: str = "Router", enable_secret: Optional[str] = "cisco",
+                 serial_number: str = "FLM2041W2HD", baudrate: int = 9600,
+                 jitter: float = 0.0, latency: float = 0.005, time_scale: float = 1.0,
+                 break_window: float = 5.0, ios_boot_time: float = 10.0,
+                 start_privileged: bool = False, initial_dialog: bool = True,
+                 seed: Optional[int] = None, logger: Optional[Any] = None):
+        """
+        Args:
+            hostname: Hostname in the startup configuration
+            enable_secret: Enable secret in the startup configuration
+            serial_number: Processor board ID shown by show version/inventory
+            baudrate: Console speed output is throttled to (0 = unthrottled)
+            jitter: Extra random delay of up to this many seconds per response
+            latency: Fixed delay before each response
+            time_scale: Factor applied to boot timings (0.1 boots ten times faster)
+            break_window: Seconds after the bootstrap banner in which a break
+                enters ROM monitor
+            ios_boot_time: Seconds IOS takes from image load to its first prompt
+            start_privileged: Come up at 'Router#' instead of 'Router>' when
+                booting without a configuration
+            initial_dialog: Ask the initial configuration dialog question when
+                booting without a configuration, as a stock image does
+            seed: Seed for the jitter generator, for repeatable runs
+            logger: Optional logger
+        """
+        self.baudrate = baudrate
+        self.jitter = jitter
+        self.latency = latency
+        self.time_scale = time_scale
+        self.break_window = break_window
+        self.ios_boot_time = ios_boot_time
+        self.start_privileged = start_privileged
+        self.initial_dialog = initial_dialog
+        self.serial_number = serial_number
+        self.logger = logger
+        self.random = random.Random(seed)
+
+        self.startup_config = SimulatedConfig(hostname=hostname, enable_secret=enable_secret)
+        self.running_config = SimulatedConfig()
+        self.config_register = 0x2102
+        self.next_config_register = 0x2102
+        self.terminal_length = 24
+
+        self.mode = "off"
+        self.rommon_counter = 1
+        self.current_line: Optional[str] = None
+        self.boot_time: Optional[float] = None
+        self.breaks_received = 0
+        self.commands_received = 0
+
+        self.master_fd: Optional[int] = None
+        self.slave_fd: Optional[int] = None
+        self.port: Optional[str] = None
+
+        self._input = bytearray()
+        self._last_was_cr = False
+        self._pending_pages: List[str] = []
+        self._resume_mode = "priv"
+        self._password_attempts = 0
+        self._timers: List[Tuple[float, int, int, Callable[[], None]]] = []
+        self._timer_lock = threading.Lock()
+        self._timer_seq = 0
+        # Bumped on every power cycle so callbacks from the previous boot are dropped
+        self._generation = 0
+        self._output: queue.Queue = queue.Queue()
+        self._wake_r, self._wake_w = os.pipe()
+        self.running = False
+        self._threads: List[threading.Thread] = []
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def start(self, power_on_delay: float = 0.0) -> str:
+        """
+        Create the pseudo-terminal and power the router on
+
+        Args:
+            power_on_delay: Seconds before the bootstrap banner starts
+
+        Returns:
+            Slave device path to open (e.g. /dev/pts/5)
+        """
+        self.master_fd, self.slave_fd = os.openpty()
+        # No echo or line editing by the kernel; the simulator echoes like IOS
+        tty.setraw(self.slave_fd)
+        self._set_line_speed(self.slave_fd, self.baudrate)
+        self.port = os.ttyname(self.slave_fd)
+
+        self.running = True
+        for target, name in ((self._event_loop, "events"), (self._write_loop, "output")):
+            thread = threading.Thread(target=target, name=f"sim-{name}-{self.port}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        self.schedule(power_on_delay, self.power_cycle, scaled=False)
+        return self.port
+
+    def stop(self):
+        """Power off and release the pseudo-terminal"""
+        if not self.running:
+            return
+        self.running = False
+        os.write(self._wake_w, b"x")
+        self._output.put(None)
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        for fd in (self.master_fd, self.slave_fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def schedule(self, delay: float, callback: Callable[[], None], scaled: bool = True):
+        """Run a callback on the event thread after a delay (multiplied by time_scale if scaled)"""
+        if scaled:
+            delay *= self.time_scale
+        with self._timer_lock:
+            self._timer_seq += 1
+            heapq.heappush(self._timers, (time.monotonic() + delay,
+                                          self._timer_seq, self._generation, callback))
+        if self.running:
+            os.write(self._wake_w, b"x")
+
+    def power_cycle(self):
+        """Restart from the bootstrap banner"""
+        self._generation += 1
+        self.config_register = self.next_config_register
+        self.mode = "bootstrap"
+        self.rommon_counter = 1
+        self.terminal_length = 24
+        self._input.clear()
+        self._pending_pages = []
+
+        self.send("\r\nInitializing Hardware ...\r\n\r\n"
+                  "System integrity status: 0x610\r\nRom image verified correctly\r\n\r\n"
+                  "System Bootstrap, Version 16.7(4r), RELEASE SOFTWARE\r\n"
+                  "Copyright (c) 1994-2018  by cisco Systems, Inc.\r\n\r\n"
+                  "Current image running: Boot ROM0\r\n\r\n"
+                  "Last reset cause: LocalSoft\r\n"
+                  f"{self.PLATFORM} platform with 4194304 Kbytes of main memory\r\n\r\n")
+        self.schedule(self.break_window, self._load_image)
+
+    # -- event thread -------------------------------------------------------
+
+    def _event_loop(self):
+        while self.running:
+            timeout = None
+            with self._timer_lock:
+                if self._timers:
+                    timeout = max(0.0, self._timers[0][0] - time.monotonic())
+            try:
+                readable, _, _ = select.select([self.master_fd, self._wake_r], [], [], timeout)
+            except (OSError, ValueError):
+                return
+
+            if self._wake_r in readable:
+                os.read(self._wake_r, 1024)
+            if self.master_fd in readable:
+                try:
+                    data = os.read(self.master_fd, 4096)
+                except OSError:
+                    return
+                if not self._line_speed_matches():
+                    # Framing errors: only a break still gets through
+                    data = bytes(byte for byte in data if byte == BREAK_BYTE[0])
+                for byte in data:
+                    self._on_byte(byte)
+
+            while True:
+                with self._timer_lock:
+                    if not self._timers or self._timers[0][0] > time.monotonic():
+                        break
+                    _, _, generation, callback = heapq.heappop(self._timers)
+                if generation == self._generation:
+                    callback()
+
+    def _on_byte(self, byte: int):
+        if byte == BREAK_BYTE[0]:
+            self._on_break()
+            return
+        if self.mode == "off":
+            return
+
+        if self.mode == "more":
+            self._on_pager_key(chr(byte))
+            return
+
+        if byte == 0x1a and self.mode.startswith("config"):
+            # Ctrl-Z leaves configuration mode
+            self._input.clear()
+            self.send("^Z\r\n")
+            self._end_config()
+            return
+
+        if byte in (0x0d, 0x0a):
+            if byte == 0x0a and self._last_was_cr:
+                self._last_was_cr = False
+                return
+            self._last_was_cr = byte == 0x0d
+            line = self._input.decode("utf-8", errors="replace")
+            self._input.clear()
+            self._on_line(line)
+        else:
+            self._last_was_cr = False
+            self._input.append(byte)
+
+    def _on_break(self):
+        self.breaks_received += 1
+        if self.mode == "bootstrap":
+            self.mode = "rommon"
+            self.send('\r\nmonitor: command "boot" aborted due to user interrupt\r\n'
+                      + self._prompt())
+            if self.logger:
+                self.logger.debug(f"{self.port}: break entered ROM monitor")
+
+    # -- output thread ------------------------------------------------------
+
+    def send(self, text: str, baudrate: Optional[int] = None):
+        """
+        Queue output; it starts after the response delay and is throttled to the baud rate
+
+        Args:
+            text: Output
+            baudrate: Console speed to switch to before this output goes out
+        """
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        self._output.put((time.monotonic() + delay, text.encode("utf-8"), baudrate))
+
+    def _write_loop(self):
+        while self.running:
+            item = self._output.get()
+            if item is None:
+                return
+            due, data, baudrate = item
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            if baudrate:
+                self.baudrate = baudrate
+
+            # Ten bits per byte on an 8N1 line, sent in roughly 10 ms slices
+            rate = self.baudrate / 10 if self.baudrate else 0
+            step = max(1, int(rate / 100)) if rate else len(data)
+            for i in range(0, len(data), step):
+                chunk = data[i:i + step]
+                if not self._line_speed_matches():
+                    chunk = b"\xfe" * len(chunk)
+                try:
+                    os.write(self.master_fd, chunk)
+                except OSError:
+                    return
+                if rate:
+                    time.sleep(len(chunk) / rate)
+
+    @staticmethod
+    def _set_line_speed(fd: int, baudrate: int):
+        speed = getattr(termios, f"B{baudrate}", None)
+        if speed is None:
+            return
+        attrs = termios.tcgetattr(fd)
+        attrs[4] = attrs[5] = speed
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+
+    def _line_speed_matches(self) -> bool:
+        """Whether the client's end of the line runs at the console speed"""
+        speed = getattr(termios, f"B{self.baudrate}", None) if self.baudrate else None
+        if speed is None:
+            return True
+        try:
+            return termios.tcgetattr(self.master_fd)[5] == speed
+        except termios.error:
+            return True
+
+    # -- boot ---------------------------------------------------------------
+
+    def _load_image(self):
+        """Break window over: load and start IOS"""
+        if self.mode != "bootstrap":
+            return
+        self.mode = "booting"
+        self.send(f"Located {self.IMAGE}\r\nImage size 429279632 inode num 13, bks cnt 104805 "
+                  f"blk size 8*512\r\n" + "#" * 60 + "\r\n")
+        self.schedule(self.ios_boot_time / 2, lambda: self.send(
+            "Package header rev 3 structure detected\r\nCalculating SHA-1 hash...done\r\n"
+            "validating package type... Image validated\r\n\r\n"
+            "              Restricted Rights Legend\r\n\r\n"
+            "Cisco IOS Software [Fuji], ISR Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), "
+            "Version 16.9.4, RELEASE SOFTWARE (fc2)\r\n"
+            "Copyright (c) 1986-2019 by Cisco Systems, Inc.\r\n\r\n"
+            "Initializing flashfs...\r\n\r\n"))
+        self.schedule(self.ios_boot_time, self._ios_ready)
+
+    def _ios_ready(self):
+        self.boot_time = time.monotonic()
+        if self.config_register & IGNORE_CONFIG_BIT:
+            self.running_config = SimulatedConfig()
+            no_config = True
+        else:
+            self.running_config = copy.deepcopy(self.startup_config)
+            no_config = False
+
+        self.send(f"\r\ncisco {self.PLATFORM} (1RU) processor with 1647778K/6147K bytes of memory.\r\n"
+                  f"Processor board ID {self.serial_number}\r\n2 Gigabit Ethernet interfaces\r\n"
+                  "32768K bytes of non-volatile configuration memory.\r\n\r\n")
+
+        if no_config and self.initial_dialog:
+            self.mode = "dialog"
+            self.send("\r\n         --- System Configuration Dialog ---\r\n\r\n"
+                      "Would you like to enter the initial configuration dialog? [yes/no]: ")
+            return
+        self._exec_start(privileged=no_config and self.start_privileged)
+
+    def _exec_start(self, privileged: bool):
+        self.mode = "priv" if privileged else "user"
+        self.send("\r\nPress RETURN to get started!\r\n\r\n\r\n" + self._prompt())
+
+    # -- input --------------------------------------------------------------
+
+    def _on_line(self, line: str):
+        mode = self.mode
+        if mode in ("off", "bootstrap", "booting"):
+            return
+
+        if mode != "password":
+            self.send(line + "\r\n")
+        words = line.split()
+        if words:
+            self.commands_received += 1
+
+        handler = getattr(self, f"_{mode.replace('-', '_')}_line")
+        handler(line.strip(), words)
+
+    def _prompt(self) -> str:
+        if self.mode == "rommon":
+            return f"rommon {self.rommon_counter} > "
+        host = self.running_config.hostname
+        return {
+            "user": f"{host}>",
+            "priv": f"{host}#",
+            "config": f"{host}(config)#",
+            "config-line": f"{host}(config-line)#",
+            "config-if": f"{host}(config-if)#",
+            "password": "Password: ",
+        }.get(self.mode, "")
+
+    def _reply(self, text: str = ""):
+        """Send command output followed by the prompt, paging it if needed"""
+        lines = text.split("\r\n") if text else []
+        if text.endswith("\r\n"):
+            lines.pop()
+        page = self.terminal_length - 1
+        if self.terminal_length and len(lines) > page:
+            self._pending_pages = lines[page:]
+            self._resume_mode = self.mode
+            self.mode = "more"
+            self.send("\r\n".join(lines[:page]) + "\r\n" + PAGER_PROMPT)
+            return
+        self.send(text + self._prompt())
+
+    def _on_pager_key(self, key: str):
+        if key in ("q", "Q"):
+            self._pending_pages = []
+        count = {" ": self.terminal_length - 1, "\r": 1, "\n": 0}.get(key, 0)
+        if key not in ("q", "Q") and not count:
+            return
+
+        shown, self._pending_pages = self._pending_pages[:count], self._pending_pages[count:]
+        text = PAGER_ERASE + "".join(line + "\r\n" for line in shown)
+        if self._pending_pages:
+            self.send(text + PAGER_PROMPT)
+        else:
+            self.mode = self._resume_mode
+            self.send(text + self._prompt())
+
+    # ROM monitor
+
+    def _rommon_line(self, line: str, words: List[str]):
+        if not words:
+            self.send(self._prompt())
+            return
+        self.rommon_counter += 1
+        command = words[0].lower()
+
+        if command == "confreg" and len(words) > 1:
+            try:
+                self.next_config_register = int(words[1], 16)
+            except ValueError:
+                self.send(f"invalid value {words[1]}\r\n" + self._prompt())
+                return
+            self.send("\r\n\r\nYou must reset or power cycle for new config to take effect\r\n"
+                      + self._prompt())
+        elif command == "confreg":
+            self.mode = "confreg-dialog"
+            self.send(f"\r\n\r\nConfiguration Summary\r\n(Virtual Configuration Register: "
+                      f"0x{self.next_config_register:x})\r\nenabled are:\r\n"
+                      "[ 0 ] break/abort has effect\r\n[ 1 ] console baud: 9600\r\n"
+                      "boot: ...... the boot command in the config\r\n\r\n"
+                      "do you wish to change the configuration? y/n  [n]:  ")
+        elif command in ("reset", "boot"):
+            self.send("Resetting .......\r\n" if command == "reset" else "")
+            self.mode = "off"
+            self.schedule(0.5, self.power_cycle)
+        else:
+            self.send(f'monitor: command "{words[0]}" not found\r\n' + self._prompt())
+
+    def _confreg_dialog_line(self, line: str, words: List[str]):
+        # Changing bits interactively is not modelled; any answer keeps the value
+        self.mode = "rommon"
+        self.send("\r\n" + self._prompt())
+
+    def _dialog_line(self, line: str, words: List[str]):
+        if line.lower() in ("no", "n"):
+            self.send("\r\n")
+            self._exec_start(privileged=self.start_privileged)
+        else:
+            self.send("% Please answer 'yes' or 'no'.\r\n"
+                      "Would you like to enter the initial configuration dialog? [yes/no]: ")
+
+    # IOS exec
+
+    def _user_line(self, line: str, words: List[str]):
+        if not words:
+            self.send(self._prompt())
+        elif _matches(words, "enable"):
+            if self.running_config.enable_secret is None:
+                self.mode = "priv"
+                self.send(self._prompt())
+            else:
+                self.mode = "password"
+                self._password_attempts = 0
+                self.send(self._prompt())
+        elif _matches(words[:1], "show") and not _matches(words[1:2], "running-config"):
+            self._show(line, words)
+        else:
+            self._exec_common(line, words)
+
+    def _password_line(self, line: str, words: List[str]):
+        self.send("\r\n")
+        if line == self.running_config.enable_secret:
+            self.mode = "priv"
+            self.send(self._prompt())
+            return
+        self._password_attempts += 1
+        if self._password_attempts >= 3:
+            self.mode = "user"
+            self.send("% Bad secrets\r\n\r\n" + self._prompt())
+        else:
+            self.send(self._prompt())
+
+    def _priv_line(self, line: str, words: List[str]):
+        if not words:
+            self.send(self._prompt())
+        elif _matches(words, "configure terminal") or _matches(words, "configure"):
+            self.mode = "config"
+            self.send("Enter configuration commands, one per line.  End with CNTL/Z.\r\n"
+                      + self._prompt())
+        elif _matches(words[:1], "show"):
+            self._show(line, words)
+        elif _matches(words, "copy running-config startup-config"):
+            self.mode = "copy-dest"
+            self.send("Destination filename [startup-config]? ")
+        elif _matches(words, "write memory") or _matches(words, "write"):
+            self._save()
+        elif _matches(words, "reload"):
+            self.mode = "reload-confirm"
+            self.send("Proceed with reload? [confirm]")
+        elif _matches(words, "disable"):
+            self.mode = "user"
+            self.send(self._prompt())
+        elif _matches(words, "enable"):
+            self.send(self._prompt())
+        else:
+            self._exec_common(line, words)
+
+    def _exec_common(self, line: str, words: List[str]):
+        """Commands valid in user and privileged mode"""
+        if _matches(words[:2], "terminal length") and len(words) == 3 and words[2].isdigit():
+            self.terminal_length = int(words[2])
+            self.send(self._prompt())
+        elif _matches(words[:2], "terminal width") and len(words) == 3 and words[2].isdigit():
+            self.send(self._prompt())
+        elif _matches(words, "exit") or _matches(words, "logout"):
+            self.mode = "user" if self.mode == "priv" else self.mode
+            self.send("\r\n\r\n" + self._prompt())
+        else:
+            self._invalid(line)
+
+    def _copy_dest_line(self, line: str, words: List[str]):
+        self.mode = "priv"
+        if words and words[0] != "startup-config":
+            self.send(f"%Error opening {words[0]} (Permission denied)\r\n" + self._prompt())
+        else:
+            self._save()
+
+    def _save(self):
+        self.startup_config = copy.deepcopy(self.running_config)
+        size = sum(len(line) + 1 for line in self.running_config.render())
+        self.send(f"Building configuration...\r\n[OK]\r\n{size} bytes copied\r\n" + self._prompt())
+
+    def _reload_confirm_line(self, line: str, words: List[str]):
+        if line.lower().startswith("n"):
+            self.mode = "priv"
+            self.send(self._prompt())
+            return
+        self.mode = "off"
+        self.send("\r\n*Reload requested by console. Reload Reason: Reload Command.\r\n")
+        self.schedule(1.0, self.power_cycle)
+
+    # IOS configuration
+
+    def _config_line(self, line: str, words: List[str]):
+        config = self.running_config
+        if not words:
+            self.send(self._prompt())
+        elif _matches(words, "end"):
+            self._end_config()
+        elif _matches(words, "exit"):
+            self._end_config()
+        elif _matches(words[:1], "hostname") and len(words) == 2:
+            config.hostname = words[1]
+            self.send(self._prompt())
+        elif _matches(words[:2], "enable secret") and len(words) >= 3:
+            # 'enable secret [0] PASSWORD'
+            config.enable_secret = words[-1]
+            self.send(self._prompt())
+        elif _matches(words[:1], "config-register") and len(words) == 2:
+            try:
+                self.next_config_register = int(words[1], 16)
+            except ValueError:
+                self._invalid(line)
+                return
+            self.send(self._prompt())
+        elif _matches(words[:1], "line") and len(words) >= 3:
+            name = " ".join(["con" if _matches(words[1:2], "console") else words[1]] + words[2:])
+            self.current_line = name
+            config.lines.setdefault(name, [])
+            self.mode = "config-line"
+            self.send(self._prompt())
+        elif _matches(words[:1], "interface") and len(words) >= 2:
+            self.mode = "config-if"
+            self.send(self._prompt())
+        elif _matches(words[:1], "do") and len(words) > 1:
+            mode, self.mode = self.mode, "priv"
+            self._priv_line(" ".join(words[1:]), words[1:])
+            if self.mode == "priv":
+                self.mode = mode
+        elif words[0].lower() in ("ip", "no", "service", "username", "banner", "logging",
+                                  "snmp-server", "ntp", "aaa", "crypto"):
+            config.extra.append(line)
+            self.send(self._prompt())
+        else:
+            self._invalid(line)
+
+    def _config_line_line(self, line: str, words: List[str]):
+        if not words:
+            self.send(self._prompt())
+        elif _matches(words, "end"):
+            self._end_config()
+        elif _matches(words, "exit"):
+            self.mode = "config"
+            self.send(self._prompt())
+        elif _matches(words[:1], "speed") and len(words) == 2 and words[1].isdigit():
+            # The router switches once the command is taken; what follows is at the new rate
+            self.running_config.lines[self.current_line].append(line)
+            self.send(self._prompt(), baudrate=int(words[1]))
+        elif words[0].lower() in ("password", "login", "exec-timeout", "logging", "transport",
+                                  "stopbits", "privilege", "no", "history", "length"):
+            sub_commands = self.running_config.lines[self.current_line]
+            key = words[0].lower()
+            sub_commands[:] = [c for c in sub_commands if c.split()[0] != key] + [line]
+            self.send(self._prompt())
+        elif words[0].lower() in ("hostname", "enable", "line", "interface", "config-register"):
+            # Global commands also leave line configuration
+            self.mode = "config"
+            self._config_line(line, words)
+        else:
+            self._invalid(line)
+
+    def _config_if_line(self, line: str, words: List[str]):
+        if _matches(words, "end"):
+            self._end_config()
+        elif _matches(words, "exit"):
+            self.mode = "config"
+            self.send(self._prompt())
+        else:
+            self.send(self._prompt())
+
+    def _end_config(self):
+        self.mode = "priv"
+        self.send(self._prompt())
+
+    def _invalid(self, line: str):
+        self.send(" " * (len(self._prompt()) + len(line.split(" ")[0]) - 1) + "^\r\n" + INVALID_INPUT
+                  + "\r\n" + self._prompt())
+
+    # show commands
+
+    def _show(self, line: str, words: List[str]):
+        command, _, pipe = line.partition("|")
+        words = command.split()
+        if len(words) < 2:
+            self.send(INCOMPLETE + "\r\n" + self._prompt())
+            return
+
+        output = None
+        for pattern, render in self.SHOW_COMMANDS:
+            if _matches(words[1:], pattern):
+                output = render(self)
+                break
+        if output is None:
+            self._invalid(line)
+            return
+
+        lines = output.split("\n")
+        if pipe:
+            lines = _apply_filter(lines, pipe.strip())
+            if lines is None:
+                self._invalid(line)
+                return
+        self._reply("".join(f"{l}\r\n" for l in lines))
+
+    def _uptime(self) -> str:
+        minutes = int((time.monotonic() - (self.boot_time or time.monotonic())) / 60)
+        return f"{minutes // 60} hours, {minutes % 60} minutes" if minutes >= 60 else f"{minutes} minutes"
+
+    def _config_register_text(self) -> str:
+        text = f"Configuration register is 0x{self.config_register:x}"
+        if self.next_config_register != self.config_register:
+            text += f" (will be 0x{self.next_config_register:x} at next reload)"
+        return text
+
+    def _show_version(self) -> str:
+        host = self.running_config.hostname
+        return "\n".join([
+            "Cisco IOS XE Software, Version 16.09.04",
+            "Cisco IOS Software [Fuji], ISR Software (X86_64_LINUX_IOSD-UNIVERSALK9-M), "
+            "Version 16.9.4, RELEASE SOFTWARE (fc2)",
+            "Technical Support: http://www.cisco.com/techsupport",
+            "Copyright (c) 1986-2019 by Cisco Systems, Inc.",
+            "Compiled Thu 22-Aug-19 18:09 by mcpre",
+            "",
+            "ROM: IOS-XE ROMMON",
+            "",
+            f"{host} uptime is {self._uptime()}",
+            f"Uptime for this control processor is {self._uptime()}",
+            "System returned to ROM by Reload Command",
+            f'System image file is "bootflash:{self.IMAGE}"',
+            "Last reload reason: Reload Command",
+            "",
+            "Suite License Information for Module:'esg'",
+            "",
+            "Technology Package License Information:",
+            "",
+            "-----------------------------------------------------------------",
+            "Technology    Technology-package           Technology-package",
+            "              Current       Type           Next reboot",
+            "------------------------------------------------------------------",
+            "appxk9           None             None             None",
+            "uck9             None             None             None",
+            "securityk9       securityk9       Permanent        securityk9",
+            "ipbase           ipbasek9         Permanent        ipbasek9",
+            "",
+            f"cisco {self.PLATFORM} (1RU) processor with 1647778K/6147K bytes of memory.",
+            f"Processor board ID {self.serial_number}",
+            "2 Gigabit Ethernet interfaces",
+            "32768K bytes of non-volatile configuration memory.",
+            "4194304K bytes of physical memory.",
+            "3207167K bytes of flash memory at bootflash:.",
+            "",
+            self._config_register_text(),
+        ])
+
+    def _show_running(self) -> str:
+        lines = self.running_config.render()
+        size = sum(len(line) + 1 for line in lines)
+        return "\n".join(["Building configuration...", "", f"Current configuration : {size} bytes",
+                          "!"] + lines)
+
+    def _show_startup(self) -> str:
+        lines = self.startup_config.render()
+        size = sum(len(line) + 1 for line in lines)
+        return "\n".join([f"Using {size} out of 33554432 bytes", "!"] + lines)
+
+    def _show_inventory(self) -> str:
+        return "\n".join([
+            f'NAME: "Chassis", DESCR: "Cisco {self.PLATFORM[:-3]} Chassis"',
+            f"PID: {self.PLATFORM[:-3]}/K9      , VID: V07  , SN: {self.serial_number}",
+            "",
+            'NAME: "module 0", DESCR: "Cisco ISR4321 Built-In NIM controller"',
+            "PID: ISR4321/K9        , VID:      , SN:",
+            "",
+            'NAME: "NIM subslot 0/0", DESCR: "Front Panel 2 ports Gigabitethernet Module"',
+            "PID: ISR4321-2x1GE     , VID: V01  , SN:",
+            "",
+            'NAME: "module R0", DESCR: "Cisco ISR4321 Route Processor"',
+            f"PID: ISR4321/K9        , VID: V07  , SN: {self.serial_number[:-2]}XY",
+            "",
+            'NAME: "module F0", DESCR: "Cisco ISR4321 Forwarding Processor"',
+            "PID: ISR4321/K9        , VID:      , SN:",
+        ])
+
+    def _show_ip_interface_brief(self) -> str:
+        return "\n".join([
+            "Interface              IP-Address      OK? Method Status                Protocol",
+            "GigabitEthernet0/0/0   unassigned      YES unset  administratively down down",
+            "GigabitEthernet0/0/1   unassigned      YES unset  administratively down down",
+            "GigabitEthernet0       unassigned      YES unset  administratively down down",
+        ])
+
+    def _show_license_summary(self) -> str:
+        return "\n".join([
+            "Index 1 Feature: appxk9",
+            "        Period left: Not Activated",
+            "        Period Used: 0  minute  0  second",
+            "        License Type: EvalRightToUse",
+            "        License State: Not in Use, EULA not accepted",
+            "        License Count: Non-Counted",
+            "        License Priority: None",
+            "Index 2 Feature: securityk9",
+            "        Period left: Life time",
+            "        License Type: Permanent",
+            "        License State: Active, In Use",
+            "        License Count: Non-Counted",
+            "        License Priority: Medium",
+        ])
+
+    def _show_license_udi(self) -> str:
+        return "\n".join([
+            "SlotID   PID                    SN              UDI",
+            "--------------------------------------------------------------------------------",
+            f"*        {self.PLATFORM:<22} {self.serial_number:<15} "
+            f"{self.PLATFORM}:{self.serial_number}",
+        ])
+
+    def _show_license_feature(self) -> str:
+        return "\n".join([
+            "Feature name             Enforcement  Evaluation  Subscription   Enabled  RightToUse",
+            "appxk9                   yes          yes         no             no       yes",
+            "uck9                     yes          yes         no             no       yes",
+            "securityk9               yes          yes         no             yes      yes",
+            "ipbasek9                 no           no          no             yes      no",
+        ])
+
+    def _show_clock(self) -> str:
+        return time.strftime("*%H:%M:%S.000 UTC %a %b %d %Y", time.gmtime())
+
+    def _show_users(self) -> str:
+        return "\n".join([
+            "    Line       User       Host(s)              Idle       Location",
+            "*  0 con 0                idle                 00:00:00",
+            "",
+            "  Interface    User               Mode         Idle     Peer Address",
+        ])
+
+    # (words after 'show', renderer); first match wins, so longer commands come first
+    SHOW_COMMANDS: List[Tuple[str, Callable[["RouterSimulator"], str]]] = [
+        ("version", _show_version),
+        ("running-config", _show_running),
+        ("startup-config", _show_startup),
+        ("inventory", _show_inventory),
+        ("ip interface brief", _show_ip_interface_brief),
+        ("license summary", _show_license_summary),
+        ("license feature", _show_license_feature),
+        ("license udi", _show_license_udi),
+        ("clock", _show_clock),
+        ("users", _show_users),
+    ]
+
+
+class SimulatedConnection(SerialConnection):
+    """SerialConnection for simulator ports: each break also goes out as BREAK_BYTE"""
+
+    def _break_sent(self, method: str):
+        try:
+            self.serial_port.write(BREAK_BYTE)
+        except OSError:
+            pass
+        super()._break_sent(method)
+
+
+class SimulatedAsyncTransport(AsyncSerialTransport):
+    """AsyncSerialTransport for simulator ports: each break also goes out as BREAK_BYTE"""
+
+    def _break_sent(self, method: str):
+        try:
+            os.write(self.serial_port.fileno(), BREAK_BYTE)
+        except OSError:
+            pass
+        super()._break_sent(method)
+
+
+def _matches(words: List[str], command: str) -> bool:
+    """True if words are an IOS-style abbreviation of command ('conf t' for 'configure terminal')"""
+    keywords = command.split()
+    if len(words) != len(keywords):
+        return False
+    return all(keyword.startswith(word.lower()) for word, keyword in zip(words, keywords))
+
+
+def _apply_filter(lines: List[str], pipe: str) -> Optional[List[str]]:
+    """Apply an output modifier such as 'include enable secret'; None if it is not one"""
+    action, _, expression = pipe.partition(" ")
+    if not expression:
+        return None
+    try:
+        pattern = re.compile(expression.strip())
+    except re.error:
+        return None
+
+    action = action.lower()
+    if "include".startswith(action):
+        return [l for l in lines if pattern.search(l)]
+    if "exclude".startswith(action):
+        return [l for l in lines if not pattern.search(l)]
+    if "begin".startswith(action):
+        for i, l in enumerate(lines):
+            if pattern.search(l):
+                return lines[i:]
+        return []
+    if "section".startswith(action):
+        result, keep = [], False
+        for l in lines:
+            if not l.startswith(" "):
+                keep = bool(pattern.search(l))
+            if keep:
+                result.append(l)
+        return result
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated Cisco 4321 consoles on pseudo-terminals")
+    parser.add_argument("--count", type=int, default=1, help="Number of routers (default: 1)")
+    parser.add_argument("--baud", type=int, default=9600,
+                        help="Console speed output is throttled to, 0 for none (default: 9600)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Random extra delay per response in seconds (default: 0)")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Factor applied to boot timings, e.g. 0.1 (default: 1)")
+    parser.add_argument("--power-on-delay", type=float, default=5.0,
+                        help="Seconds before the routers start booting (default: 5)")
+    parser.add_argument("--secret", default="cisco", help="Enable secret in the startup config")
+    parser.add_argument("--no-dialog", action="store_true",
+                        help="Skip the initial configuration dialog when booting unconfigured")
+    parser.add_argument("--privileged", action="store_true",
+                        help="Come up at 'Router#' instead of 'Router>' when booting unconfigured")
+    parser.add_argument("--recover", metavar="SECRET",
+                        help="Run the fleet recovery against the routers with this new enable "
+                             "secret, then exit")
+    parser.add_argument("--seed", type=int, help="Jitter seed for repeatable runs")
+    args = parser.parse_args()
+
+    simulators = []
+    for i in range(args.count):
+        simulator = RouterSimulator(hostname=f"R{i + 1}", enable_secret=args.secret,
+                                    serial_number=f"FLM2041W{i:03d}", baudrate=args.baud,
+                                    jitter=args.jitter, time_scale=args.time_scale,
+                                    start_privileged=args.privileged,
+                                    initial_dialog=not args.no_dialog,
+                                    seed=None if args.seed is None else args.seed + i)
+        simulator.start(power_on_delay=args.power_on_delay)
+        simulators.append(simulator)
+        print(f"R{i + 1}: {simulator.port}")
+
+    try:
+        if args.recover:
+            # Breaks on a pseudo-terminal only arrive through SimulatedConnection
+            from fleet_recovery import FleetRecovery
+            fleet = FleetRecovery({s.port: s.startup_config.hostname for s in simulators},
+                                  args.recover, max_concurrency=args.count,
+                                  baudrate=args.baud or 9600,
+                                  connection_factory=SimulatedConnection)
+            fleet.run()
+            for result in sorted(fleet.results, key=lambda r: r.name):
+                status = "ok" if result.success else f"failed at {result.failed_step}"
+                print(f"{result.name}: {status} ({result.duration:.1f}s)")
+            return 0 if all(r.success for r in fleet.results) else 1
+
+        print("\nOpen the ports with router_simulator.SimulatedConnection, or run again "
+              "with --recover SECRET\n\nCtrl-C to stop")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,14 +6,18 @@ import serial
 import serial.tools.list_ports
 import time
 import threading
-import queue
 import os
+import re
+import select
 import sys
 from pathlib import Path
-from typing import Optional, List, Callable, Any
+from typing import Optional, List, Dict, Callable, Any, Tuple, Union, Pattern, Sequence
 import fcntl
 import termios
 import struct
+from dataclasses import dataclass
+from stream_buffer import StreamBuffer
+from port_discovery import PortDiscovery, PortProbe
 
 try:
     import termios
@@ -25,21 +29,88 @@ except (ImportError, AttributeError):
     TIOCCBRK = 0x5428
 
 
+def make_output_matcher(condition: Union[str, Pattern, Sequence[Pattern], Callable[[str], Any]],
+                        overlap: int = 1024) -> Callable[[str], Any]:
+    """
+    Turn a wait condition into a callable fed with successive pieces of output
+    
+    Patterns are searched over the new text plus the last `overlap` characters
+    already seen, so matches spanning chunk boundaries are still found
+    without rescanning the whole stream. Callables are returned unchanged.
+    """
+    if callable(condition):
+        return condition
+    
+    if isinstance(condition, (str, re.Pattern)):
+        condition = [condition]
+    patterns = [re.compile(p) if isinstance(p, str) else p for p in condition]
+    window = ""
+    
+    def check(text: str) -> Optional[Any]:
+        nonlocal window
+        window = window[-overlap:] + text
+        for pattern in patterns:
+            match = pattern.search(window)
+            if match:
+                return match
+        return None
+    
+    return check
+
+
+@dataclass
+class ReadMatch:
+    """Result of read_until(): which pattern matched and where"""
+    index: int
+    match: Any
+    text: str
+    offset: int
+
+
 class SerialConnection:
     """Robust serial port connection handler"""
     
+    # Longest a dedicated reader blocks before re-checking for close()
+    SELECT_TIMEOUT = 0.25
+    
+    # Already-scanned text kept so wait_for() patterns can match across chunks
+    WAIT_OVERLAP = 1024
+    
     def __init__(self, port: Optional[str] = None, baudrate: int = 9600,
-                 logger: Optional[Any] = None, metrics: Optional[Any] = None):
+                 logger: Optional[Any] = None, metrics: Optional[Any] = None,
+                 reactor: Optional[Any] = None,
+                 buffer_size: int = StreamBuffer.DEFAULT_CAPACITY):
+        """
+        Args:
+            port: TTY device path (auto-selected on open if None)
+            baudrate: Console line speed
+            logger: Optional logger
+            metrics: Optional metrics collector
+            reactor: Optional SerialReactor; when given, reads are served by its
+                shared I/O thread instead of a dedicated thread per port
+            buffer_size: Bytes of received output retained for inspection
+        """
         self.port = port
         self.baudrate = baudrate
         self.logger = logger
         self.metrics = metrics
+        self.reactor = reactor
         
         self.serial_port: Optional[serial.Serial] = None
-        self.output_queue: queue.Queue = queue.Queue()
-        self.output_buffer: str = ""
+        self.stream = StreamBuffer(buffer_size)
+        # Stream offset up to which read_output() has returned output
+        self._read_offset = 0
+        self.data_available = threading.Condition()
+        # Called from the reader thread with each decoded chunk; replaced, never mutated
+        self.data_listeners: Tuple[Callable[[str], None], ...] = ()
         self.read_thread: Optional[threading.Thread] = None
         self.reading_active = False
+        
+        # Adapter VID:PID per port path (see get_adapter_id)
+        self._adapter_ids: Dict[Optional[str], Optional[str]] = {}
+        
+        # Method order for send_break() without a method (e.g. from a BreakProfile)
+        self.break_order: Optional[List[str]] = None
         self.connection_start_time: Optional[float] = None
         
     def detect_ports(self) -> List[str]:
@@ -68,6 +139,44 @@ class SerialConnection:
         existing_ports = [p for p in ports if Path(p).exists()]
         return sorted(set(existing_ports))
     
+    def discover_consoles(self, ports: Optional[List[str]] = None,
+                          timeout: float = 2.0) -> Dict[str, PortProbe]:
+        """
+        Probe ports in parallel for a live Cisco console
+        
+        Args:
+            ports: Ports to probe (default: detect_ports())
+            timeout: Seconds allowed per port
+        
+        Returns:
+            Port -> PortProbe, best candidate first
+        """
+        if ports is None:
+            ports = self.detect_ports()
+        return PortDiscovery(logger=self.logger).discover(ports, timeout)
+    
+    def get_adapter_id(self, port: Optional[str] = None) -> Optional[str]:
+        """
+        USB-serial adapter VID:PID for a port, None for non-USB ports
+        
+        The lookup enumerates every port on the system, so the result is
+        cached per port; open() fills it in before any reading starts.
+        """
+        port = port or self.port
+        if port in self._adapter_ids:
+            return self._adapter_ids[port]
+        
+        adapter = None
+        try:
+            for port_info in serial.tools.list_ports.comports():
+                if port_info.device == port and port_info.vid is not None:
+                    adapter = f"{port_info.vid:04x}:{port_info.pid:04x}"
+                    break
+        except Exception:
+            pass
+        self._adapter_ids[port] = adapter
+        return adapter
+    
     def select_port(self, ports: Optional[List[str]] = None) -> Optional[str]:
         """Select port from available ports"""
         if ports is None:
@@ -126,14 +235,10 @@ class SerialConnection:
             self.serial_port.reset_input_buffer()
             self.serial_port.reset_output_buffer()
             
-            self.connection_start_time = time.time()
-            if self.metrics:
-                self.metrics.start_connection()
+            # Enumerate devices now, never from the reader thread
+            self.get_adapter_id()
             
-            # Start output capture thread
-            self.reading_active = True
-            self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
-            self.read_thread.start()
+            self._start_reading()
             
             if self.logger:
                 self.logger.info(f"Opened serial port {self.port} at {self.baudrate} baud")
@@ -154,10 +259,26 @@ class SerialConnection:
                 self.logger.log_exception(e, "opening serial port")
             return False
     
+    def _start_reading(self):
+        """Start output capture on the freshly opened port (shared reactor or dedicated thread)"""
+        self.connection_start_time = time.time()
+        if self.metrics:
+            self.metrics.start_connection()
+        
+        self.reading_active = True
+        if self.reactor is not None and self.fileno() is not None:
+            self.reactor.register(self)
+        else:
+            self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+            self.read_thread.start()
+    
     def close(self):
         """Close serial port connection"""
         self.reading_active = False
         
+        if self.reactor is not None:
+            self.reactor.unregister(self)
+        
         if self.read_thread and self.read_thread.is_alive():
             self.read_thread.join(timeout=2.0)
         
@@ -172,59 +293,235 @@ class SerialConnection:
         
         self.serial_port = None
     
+    def fileno(self) -> Optional[int]:
+        """Port file descriptor, or None if the port cannot be selected on"""
+        if not self.serial_port or not self.serial_port.is_open:
+            return None
+        try:
+            return self.serial_port.fileno()
+        except (AttributeError, OSError, ValueError):
+            return None
+    
     def _read_loop(self):
-        """Background thread to continuously read from serial port"""
+        """Background thread blocking on the port until data arrives"""
+        fd = self.fileno()
+        
         while self.reading_active and self.serial_port and self.serial_port.is_open:
             try:
-                if self.serial_port.in_waiting > 0:
-                    data = self.serial_port.read(self.serial_port.in_waiting)
-                    if data:
-                        text = data.decode('utf-8', errors='replace')
-                        self.output_buffer += text
-                        self.output_queue.put(text)
-                        
-                        if self.logger:
-                            self.logger.log_command(text, direction="RECEIVED")
-                            if self.logger.log_level <= 10:  # DEBUG
-                                self.logger.log_hex_dump(data, "Received")
-                        
-                        if self.metrics:
-                            self.metrics.record_bytes(received=len(data))
-                else:
-                    time.sleep(0.01)  # Small delay when no data
-            except serial.SerialException:
+                if fd is not None:
+                    readable, _, _ = select.select([fd], [], [], self.SELECT_TIMEOUT)
+                    if not readable:
+                        continue
+                elif self.serial_port.in_waiting == 0:
+                    time.sleep(0.01)  # No descriptor to select on, fall back to polling
+                    continue
+                
+                if not self.read_available():
+                    break
+            except (OSError, ValueError):
+                # Port closed underneath select
                 break
             except Exception as e:
                 if self.logger:
                     self.logger.warning(f"Error in read loop: {e}")
                 time.sleep(0.1)
     
-    def read_output(self, timeout: float = 1.0) -> str:
-        """Read output from queue with timeout"""
-        output = ""
-        end_time = time.time() + timeout
+    def read_available(self) -> bool:
+        """
+        Read whatever the port has buffered and dispatch it
+        
+        Called from the reader thread (or a SerialReactor) once the port is
+        readable.
+        
+        Returns:
+            False if the port has failed and should no longer be read
+        """
+        try:
+            data = self.serial_port.read(self.serial_port.in_waiting or 1)
+        except (serial.SerialException, OSError, AttributeError, TypeError):
+            return False
         
-        while time.time() < end_time:
+        if data:
             try:
-                chunk = self.output_queue.get(timeout=0.1)
-                output += chunk
-            except queue.Empty:
-                continue
+                self._handle_data(data)
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Error in read loop: {e}")
+        return True
+    
+    def _handle_data(self, data: bytes):
+        """Store received bytes and hand them to logging and metrics"""
+        text = data.decode('utf-8', errors='replace')
+        self.stream.append(data)
+        # Counted before listeners and logging, which may raise
+        if self.metrics:
+            self.metrics.record_bytes(received=len(data))
+        with self.data_available:
+            self.data_available.notify_all()
         
-        return output
+        for listener in self.data_listeners:
+            try:
+                listener(text)
+            except Exception as e:
+                if self.logger:
+                    self.logger.warning(f"Data listener failed: {e}")
+        
+        if self.logger:
+            self.logger.log_command(text, direction="RECEIVED")
+            if self.logger.wants_hex_dump():
+                self.logger.log_hex_dump(data, "Received")
+    
+    def add_data_listener(self, listener: Callable[[str], None]):
+        """Call listener from the reader thread with every chunk received"""
+        self.data_listeners = self.data_listeners + (listener,)
+    
+    def remove_data_listener(self, listener: Callable[[str], None]):
+        """Stop calling a listener added with add_data_listener()"""
+        self.data_listeners = tuple(l for l in self.data_listeners if l != listener)
+    
+    def read_output(self, timeout: float = 1.0) -> str:
+        """
+        Output received since the previous read_output()
+        
+        Returns as soon as there is any, or an empty string after the timeout.
+        """
+        # Output dropped by clear_output_buffer() is not waited for
+        offset = max(self._read_offset, self.stream.start_offset)
+        self._wait_data(offset, time.time() + timeout)
+        text, self._read_offset = self.stream.text_since(offset)
+        return text
+    
+    @property
+    def output_buffer(self) -> str:
+        """Output retained since the last clear (bounded by buffer_size)"""
+        return self.stream.text_since(0)[0]
     
     def get_output_buffer(self) -> str:
         """Get current output buffer"""
         return self.output_buffer
     
+    def get_stream_offset(self) -> int:
+        """Absolute offset of the next byte to be received"""
+        return self.stream.end_offset
+    
+    def read_since(self, offset: int) -> Tuple[str, int]:
+        """
+        Get output received since an offset without copying older history
+        
+        Args:
+            offset: Offset from get_stream_offset() or a previous call
+        
+        Returns:
+            Tuple of (text, next_offset)
+        """
+        return self.stream.text_since(offset)
+    
+    def wait_for(self, condition: Union[str, Pattern, Sequence[Pattern], Callable[[str], Any]],
+                 timeout: float = 10.0, since: Optional[int] = None) -> Any:
+        """
+        Block until received output satisfies a condition
+        
+        The reader signals waiters as data arrives, so this returns as soon as
+        the condition is met instead of on the next poll.
+        
+        Args:
+            condition: Regex (string or compiled), list of compiled regexes
+                (first to match wins), or a callable invoked with each piece of
+                newly received text that returns a truthy value when done
+            timeout: Maximum seconds to wait
+            since: Stream offset to start from (default: all retained output)
+        
+        Returns:
+            The re.Match or the callable's truthy result, None on timeout
+        """
+        check = make_output_matcher(condition, self.WAIT_OVERLAP)
+        offset = 0 if since is None else since
+        deadline = time.time() + timeout
+        
+        while True:
+            text, offset = self.stream.text_since(offset)
+            if text:
+                result = check(text)
+                if result:
+                    return result
+                if time.time() >= deadline:
+                    return None
+            
+            if not self._wait_data(offset, deadline):
+                return None
+    
+    def _wait_data(self, offset: int, deadline: float) -> bool:
+        """Block until bytes past an offset arrive; False once the deadline passes"""
+        with self.data_available:
+            # Re-check under the lock so a notify cannot slip in unseen
+            while self.stream.end_offset <= offset:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.data_available.wait(remaining)
+        return True
+    
+    def read_until(self, patterns: Union[str, Pattern, Sequence[Union[str, Pattern]]],
+                   timeout: float = 10.0, since: Optional[int] = None) -> Optional[ReadMatch]:
+        """
+        Expect-style read that returns as soon as one of several patterns matches
+        
+        Args:
+            patterns: Regex or list of regexes (string or compiled); when several
+                match, the earliest match in the output wins
+            timeout: Maximum seconds to wait
+            since: Stream offset to start from, normally taken before writing
+                the command (default: all retained output)
+        
+        Returns:
+            ReadMatch with the index of the matching pattern, the match, the
+            text read up to the end of the match and the stream offset just
+            past it; None on timeout
+        """
+        if isinstance(patterns, (str, re.Pattern)):
+            patterns = [patterns]
+        compiled = [re.compile(p) if isinstance(p, str) else p for p in patterns]
+        offset = self.stream.start_offset if since is None else since
+        deadline = time.time() + timeout
+        
+        # Patterns run over the raw bytes decoded one character per byte, so a
+        # match position is a byte count and the offset needs no re-encoding
+        raw = bytearray()
+        base = offset  # Stream offset of raw[0]
+        
+        while True:
+            data, offset = self.stream.read_since(offset)
+            if data:
+                begin = offset - len(data)
+                if begin > base + len(raw):
+                    # The ring dropped bytes before we read them; start over there
+                    raw, base = bytearray(), begin
+                scan_from = max(0, len(raw) - self.WAIT_OVERLAP)
+                raw += data
+                
+                # Decode only the tail being scanned, plus as much again before
+                # it as context, so each chunk costs the same however long the read
+                window_start = max(0, scan_from - self.WAIT_OVERLAP)
+                window = raw[window_start:].decode('latin-1')
+                best: Optional[Tuple[int, Any]] = None
+                for index, pattern in enumerate(compiled):
+                    match = pattern.search(window, scan_from - window_start)
+                    if match and (best is None or match.start() < best[1].start()):
+                        best = (index, match)
+                if best is not None:
+                    index, match = best
+                    end = window_start + match.end()
+                    text = raw[:end].decode('utf-8', errors='replace')
+                    return ReadMatch(index, match, text, base + end)
+                if time.time() >= deadline:
+                    return None
+            
+            if not self._wait_data(offset, deadline):
+                return None
+    
     def clear_output_buffer(self):
         """Clear output buffer"""
-        self.output_buffer = ""
-        while not self.output_queue.empty():
-            try:
-                self.output_queue.get_nowait()
-            except queue.Empty:
-                break
+        self.stream.clear()
     
     def write(self, data: str) -> int:
         """Write data to serial port"""
@@ -243,7 +540,7 @@ class SerialConnection:
             
             if self.logger:
                 self.logger.log_command(data, direction="SENT")
-                if self.logger.log_level <= 10:  # DEBUG
+                if self.logger.wants_hex_dump():
                     self.logger.log_hex_dump(data.encode('utf-8'), "Sent")
             
             if self.metrics:
@@ -267,12 +564,14 @@ class SerialConnection:
             
             if self.logger:
                 self.logger.debug(f"Sent break sequence (standard method, {duration}s)")
+            if self.metrics:
                 self.metrics.record_break_attempt("standard", elapsed, True, time.time())
             
             return True
         except Exception as e:
             if self.logger:
                 self.logger.warning(f"Standard break failed: {e}")
+            if self.metrics:
                 self.metrics.record_break_attempt("standard", 0, False, time.time())
             return False
     
@@ -295,12 +594,14 @@ class SerialConnection:
             
             if self.logger:
                 self.logger.debug(f"Sent break sequence (ioctl method, {duration}s)")
+            if self.metrics:
                 self.metrics.record_break_attempt("ioctl", elapsed, True, time.time())
             
             return True
         except Exception as e:
             if self.logger:
                 self.logger.warning(f"Ioctl break failed: {e}")
+            if self.metrics:
                 self.metrics.record_break_attempt("ioctl", 0, False, time.time())
             return False
     
@@ -341,12 +642,14 @@ class SerialConnection:
             
             if self.logger:
                 self.logger.debug("Sent break sequence (signal toggle method)")
+            if self.metrics:
                 self.metrics.record_break_attempt("signal_toggle", elapsed, True, time.time())
             
             return True
         except Exception as e:
             if self.logger:
                 self.logger.warning(f"Signal toggle break failed: {e}")
+            if self.metrics:
                 self.metrics.record_break_attempt("signal_toggle", 0, False, time.time())
             return False
     
@@ -368,12 +671,18 @@ class SerialConnection:
             ("ioctl", lambda: self.send_break_ioctl(duration)),
             ("signal_toggle", self.send_break_signal_toggle),
         ]
+        if self.break_order:
+            rank = {name: i for i, name in enumerate(self.break_order)}
+            methods.sort(key=lambda m: rank.get(m[0], len(rank)))
         
         if method:
             # Try specific method
             for name, func in methods:
                 if name == method:
-                    return func()
+                    if func():
+                        self._break_sent(name)
+                        return True
+                    return False
             return False
         else:
             # Try all methods in order
@@ -381,6 +690,7 @@ class SerialConnection:
                 if func():
                     if self.logger:
                         self.logger.info(f"Break sequence successful using {name} method")
+                    self._break_sent(name)
                     return True
                 time.sleep(0.1)  # Small delay between attempts
             
@@ -388,6 +698,35 @@ class SerialConnection:
                 self.logger.error("All break sequence methods failed")
             return False
     
+    def _break_sent(self, method: str):
+        """Bookkeeping after a break went out on the line"""
+        # Mark the break in the session capture so replays can follow it
+        if self.logger and self.logger.wants_hex_dump():
+            self.logger.log_hex_dump(method.encode('utf-8'), "Break")
+    
+    def set_baudrate(self, baudrate: int) -> bool:
+        """
+        Change the local line speed without closing the port
+        
+        The reader thread, stream buffer and listeners stay in place; bytes
+        still queued from the old rate are discarded.
+        """
+        if not self.is_open():
+            return False
+        
+        try:
+            self.serial_port.baudrate = baudrate
+            self.serial_port.reset_input_buffer()
+            self.baudrate = baudrate
+        except (serial.SerialException, ValueError, OSError) as e:
+            if self.logger:
+                self.logger.error(f"Failed to set baud rate {baudrate}: {e}")
+            return False
+        
+        if self.logger:
+            self.logger.debug(f"Local port now at {baudrate} baud")
+        return True
+    
     def is_open(self) -> bool:
         """Check if port is open"""
         return self.serial_port is not None and self.serial_port.is_open
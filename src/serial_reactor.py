@@ -0,0 +1,190 @@
+"""
+Event-driven I/O thread serving many serial connections from one selector
+"""
+
+import os
+import selectors
+import threading
+import time
+from typing import Optional, Any, List, Tuple
+
+
+class SerialReactor:
+    """Single reader thread that blocks on many serial port descriptors at once"""
+    
+    # Pause after a select error no single connection can be blamed for
+    SELECT_ERROR_BACKOFF = 0.5
+    
+    def __init__(self, logger: Optional[Any] = None):
+        self.logger = logger
+        # Selector and wake pipe exist from start() to stop(), so a stopped
+        # reactor can be started again
+        self.selector: Optional[selectors.BaseSelector] = None
+        self.thread: Optional[threading.Thread] = None
+        self.running = False
+        
+        # Self-pipe used to wake the selector for registration changes and shutdown
+        self._wake_r: Optional[int] = None
+        self._wake_w: Optional[int] = None
+        
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[str, Any, threading.Event]] = []
+        self._connections: List[Any] = []
+    
+    def start(self):
+        """Start the reactor thread"""
+        with self._lock:
+            if self.running:
+                return
+            self.selector = selectors.DefaultSelector()
+            self._wake_r, self._wake_w = os.pipe()
+            os.set_blocking(self._wake_r, False)
+            os.set_blocking(self._wake_w, False)
+            self.selector.register(self._wake_r, selectors.EVENT_READ, None)
+            
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="serial-reactor", daemon=True)
+            self.thread.start()
+        
+        if self.logger:
+            self.logger.debug("Serial reactor started")
+    
+    def stop(self):
+        """Stop the reactor thread and release the selector"""
+        with self._lock:
+            if not self.running:
+                return
+            self.running = False
+        self._wake()
+        
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=2.0)
+        
+        # Connections still registered stop being served with this selector
+        for connection in self._connections:
+            connection.reading_active = False
+        self._connections = []
+        
+        self.selector.close()
+        self.selector = None
+        os.close(self._wake_r)
+        os.close(self._wake_w)
+        self._wake_r = self._wake_w = None
+        
+        if self.logger:
+            self.logger.debug("Serial reactor stopped")
+    
+    def register(self, connection: Any, timeout: float = 2.0) -> bool:
+        """Start serving reads for an open connection"""
+        self.start()
+        return self._submit("register", connection, timeout)
+    
+    def unregister(self, connection: Any, timeout: float = 2.0) -> bool:
+        """Stop serving reads for a connection (call before closing its port)"""
+        if not self.running:
+            return True
+        return self._submit("unregister", connection, timeout)
+    
+    def connection_count(self) -> int:
+        """Number of connections currently served"""
+        return len(self._connections)
+    
+    def _submit(self, operation: str, connection: Any, timeout: float) -> bool:
+        """Hand a registration change to the reactor thread and wait for it"""
+        done = threading.Event()
+        with self._lock:
+            self._pending.append((operation, connection, done))
+        self._wake()
+        
+        # Changes made from the reactor thread itself cannot wait on it
+        if threading.current_thread() is self.thread:
+            self._apply_pending()
+            return True
+        
+        return done.wait(timeout)
+    
+    def _wake(self):
+        """Interrupt a blocking select"""
+        if self._wake_w is None:
+            return
+        try:
+            os.write(self._wake_w, b'\0')
+        except (BlockingIOError, OSError):
+            pass  # Pipe already full, the reactor will wake anyway
+    
+    def _apply_pending(self):
+        """Apply queued registration changes (reactor thread only)"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        
+        for operation, connection, done in pending:
+            try:
+                if operation == "register":
+                    fd = connection.fileno()
+                    if fd is not None and connection not in self._connections:
+                        self.selector.register(fd, selectors.EVENT_READ, connection)
+                        self._connections.append(connection)
+                elif connection in self._connections:
+                    self.selector.unregister(connection.fileno())
+                    self._connections.remove(connection)
+            except (KeyError, ValueError, OSError) as e:
+                if self.logger:
+                    self.logger.warning(f"Serial reactor {operation} failed for {connection.port}: {e}")
+            finally:
+                done.set()
+    
+    def _drop(self, connection: Any, fd: int):
+        """Stop serving a connection whose port failed"""
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError, OSError):
+            pass
+        if connection in self._connections:
+            self._connections.remove(connection)
+        connection.reading_active = False
+    
+    def _drop_failed(self) -> bool:
+        """Drop connections whose descriptor is no longer valid; True if any were"""
+        dropped = False
+        for key in list(self.selector.get_map().values()):
+            if key.data is None:
+                continue
+            try:
+                os.fstat(key.fd)
+            except OSError:
+                if self.logger:
+                    self.logger.warning(f"Serial reactor dropping {key.data.port}: descriptor closed")
+                self._drop(key.data, key.fd)
+                dropped = True
+        return dropped
+    
+    def _run(self):
+        """Reactor loop: block until any port or the wake pipe is readable"""
+        while self.running:
+            try:
+                events = self.selector.select()
+            except OSError as e:
+                if self.logger:
+                    self.logger.warning(f"Serial reactor select failed: {e}")
+                # Usually a port closed without unregistering; drop it rather
+                # than failing the same select again straight away
+                if not self._drop_failed():
+                    time.sleep(self.SELECT_ERROR_BACKOFF)
+                continue
+            
+            for key, _ in events:
+                if key.data is None:
+                    try:
+                        while os.read(self._wake_r, 512):
+                            pass
+                    except (BlockingIOError, OSError):
+                        pass
+                    self._apply_pending()
+                    continue
+                
+                connection = key.data
+                if not connection.read_available():
+                    self._drop(connection, key.fd)
+        
+        # Release anyone still waiting on a registration change
+        self._apply_pending()
@@ -0,0 +1,405 @@
+"""
+Compact binary capture of raw console traffic, rendered as hex only on demand
+
+A capture is two files. FILE holds a header (wall-clock and monotonic start
+times) followed by length-prefixed frames:
+
+    elapsed (f64, monotonic seconds) | direction (u8) | state tag (u8) | length (u32) | bytes
+
+FILE.idx is an append-only sidecar index of frame offsets: a checkpoint every
+INDEX_EVERY frames plus an entry for every state change. Opening a capture
+only reads the index and the frames written after its last entry, so
+multi-hour sessions open instantly and can be entered at a time or state.
+"""
+
+import argparse
+import bisect
+import struct
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, BinaryIO
+
+
+MAGIC = b"CRCAP2\n"
+INDEX_MAGIC = b"CRIDX2\n"
+
+# Wall-clock start time and the monotonic clock reading it corresponds to
+FILE_HEADER = struct.Struct("<dd")
+FRAME_HEADER = struct.Struct("<dBBI")
+# Kind, frame number, frame offset, elapsed, state tag, state name length (+ name)
+INDEX_ENTRY = struct.Struct("<BQQdBH")
+
+DIRECTION_RECEIVED = 0
+DIRECTION_SENT = 1
+# Payload is the name of the state entered
+DIRECTION_STATE = 2
+# Payload is the name of the break method used
+DIRECTION_BREAK = 3
+DIRECTION_NAMES = {DIRECTION_RECEIVED: "RECEIVED", DIRECTION_SENT: "SENT",
+                   DIRECTION_STATE: "STATE", DIRECTION_BREAK: "BREAK"}
+
+INDEX_CHECKPOINT = 0
+INDEX_STATE = 1
+
+# Frames between index checkpoints
+INDEX_EVERY = 256
+
+# Tag 0 means no state has been recorded yet; up to 255 distinct states per file
+NO_STATE = 0
+MAX_STATES = 255
+
+
+@dataclass
+class CaptureFrame:
+    """One captured chunk of console traffic or state change"""
+    number: int
+    offset: int
+    elapsed: float
+    direction: int
+    state: Optional[str]
+    data: bytes
+
+
+@dataclass
+class StateChange:
+    """Index entry for the moment a state was entered"""
+    state: str
+    frame: int
+    offset: int
+    elapsed: float
+
+
+class CaptureWriter:
+    """Writes timestamped, state-tagged byte frames and their index"""
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, sample_every: int = 1):
+        """
+        Args:
+            path: Capture file (replaced if it exists); the index is path + ".idx"
+            max_bytes: Stop capturing traffic once the file reaches this size
+                (state changes are still recorded)
+            sample_every: Keep one traffic frame in every N (1 keeps all)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.index_path = index_path_for(self.path)
+        self.max_bytes = max_bytes
+        self.sample_every = max(1, sample_every)
+
+        self.start_wall = time.time()
+        self.start_monotonic = time.monotonic()
+
+        self._file: Optional[BinaryIO] = open(self.path, "wb")
+        self._file.write(MAGIC + FILE_HEADER.pack(self.start_wall, self.start_monotonic))
+        self._index: Optional[BinaryIO] = open(self.index_path, "wb")
+        self._index.write(INDEX_MAGIC)
+        self.size = self._file.tell()
+
+        self._lock = threading.Lock()
+        self._state_tags: Dict[str, int] = {}
+        self.state_tag = NO_STATE
+        self.frames_seen = 0
+        self.frames_written = 0
+        self.truncated = False
+
+    def write(self, direction: int, data: bytes):
+        """Append one traffic frame (cheap: no formatting, no flush)"""
+        with self._lock:
+            self.frames_seen += 1
+            if self._file is None or (self.frames_seen - 1) % self.sample_every:
+                return
+            if self.max_bytes is not None and self.size + FRAME_HEADER.size + len(data) > self.max_bytes:
+                self.truncated = True
+                return
+            self._append(direction, self.state_tag, data)
+
+    def set_state(self, state: str):
+        """Tag following frames with a state and index the moment it was entered"""
+        with self._lock:
+            if self._file is None:
+                return
+            tag = self._state_tags.get(state)
+            if tag is None:
+                if len(self._state_tags) >= MAX_STATES:
+                    return
+                tag = self._state_tags[state] = len(self._state_tags) + 1
+            self.state_tag = tag
+
+            name = state.encode("utf-8")
+            number, offset, elapsed = self._append(DIRECTION_STATE, tag, name)
+            self._index.write(INDEX_ENTRY.pack(INDEX_STATE, number, offset, elapsed, tag, len(name)) + name)
+
+    def _append(self, direction: int, tag: int, data: bytes) -> Tuple[int, int, float]:
+        """Write a frame, adding a checkpoint to the index when one is due"""
+        number = self.frames_written
+        offset = self.size
+        elapsed = time.monotonic() - self.start_monotonic
+
+        self._file.write(FRAME_HEADER.pack(elapsed, direction, tag, len(data)))
+        self._file.write(data)
+        self.size += FRAME_HEADER.size + len(data)
+        self.frames_written += 1
+
+        if number % INDEX_EVERY == 0:
+            self._index.write(INDEX_ENTRY.pack(INDEX_CHECKPOINT, number, offset, elapsed, tag, 0))
+        return number, offset, elapsed
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                # Frames first, so the index never points past the end of the capture
+                self._file.flush()
+                self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._index.close()
+                self._file = None
+                self._index = None
+
+
+class CaptureReader:
+    """Random access to a capture file through its index"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Capture file; a missing or stale index is completed in memory
+                by scanning only the frames it does not cover
+        """
+        self.path = Path(path)
+        self._file: BinaryIO = open(self.path, "rb")
+        if self._file.read(len(MAGIC)) != MAGIC:
+            self._file.close()
+            raise ValueError(f"{path} is not a console capture file")
+        self.start_wall, self.start_monotonic = FILE_HEADER.unpack(self._file.read(FILE_HEADER.size))
+        self.data_start = self._file.tell()
+
+        # (frame number, offset, elapsed) in frame order
+        self.checkpoints: List[Tuple[int, int, float]] = []
+        self.state_changes: List[StateChange] = []
+        self.state_names: Dict[int, str] = {}
+        self.frame_count = 0
+
+        self._load_index()
+        self._scan_tail()
+
+        # Every indexed (frame number, offset), for seeking to a frame
+        self._anchors = sorted([(c[0], c[1]) for c in self.checkpoints] +
+                               [(s.frame, s.offset) for s in self.state_changes])
+
+    def __enter__(self) -> "CaptureReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def close(self):
+        self._file.close()
+
+    def frames(self, start: int = 0, limit: Optional[int] = None) -> Iterator[CaptureFrame]:
+        """
+        Yield frames from a frame number onwards
+
+        Args:
+            start: First frame number
+            limit: Maximum number of frames (default: to the end)
+        """
+        number, offset = self._anchor_before(start)
+        end = self.frame_count if limit is None else min(self.frame_count, start + limit)
+
+        while number < end:
+            raw = self._read_raw(offset)
+            if raw is None:
+                return
+            elapsed, direction, tag, data = raw
+            if number >= start:
+                yield CaptureFrame(number, offset, elapsed, direction, self.state_names.get(tag), data)
+            offset += FRAME_HEADER.size + len(data)
+            number += 1
+
+    def frame_at_time(self, elapsed: float) -> int:
+        """Number of the first frame at or after an elapsed time (seconds from start)"""
+        times = [c[2] for c in self.checkpoints]
+        position = bisect.bisect_right(times, elapsed) - 1
+        start = self.checkpoints[position][0] if position >= 0 else 0
+
+        for frame in self.frames(start):
+            if frame.elapsed >= elapsed:
+                return frame.number
+        return self.frame_count
+
+    def find_state(self, state: str, occurrence: int = 0) -> Optional[StateChange]:
+        """
+        Find the moment a state was entered
+
+        Args:
+            state: State name, e.g. "rom_monitor"
+            occurrence: Which entry into the state (0 = first, -1 = last)
+
+        Returns:
+            The index entry, or None if the state was never entered that often
+        """
+        matches = [s for s in self.state_changes if s.state == state]
+        try:
+            return matches[occurrence]
+        except IndexError:
+            return None
+
+    def wall_time(self, elapsed: float) -> float:
+        """Convert a frame's elapsed time to a wall-clock timestamp"""
+        return self.start_wall + elapsed
+
+    def _load_index(self):
+        """Read the sidecar index, stopping at the first incomplete entry"""
+        index_path = index_path_for(self.path)
+        if not index_path.exists():
+            return
+
+        with open(index_path, "rb") as f:
+            if f.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                return
+            while True:
+                entry = f.read(INDEX_ENTRY.size)
+                if len(entry) < INDEX_ENTRY.size:
+                    return
+                kind, number, offset, elapsed, tag, name_length = INDEX_ENTRY.unpack(entry)
+                name = f.read(name_length)
+                if len(name) < name_length:
+                    return
+                self._add_entry(kind, number, offset, elapsed, tag, name.decode("utf-8", errors="replace"))
+
+    def _add_entry(self, kind: int, number: int, offset: int, elapsed: float, tag: int, name: str):
+        if kind == INDEX_STATE:
+            self.state_names[tag] = name
+            self.state_changes.append(StateChange(name, number, offset, elapsed))
+        else:
+            self.checkpoints.append((number, offset, elapsed))
+
+    def _scan_tail(self):
+        """Index the frames after the last index entry (a few, unless the writer crashed)"""
+        last_number, offset = -1, self.data_start
+        if self.checkpoints:
+            last_number, offset, _ = self.checkpoints[-1]
+        if self.state_changes and self.state_changes[-1].frame > last_number:
+            last_number, offset = self.state_changes[-1].frame, self.state_changes[-1].offset
+
+        number = max(last_number, 0)
+        while True:
+            raw = self._read_raw(offset)
+            if raw is None:
+                break
+            elapsed, direction, tag, data = raw
+            if number > last_number:
+                if direction == DIRECTION_STATE:
+                    self._add_entry(INDEX_STATE, number, offset, elapsed, tag,
+                                    data.decode("utf-8", errors="replace"))
+                if number % INDEX_EVERY == 0:
+                    self._add_entry(INDEX_CHECKPOINT, number, offset, elapsed, tag, "")
+            offset += FRAME_HEADER.size + len(data)
+            number += 1
+        self.frame_count = number
+
+    def _anchor_before(self, number: int) -> Tuple[int, int]:
+        """Closest indexed (frame number, offset) at or before a frame"""
+        position = bisect.bisect_right(self._anchors, (number, float("inf"))) - 1
+        return self._anchors[position] if position >= 0 else (0, self.data_start)
+
+    def _read_raw(self, offset: int) -> Optional[Tuple[float, int, int, bytes]]:
+        """Read one frame, or None at the end of the file or a frame cut short by a crash"""
+        self._file.seek(offset)
+        header = self._file.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return None
+        elapsed, direction, tag, length = FRAME_HEADER.unpack(header)
+        data = self._file.read(length)
+        if len(data) < length:
+            return None
+        return elapsed, direction, tag, data
+
+
+def index_path_for(path) -> Path:
+    """Sidecar index file of a capture"""
+    path = Path(path)
+    return path.with_name(path.name + ".idx")
+
+
+def read_frames(path: str) -> Iterator[CaptureFrame]:
+    """Yield every frame in a capture file"""
+    with CaptureReader(path) as reader:
+        yield from reader.frames()
+
+
+def format_hex(data: bytes, width: int = 16) -> List[str]:
+    """Classic offset / hex / ASCII dump lines"""
+    lines = []
+    for offset in range(0, len(data), width):
+        row = data[offset:offset + width]
+        hex_part = " ".join(f"{b:02x}" for b in row)
+        text_part = "".join(chr(b) if 32 <= b < 127 else "." for b in row)
+        lines.append(f"{offset:08x}  {hex_part:<{width * 3 - 1}}  {text_part}")
+    return lines
+
+
+def render_capture(path: str, start: int = 0, limit: Optional[int] = None,
+                   state: Optional[str] = None, at: Optional[float] = None) -> Iterator[str]:
+    """
+    Render frames of a capture file as hex dump text, one frame at a time
+
+    Args:
+        path: Capture file
+        start: First frame number
+        limit: Maximum number of frames
+        state: Start where this state was first entered instead
+        at: Start at this many seconds into the session instead
+    """
+    with CaptureReader(path) as reader:
+        if state is not None:
+            change = reader.find_state(state)
+            if change is None:
+                yield f"State {state!r} not found in capture"
+                return
+            start = change.frame
+        elif at is not None:
+            start = reader.frame_at_time(at)
+
+        for frame in reader.frames(start, limit):
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(reader.wall_time(frame.elapsed)))
+            direction = DIRECTION_NAMES.get(frame.direction, str(frame.direction))
+            if frame.direction == DIRECTION_STATE:
+                yield f"#{frame.number} {stamp} +{frame.elapsed:.6f}s {direction} -> {frame.state}"
+                continue
+            yield (f"#{frame.number} {stamp} +{frame.elapsed:.6f}s {direction} "
+                   f"[{frame.state or '-'}] {len(frame.data)} bytes")
+            yield from format_hex(frame.data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show a console capture file as a hex dump")
+    parser.add_argument("capture", help="Capture file written with --capture")
+    parser.add_argument("--start", type=int, default=0, help="First frame to show")
+    parser.add_argument("--limit", type=int, help="Number of frames to show")
+    parser.add_argument("--state", help="Start where this state was first entered (e.g. rom_monitor)")
+    parser.add_argument("--at", type=float, help="Start this many seconds into the session")
+    parser.add_argument("--states", action="store_true", help="List state changes and exit")
+    args = parser.parse_args()
+
+    if args.states:
+        with CaptureReader(args.capture) as reader:
+            for change in reader.state_changes:
+                print(f"+{change.elapsed:10.3f}s  frame {change.frame:<8} {change.state}")
+        return
+
+    for line in render_capture(args.capture, args.start, args.limit, args.state, args.at):
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
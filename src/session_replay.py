@@ -0,0 +1,400 @@
+"""
+Deterministic replay of a recorded console session in place of a serial port
+"""
+
+import argparse
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, List, Optional, Any, Tuple
+
+from prompt_detector import PromptDetector, StreamingPromptDetector
+from serial_connection import SerialConnection
+from session_capture import (CaptureReader, CaptureFrame, DIRECTION_RECEIVED, DIRECTION_SENT,
+                             DIRECTION_STATE, DIRECTION_BREAK)
+from stream_buffer import StreamBuffer
+
+
+@dataclass
+class ReplayStats:
+    """What happened during a replay"""
+    frames_played: int = 0
+    bytes_played: int = 0
+    writes: int = 0
+    breaks: int = 0
+    # Breaks sent while the recording expected text or nothing
+    extra_breaks: int = 0
+    # (frame number, recorded bytes, bytes the tool wrote); frame -1 once the recording has ended
+    mismatches: List[Tuple[int, bytes, bytes]] = field(default_factory=list)
+    state: Optional[str] = None
+    stalled: bool = False
+    finished: bool = False
+    duration: float = 0.0
+
+
+class ReplayPort:
+    """
+    pyserial stand-in that plays back a capture and waits for the tool's writes
+
+    Received frames are delivered with their recorded spacing divided by
+    ``speed``. At each recorded write or break, playback holds until the tool
+    writes (or breaks) too, then continues with the recorded response delay
+    measured from that moment, so output never runs ahead of the commands that
+    caused it. A pipe descriptor signals readable data, so the reader thread
+    and SerialReactor select on it as on a real port.
+    """
+
+    def __init__(self, capture_path: str, speed: Optional[float] = 1.0,
+                 stall_timeout: float = 30.0, logger: Optional[Any] = None):
+        """
+        Args:
+            capture_path: Capture written with --capture
+            speed: Playback speed factor (1.0 = real time, 0 or None = no delays)
+            stall_timeout: Seconds to wait for an expected write before giving up
+            logger: Optional logger
+        """
+        self.capture_path = capture_path
+        self.speed = speed if speed and speed > 0 else None
+        self.stall_timeout = stall_timeout
+        self.logger = logger
+        self.stats = ReplayStats()
+
+        # pyserial attributes touched by SerialConnection
+        self.baudrate = 9600
+        self.dtr = True
+        self.rts = True
+        self.is_open = True
+
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self._signalled = False
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+
+        self._frames: Optional[Iterator[CaptureFrame]] = None
+        self._actions: Deque[Tuple[int, bytes]] = deque()
+        self._action_ready = threading.Condition()
+        self.done = threading.Event()
+        self._thread = threading.Thread(target=self._play, name="replay", daemon=True)
+        self._thread.start()
+
+    # -- pyserial interface -------------------------------------------------
+
+    @property
+    def in_waiting(self) -> int:
+        return len(self._buffer)
+
+    def fileno(self) -> int:
+        return self._read_fd
+
+    def read(self, size: int = 1) -> bytes:
+        with self._lock:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            if not self._buffer and self._signalled:
+                try:
+                    os.read(self._read_fd, 1)
+                except BlockingIOError:
+                    pass
+                self._signalled = False
+        return data
+
+    def write(self, data: bytes) -> int:
+        self._queue_action(DIRECTION_SENT, bytes(data))
+        return len(data)
+
+    def send_break(self, duration: float = 0.25):
+        self._queue_action(DIRECTION_BREAK, b"")
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        with self._lock:
+            self._buffer.clear()
+
+    def reset_output_buffer(self):
+        pass
+
+    def close(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        self.done.set()
+        with self._action_ready:
+            self._action_ready.notify_all()
+        self._thread.join(timeout=2.0)
+        os.close(self._read_fd)
+        os.close(self._write_fd)
+
+    # -- playback -----------------------------------------------------------
+
+    def _queue_action(self, kind: int, data: bytes):
+        with self._action_ready:
+            self._actions.append((kind, data))
+            self._action_ready.notify()
+
+    def _deliver(self, data: bytes):
+        with self._lock:
+            self._buffer += data
+            if not self._signalled:
+                os.write(self._write_fd, b"\x00")
+                self._signalled = True
+
+    def _next_action(self) -> Optional[Tuple[int, bytes]]:
+        """Wait for the tool to write or break; None if it never does"""
+        with self._action_ready:
+            if not self._action_ready.wait_for(lambda: self._actions or self.done.is_set(),
+                                               self.stall_timeout):
+                self.stats.stalled = True
+                return None
+            return self._actions.popleft() if self._actions else None
+
+    def _await_tool(self, frame: CaptureFrame) -> bool:
+        """Hold playback at a recorded write or break until the tool does the same"""
+        while True:
+            action = self._next_action()
+            if action is None:
+                return False
+            kind, data = action
+
+            if kind == DIRECTION_BREAK:
+                self.stats.breaks += 1
+                if frame.direction == DIRECTION_BREAK:
+                    return True
+                self.stats.extra_breaks += 1
+                continue
+
+            self.stats.writes += 1
+            if frame.direction == DIRECTION_BREAK:
+                # Recorded break that this run did not send; the write answers
+                # the next recorded write instead
+                return self._skip_break(data)
+            self._compare(frame, data)
+            return True
+
+    def _skip_break(self, data: bytes) -> bool:
+        """Move past recorded breaks to the write a tool write belongs to"""
+        for frame in self._frames:
+            self._record_state(frame)
+            if frame.direction == DIRECTION_SENT:
+                self._compare(frame, data)
+                return True
+            if frame.direction == DIRECTION_RECEIVED:
+                # Output that followed the break is still delivered
+                self._deliver(frame.data)
+                self.stats.frames_played += 1
+                self.stats.bytes_played += len(frame.data)
+        self.stats.mismatches.append((-1, b"", data))
+        return False
+
+    def _compare(self, frame: CaptureFrame, data: bytes):
+        expected = frame.data.rstrip(b"\r\n")
+        if data.rstrip(b"\r\n") != expected:
+            self.stats.mismatches.append((frame.number, frame.data, data))
+            if self.logger:
+                self.logger.debug(f"Replay frame {frame.number}: expected {frame.data!r}, got {data!r}")
+
+    def _record_state(self, frame: CaptureFrame):
+        if frame.direction == DIRECTION_STATE:
+            self.stats.state = frame.state
+
+    def _play(self):
+        start = time.monotonic()
+        reader = CaptureReader(self.capture_path)
+        try:
+            self._frames = reader.frames()
+            anchor_wall = time.monotonic()
+            anchor_elapsed: Optional[float] = None
+
+            for frame in self._frames:
+                if self.done.is_set():
+                    return
+                self._record_state(frame)
+                if anchor_elapsed is None:
+                    anchor_elapsed = frame.elapsed
+
+                if frame.direction in (DIRECTION_SENT, DIRECTION_BREAK):
+                    if not self._await_tool(frame):
+                        return
+                    # The recorded response delay runs from when the tool acted
+                    anchor_wall, anchor_elapsed = time.monotonic(), frame.elapsed
+                elif frame.direction == DIRECTION_RECEIVED:
+                    if self.speed is not None:
+                        due = anchor_wall + (frame.elapsed - anchor_elapsed) / self.speed
+                        if self.done.wait(max(0.0, due - time.monotonic())):
+                            return
+                    self._deliver(frame.data)
+                    self.stats.frames_played += 1
+                    self.stats.bytes_played += len(frame.data)
+
+            self.stats.finished = True
+            if self.logger:
+                self.logger.debug(f"Replay of {self.capture_path} finished")
+        finally:
+            reader.close()
+            self.stats.duration = time.monotonic() - start
+            # Anything written after the recording ended has nothing to match
+            with self._action_ready:
+                for kind, data in self._actions:
+                    if kind == DIRECTION_SENT:
+                        self.stats.mismatches.append((-1, b"", data))
+            self.done.set()
+
+
+class ReplayConnection(SerialConnection):
+    """SerialConnection whose port is a recorded session instead of a TTY"""
+
+    def __init__(self, capture_path: str, speed: Optional[float] = 1.0,
+                 stall_timeout: float = 30.0, logger: Optional[Any] = None,
+                 metrics: Optional[Any] = None, reactor: Optional[Any] = None,
+                 buffer_size: int = StreamBuffer.DEFAULT_CAPACITY):
+        """
+        Args:
+            capture_path: Capture written with --capture
+            speed: Playback speed factor (1.0 = real time, 0 or None = no delays)
+            stall_timeout: Seconds to wait for an expected write before giving up
+            logger: Optional logger
+            metrics: Optional metrics collector
+            reactor: Optional SerialReactor serving the replay's reads
+            buffer_size: Bytes of received output retained for inspection
+        """
+        super().__init__(port=f"replay:{capture_path}", logger=logger, metrics=metrics,
+                         reactor=reactor, buffer_size=buffer_size)
+        self.capture_path = capture_path
+        self.speed = speed
+        self.stall_timeout = stall_timeout
+
+    @property
+    def stats(self) -> Optional[ReplayStats]:
+        return self.serial_port.stats if isinstance(self.serial_port, ReplayPort) else None
+
+    def open(self, port: Optional[str] = None, baudrate: Optional[int] = None) -> bool:
+        """Start playback; port and baudrate are ignored"""
+        try:
+            self.serial_port = ReplayPort(self.capture_path, self.speed, self.stall_timeout,
+                                          logger=self.logger)
+        except (OSError, ValueError) as e:
+            if self.logger:
+                self.logger.error(f"Cannot replay {self.capture_path}: {e}")
+            return False
+
+        self._start_reading()
+        if self.logger:
+            self.logger.info(f"Replaying {self.capture_path}")
+        return True
+
+    def get_adapter_id(self, port: Optional[str] = None) -> Optional[str]:
+        return "replay"
+
+    def send_break_ioctl(self, duration: float = 0.25) -> bool:
+        # No TTY to ioctl; every break method is a break to the recording
+        return self.send_break_standard(duration)
+
+    def send_break_signal_toggle(self) -> bool:
+        return self.send_break_standard(0.0)
+
+    def set_baudrate(self, baudrate: int) -> bool:
+        if not self.is_open():
+            return False
+        self.serial_port.baudrate = self.baudrate = baudrate
+        return True
+
+    def wait_finished(self, timeout: Optional[float] = None) -> bool:
+        """Block until the recording has been played to the end (or stalled)"""
+        return self.serial_port.done.wait(timeout) if isinstance(self.serial_port, ReplayPort) else True
+
+
+def benchmark_parser(capture_path: str, repeat: int = 1) -> Dict[str, Any]:
+    """
+    Measure prompt detection throughput over a capture's received output
+
+    The output is split at each recorded write, as CommandExecutor does, and
+    fed chunk by chunk through a StreamingPromptDetector.
+
+    Returns:
+        Characters parsed, seconds, characters per second and prompts found
+    """
+    segments: List[List[str]] = [[]]
+    with CaptureReader(capture_path) as reader:
+        for frame in reader.frames():
+            if frame.direction == DIRECTION_RECEIVED:
+                segments[-1].append(frame.data.decode('utf-8', errors='replace'))
+            elif frame.direction in (DIRECTION_SENT, DIRECTION_BREAK) and segments[-1]:
+                segments.append([])
+
+    detector = StreamingPromptDetector(PromptDetector())
+    chars = prompts = 0
+    start = time.perf_counter()
+    for _ in range(max(1, repeat)):
+        for chunks in segments:
+            detector.reset()
+            state = None
+            for chunk in chunks:
+                state, _, _ = detector.feed(chunk)
+            chars += detector.chars_fed
+            prompts += state is not None
+    elapsed = time.perf_counter() - start
+
+    return {
+        'chars': chars,
+        'seconds': elapsed,
+        'chars_per_second': chars / elapsed if elapsed > 0 else 0.0,
+        'segments': len(segments),
+        'prompts': prompts,
+    }
+
+
+def benchmark_detection(capture_path: str, speed: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Time SystemDetector.detect_all against a recorded detection session
+
+    Returns:
+        Workflow seconds, replay statistics and detection results
+    """
+    # Imported here so parser benchmarks do not pull in the executor stack
+    from command_executor import CommandExecutor
+    from retry_strategies import RetryManager
+    from system_detector import SystemDetector
+
+    conn = ReplayConnection(capture_path, speed=speed, stall_timeout=5.0)
+    if not conn.open():
+        raise ValueError(f"Cannot replay {capture_path}")
+    try:
+        executor = CommandExecutor(conn, PromptDetector(), RetryManager())
+        detector = SystemDetector(executor)
+        start = time.perf_counter()
+        results = detector.detect_all()
+        elapsed = time.perf_counter() - start
+        return {'seconds': elapsed, 'stats': conn.stats, 'results': results}
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a console capture for benchmarking")
+    parser.add_argument("capture", help="Capture file written with --capture")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="Playback speed (1 = real time, 0 = as fast as possible; default: 0)")
+    parser.add_argument("--repeat", type=int, default=10, help="Parser benchmark passes (default: 10)")
+    parser.add_argument("--detect", action="store_true",
+                        help="Also time system detection against the recording")
+    args = parser.parse_args()
+
+    result = benchmark_parser(args.capture, args.repeat)
+    print(f"Parser: {result['chars']} chars in {result['seconds']:.3f}s "
+          f"({result['chars_per_second'] / 1e6:.2f} Mchar/s), "
+          f"{result['prompts']}/{result['segments'] * max(1, args.repeat)} segments ended at a prompt")
+
+    if args.detect:
+        result = benchmark_detection(args.capture, args.speed)
+        stats = result['stats']
+        print(f"Detection: {result['seconds']:.3f}s, {stats.frames_played} frames, "
+              f"{stats.writes} writes, {len(stats.mismatches)} mismatches"
+              f"{', stalled' if stats.stalled else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,9 @@ class SettingsManager:
             "auto_reconnect": True,
             "command_timeout": 30.0,
             "break_retry_count": 5,
+            "output_buffer_size": 1024 * 1024,
+            "command_cache_ttl": 300.0,
+            "bulk_baudrate": None,
             "enable_metrics": True,
             "auto_backup": True,
             "show_welcome": True,
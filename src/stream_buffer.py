@@ -0,0 +1,85 @@
+"""
+Bounded byte buffer for console output with absolute stream offsets
+"""
+
+import threading
+from typing import Tuple
+
+
+class StreamBuffer:
+    """Fixed-capacity byte ring addressed by absolute offsets into the stream
+    
+    Every byte received gets an offset counted from the start of the session.
+    Once the capacity is reached the oldest bytes are discarded, so memory
+    stays bounded however long the session runs, and readers holding an
+    offset only copy what arrived after it.
+    """
+    
+    DEFAULT_CAPACITY = 1024 * 1024  # 1MB
+    
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._data = bytearray()
+        self._start = 0  # Absolute offset of self._data[0]
+        self._lock = threading.Lock()
+    
+    @property
+    def start_offset(self) -> int:
+        """Oldest offset still retained"""
+        return self._start
+    
+    @property
+    def end_offset(self) -> int:
+        """Offset one past the newest byte (total bytes ever appended)"""
+        return self._start + len(self._data)
+    
+    def append(self, data: bytes) -> int:
+        """
+        Append received bytes, discarding the oldest beyond capacity
+        
+        Returns:
+            New end offset
+        """
+        with self._lock:
+            if len(data) >= self.capacity:
+                self._start += len(self._data) + len(data) - self.capacity
+                self._data = bytearray(data[-self.capacity:])
+            else:
+                self._data += data
+                excess = len(self._data) - self.capacity
+                if excess > 0:
+                    # bytearray deletes from the front without moving the tail
+                    del self._data[:excess]
+                    self._start += excess
+            return self._start + len(self._data)
+    
+    def read_since(self, offset: int) -> Tuple[bytes, int]:
+        """
+        Get bytes appended at or after an absolute offset
+        
+        Offsets older than the retained window are clamped to the oldest byte
+        still held.
+        
+        Returns:
+            Tuple of (data, end_offset) - pass end_offset to the next call
+        """
+        with self._lock:
+            begin = max(offset, self._start) - self._start
+            return bytes(self._data[begin:]), self._start + len(self._data)
+    
+    def text_since(self, offset: int) -> Tuple[str, int]:
+        """read_since() decoded as console text"""
+        data, end = self.read_since(offset)
+        return data.decode('utf-8', errors='replace'), end
+    
+    def clear(self):
+        """Discard retained bytes; offsets keep counting from the current end"""
+        with self._lock:
+            self._start += len(self._data)
+            self._data = bytearray()
+    
+    def __len__(self) -> int:
+        """Bytes currently retained"""
+        return len(self._data)
@@ -4,28 +4,131 @@ Comprehensive system detection and inventory module
 
 import re
 import json
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
 from command_executor import CommandExecutor
+from console_speed import ConsoleSpeed
 
 
 class SystemDetector:
     """System detection and inventory"""
     
+    # Every command detect_all issues, with the timeout each detect_* method uses
+    DETECTION_COMMANDS = [
+        ("show license summary", 10.0),
+        ("show license feature", 10.0),
+        ("show license udi", 10.0),
+        ("show inventory", 15.0),
+        ("show version", 10.0),
+        ("show software", 15.0),
+        ("show feature", 10.0),
+        ("show running-config", 30.0),
+        ("show ip interface brief", 15.0),
+        ("show running-config | include hostname", 10.0),
+        ("show clock", 5.0),
+        ("show users", 5.0),
+    ]
+    
     def __init__(self, command_executor: CommandExecutor, logger: Optional[Any] = None,
-                 metrics: Optional[Any] = None):
+                 metrics: Optional[Any] = None, bulk_baudrate: Optional[int] = None):
+        """
+        Args:
+            command_executor: Executor for the router's console
+            logger: Optional logger
+            metrics: Optional metrics collector
+            bulk_baudrate: Console speed to switch to while collecting a batch
+                (None keeps the current speed)
+        """
         self.command_executor = command_executor
         self.logger = logger
         self.metrics = metrics
+        self.bulk_baudrate = bulk_baudrate
         self.detection_results: Dict[str, Any] = {}
         
-    def detect_all(self) -> Dict[str, Any]:
-        """Run all detection operations"""
+        # Outputs collected by a batched run, consumed by the detect_* methods
+        self._prefetched: Dict[str, Tuple[bool, str]] = {}
+        
+    def _execute(self, command: str, timeout: float) -> Tuple[bool, str]:
+        """Return prefetched or cached output for a command, or execute it now"""
+        if command in self._prefetched:
+            return self._prefetched[command]
+        return self.command_executor.execute_cached(command, timeout=timeout)
+    
+    def prefetch(self) -> float:
+        """
+        Collect the output of every detection command in one pipelined batch
+        
+        Returns:
+            Seconds spent collecting
+        """
+        start_time = time.time()
+        cache = self.command_executor.cache
+        device = self.command_executor.device
+        
+        # Outputs still in the session cache need no round trip at all; time-
+        # varying commands (clock, users) are never cached and always run
+        self._prefetched = {}
+        pending = []
+        for command, _ in self.DETECTION_COMMANDS:
+            output = cache.get(device, command)
+            if output is not None:
+                self._prefetched[command] = (True, output)
+            else:
+                pending.append(command)
+        
+        if pending:
+            timeout = sum(t for c, t in self.DETECTION_COMMANDS if c in pending)
+            if self.bulk_baudrate:
+                speed = ConsoleSpeed(self.command_executor, logger=self.logger, metrics=self.metrics)
+                with speed.upgraded(self.bulk_baudrate):
+                    outputs = self.command_executor.execute_batch(pending, timeout=timeout)
+            else:
+                outputs = self.command_executor.execute_batch(pending, timeout=timeout)
+            
+            # Cached after the speed is restored, since that runs in config mode.
+            # Commands missing from the batch are retried one by one later
+            for command, (success, output) in zip(pending, outputs):
+                if success:
+                    self._prefetched[command] = (success, output)
+                    cache.put(device, command, output)
+        
+        duration = time.time() - start_time
+        if self.logger:
+            self.logger.info(f"Collected {len(self._prefetched)}/{len(self.DETECTION_COMMANDS)} "
+                             f"detection commands in {duration:.1f}s")
+        return duration
+        
+    def detect_all(self, batched: bool = True) -> Dict[str, Any]:
+        """
+        Run all detection operations
+        
+        Args:
+            batched: Pipeline all show commands in one batch instead of
+                running them one at a time
+        """
         if self.logger:
             self.logger.info("Starting comprehensive system detection...")
         
-        results = {
+        if batched:
+            self.prefetch()
+        
+        try:
+            results = self._collect_results()
+        finally:
+            self._prefetched = {}
+        
+        self.detection_results = results
+        
+        if self.logger:
+            self.logger.info("System detection complete")
+        
+        return results
+    
+    def _collect_results(self) -> Dict[str, Any]:
+        """Run every detect_* method and assemble the results dict"""
+        return {
             'timestamp': datetime.now().isoformat(),
             'licenses': self.detect_licenses(),
             'hardware': self.detect_hardware(),
@@ -36,13 +139,6 @@ class SystemDetector:
             'configuration': self.detect_configuration(),
             'system_info': self.detect_system_info()
         }
-        
-        self.detection_results = results
-        
-        if self.logger:
-            self.logger.info("System detection complete")
-        
-        return results
     
     def detect_licenses(self) -> Dict[str, Any]:
         """Detect license information"""
@@ -64,7 +160,7 @@ class SystemDetector:
         
         # show license summary
         try:
-            success, output = self.command_executor.execute("show license summary", timeout=10.0)
+            success, output = self._execute("show license summary", timeout=10.0)
             if success:
                 licenses['license_summary'] = output
                 self._parse_license_summary(output, licenses['parsed'])
@@ -74,7 +170,7 @@ class SystemDetector:
         
         # show license feature
         try:
-            success, output = self.command_executor.execute("show license feature", timeout=10.0)
+            success, output = self._execute("show license feature", timeout=10.0)
             if success:
                 licenses['license_features'] = output
                 self._parse_license_features(output, licenses['parsed'])
@@ -84,7 +180,7 @@ class SystemDetector:
         
         # show license udi
         try:
-            success, output = self.command_executor.execute("show license udi", timeout=10.0)
+            success, output = self._execute("show license udi", timeout=10.0)
             if success:
                 licenses['license_udi'] = output
                 self._parse_license_udi(output, licenses['parsed'])
@@ -161,7 +257,7 @@ class SystemDetector:
         
         # show inventory
         try:
-            success, output = self.command_executor.execute("show inventory", timeout=15.0)
+            success, output = self._execute("show inventory", timeout=15.0)
             if success:
                 hardware['inventory'] = output
                 self._parse_inventory(output, hardware['parsed'])
@@ -171,7 +267,7 @@ class SystemDetector:
         
         # show version
         try:
-            success, output = self.command_executor.execute("show version", timeout=10.0)
+            success, output = self._execute("show version", timeout=10.0)
             if success:
                 hardware['version'] = output
                 self._parse_version(output, hardware['parsed'])
@@ -258,7 +354,7 @@ class SystemDetector:
         
         # show version
         try:
-            success, output = self.command_executor.execute("show version", timeout=10.0)
+            success, output = self._execute("show version", timeout=10.0)
             if success:
                 software['version'] = output
                 self._parse_software_version(output, software['parsed'])
@@ -268,7 +364,7 @@ class SystemDetector:
         
         # show software (IOS XE)
         try:
-            success, output = self.command_executor.execute("show software", timeout=15.0)
+            success, output = self._execute("show software", timeout=15.0)
             if success:
                 software['software_packages'] = output
                 self._parse_software_packages(output, software['parsed'])
@@ -322,7 +418,7 @@ class SystemDetector:
         
         # show feature (IOS XE)
         try:
-            success, output = self.command_executor.execute("show feature", timeout=10.0)
+            success, output = self._execute("show feature", timeout=10.0)
             if success:
                 features['feature_list'] = output
         except Exception as e:
@@ -331,7 +427,7 @@ class SystemDetector:
         
         # Parse running config for features
         try:
-            success, output = self.command_executor.execute("show running-config", timeout=30.0)
+            success, output = self._execute("show running-config", timeout=30.0)
             if success:
                 features['running_config'] = output[:10000]  # Limit size
                 self._parse_config_features(output, features['parsed'])
@@ -371,7 +467,7 @@ class SystemDetector:
         
         # show ip interface brief
         try:
-            success, output = self.command_executor.execute("show ip interface brief", timeout=15.0)
+            success, output = self._execute("show ip interface brief", timeout=15.0)
             if success:
                 interfaces['interface_brief'] = output
                 self._parse_interface_brief(output, interfaces['parsed'])
@@ -427,7 +523,7 @@ class SystemDetector:
         
         # show running-config (limited)
         try:
-            success, output = self.command_executor.execute("show running-config | include hostname", timeout=10.0)
+            success, output = self._execute("show running-config | include hostname", timeout=10.0)
             if success:
                 hostname_match = re.search(r'hostname\s+(\S+)', output, re.IGNORECASE)
                 if hostname_match:
@@ -452,7 +548,7 @@ class SystemDetector:
         
         # show clock
         try:
-            success, output = self.command_executor.execute("show clock", timeout=5.0)
+            success, output = self._execute("show clock", timeout=5.0)
             if success:
                 info['clock'] = output.strip()
         except Exception as e:
@@ -461,7 +557,7 @@ class SystemDetector:
         
         # show users
         try:
-            success, output = self.command_executor.execute("show users", timeout=5.0)
+            success, output = self._execute("show users", timeout=5.0)
             if success:
                 info['users'] = output
         except Exception as e:
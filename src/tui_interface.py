@@ -734,8 +734,23 @@ This tool will help you reset the password on your Cisco 4321 ISR router.
                 cmd = metrics['command_execution']
                 cmd_text = f"[bold]Commands:[/bold] {cmd.get('count', 0)}\n"
                 cmd_text += f"[bold]Avg Time:[/bold] {cmd.get('average', 0):.3f}s"
+                if cmd.get('count'):
+                    cmd_text += f"\n[bold]p50/p90/p99:[/bold] {cmd.get('p50', 0):.3f}/{cmd.get('p90', 0):.3f}/{cmd.get('p99', 0):.3f}s"
                 panels.append(Panel(cmd_text, title="[bold yellow]Commands[/bold yellow]", border_style="yellow"))
             
+            # Where command time goes, per verb
+            if metrics.get('commands'):
+                phase_text = ""
+                for verb, entry in sorted(metrics['commands'].items()):
+                    phase_text += f"[bold]{verb}[/bold] x{entry.get('count', 0)}\n"
+                    for phase in ('write', 'first_byte', 'prompt'):
+                        if phase in entry:
+                            phase_text += f"  {phase} p50/p90: {entry[phase]['p50']:.3f}/{entry[phase]['p90']:.3f}s\n"
+                    phase_text += (f"  {entry.get('bytes_per_second', 0):.0f} B/s, "
+                                   f"{entry.get('pages', 0)} pages, {entry.get('retries', 0)} retries\n")
+                panels.append(Panel(phase_text.rstrip(), title="[bold magenta]Command Phases[/bold magenta]",
+                                    border_style="magenta"))
+            
             if panels:
                 self.console.print(Columns(panels, equal=True, expand=True))
                 self.console.print()